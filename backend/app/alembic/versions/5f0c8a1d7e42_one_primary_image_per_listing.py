@@ -0,0 +1,45 @@
+"""one primary image per listing
+
+Revision ID: 5f0c8a1d7e42
+Revises: 20924e72b3a1
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0c8a1d7e42'
+down_revision: Union[str, None] = '20924e72b3a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep a single primary image per listing before adding the constraint
+    op.execute(
+        """
+        UPDATE image SET is_primary = false
+        WHERE is_primary AND id NOT IN (
+            SELECT DISTINCT ON (listing_id) id FROM image
+            WHERE is_primary
+            ORDER BY listing_id, display_order, id
+        )
+        """
+    )
+    op.create_exclude_constraint(
+        'image_one_primary_per_listing',
+        'image',
+        ('listing_id', '='),
+        where=sa.text('is_primary'),
+        using='btree',
+        deferrable=True,
+        initially='IMMEDIATE',
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('image_one_primary_per_listing', 'image', type_='exclude')
@@ -0,0 +1,27 @@
+"""message history index
+
+Revision ID: a6d1e8b3f275
+Revises: f3c6a1d8e420
+Create Date: 2026-10-19 18:40:51.730264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d1e8b3f275'
+down_revision: Union[str, None] = 'f3c6a1d8e420'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_message_conversation_id_created_at_id', 'message', ['conversation_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_conversation_id_created_at_id', table_name='message')
@@ -0,0 +1,26 @@
+"""image processed at
+
+Revision ID: a9c4e2f71b06
+Revises: b8e2f4a7c153
+Create Date: 2026-10-19 18:41:12.304518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e2f71b06'
+down_revision: Union[str, None] = 'b8e2f4a7c153'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('image', sa.Column('processed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('image', 'processed_at')
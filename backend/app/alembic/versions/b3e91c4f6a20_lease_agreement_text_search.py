@@ -0,0 +1,36 @@
+"""lease agreement text search
+
+Revision ID: b3e91c4f6a20
+Revises: 5f0c8a1d7e42
+Create Date: 2026-10-19 11:03:57.640118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e91c4f6a20'
+down_revision: Union[str, None] = '5f0c8a1d7e42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('leaseagreementtext',
+    sa.Column('lease_agreement_id', sa.Uuid(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('search_vector', postgresql.TSVECTOR(), nullable=False),
+    sa.Column('extracted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['lease_agreement_id'], ['leaseagreement.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('lease_agreement_id')
+    )
+    op.create_index('ix_leaseagreementtext_search_vector', 'leaseagreementtext', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_leaseagreementtext_search_vector', table_name='leaseagreementtext', postgresql_using='gin')
+    op.drop_table('leaseagreementtext')
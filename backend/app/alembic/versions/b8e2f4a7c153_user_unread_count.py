@@ -0,0 +1,39 @@
+"""user unread count
+
+Revision ID: b8e2f4a7c153
+Revises: a6d1e8b3f275
+Create Date: 2026-10-19 19:26:13.482907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2f4a7c153'
+down_revision: Union[str, None] = 'a6d1e8b3f275'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('userunreadcount',
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute("""
+        INSERT INTO userunreadcount (user_id, unread_count)
+        SELECT user_id, sum(unread_count)
+        FROM conversationparticipant
+        GROUP BY user_id
+        HAVING sum(unread_count) > 0
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('userunreadcount')
@@ -0,0 +1,28 @@
+"""image perceptual hash
+
+Revision ID: c71d2e9a5b38
+Revises: b3e91c4f6a20
+Create Date: 2026-10-19 15:20:11.204633
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71d2e9a5b38'
+down_revision: Union[str, None] = 'b3e91c4f6a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('image', sa.Column('phash', sa.BigInteger(), nullable=True))
+    op.create_index(op.f('ix_image_phash'), 'image', ['phash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_image_phash'), table_name='image')
+    op.drop_column('image', 'phash')
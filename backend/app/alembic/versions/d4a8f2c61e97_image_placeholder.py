@@ -0,0 +1,27 @@
+"""image placeholder
+
+Revision ID: d4a8f2c61e97
+Revises: c71d2e9a5b38
+Create Date: 2026-10-19 16:02:45.918270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8f2c61e97'
+down_revision: Union[str, None] = 'c71d2e9a5b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('image', sa.Column('placeholder', sqlmodel.sql.sqltypes.AutoString(length=128), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('image', 'placeholder')
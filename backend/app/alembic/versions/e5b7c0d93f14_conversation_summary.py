@@ -0,0 +1,69 @@
+"""conversation summary
+
+Revision ID: e5b7c0d93f14
+Revises: d4a8f2c61e97
+Create Date: 2026-10-19 16:48:32.577104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7c0d93f14'
+down_revision: Union[str, None] = 'd4a8f2c61e97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversation', sa.Column('last_message_id', sa.Uuid(), nullable=True))
+    op.add_column('conversation', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    op.add_column('conversation', sa.Column('last_message_preview', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True))
+    op.add_column('conversationparticipant', sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Fill in the summaries from existing history, app.repair_conversation_summaries
+    # does the same in batches if they ever drift
+    op.execute("""
+        UPDATE conversation
+        SET last_message_id = latest.id,
+            last_message_at = latest.created_at,
+            last_message_preview = left(latest.content, 255)
+        FROM (
+            SELECT DISTINCT ON (conversation_id) id, conversation_id, created_at, content
+            FROM message
+            WHERE NOT deleted
+            ORDER BY conversation_id, created_at DESC, id DESC
+        ) AS latest
+        WHERE latest.conversation_id = conversation.id
+    """)
+    op.execute("""
+        UPDATE conversationparticipant
+        SET unread_count = unread.count
+        FROM (
+            SELECT participant.conversation_id, participant.user_id, count(*) AS count
+            FROM conversationparticipant AS participant
+            JOIN message
+                ON message.conversation_id = participant.conversation_id
+                AND message.sender_id <> participant.user_id
+                AND NOT message.deleted
+            WHERE NOT EXISTS (
+                SELECT 1 FROM messagereadstatus
+                WHERE messagereadstatus.message_id = message.id
+                AND messagereadstatus.user_id = participant.user_id
+            )
+            GROUP BY participant.conversation_id, participant.user_id
+        ) AS unread
+        WHERE unread.conversation_id = conversationparticipant.conversation_id
+        AND unread.user_id = conversationparticipant.user_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('conversationparticipant', 'unread_count')
+    op.drop_column('conversation', 'last_message_preview')
+    op.drop_column('conversation', 'last_message_at')
+    op.drop_column('conversation', 'last_message_id')
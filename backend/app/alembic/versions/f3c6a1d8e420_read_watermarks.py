@@ -0,0 +1,97 @@
+"""read watermarks
+
+Revision ID: f3c6a1d8e420
+Revises: e5b7c0d93f14
+Create Date: 2026-10-19 18:12:05.204871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c6a1d8e420'
+down_revision: Union[str, None] = 'e5b7c0d93f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversationparticipant', sa.Column('last_read_message_id', sa.Uuid(), nullable=True))
+    op.add_column('conversationparticipant', sa.Column('last_read_message_at', sa.DateTime(), nullable=True))
+    op.add_column('conversationparticipant', sa.Column('last_read_at', sa.DateTime(), nullable=True))
+
+    # Collapse the read rows of each participant into a watermark at the
+    # newest message they read
+    op.execute("""
+        UPDATE conversationparticipant
+        SET last_read_message_id = latest.message_id,
+            last_read_message_at = latest.created_at,
+            last_read_at = latest.read_at
+        FROM (
+            SELECT DISTINCT ON (message.conversation_id, messagereadstatus.user_id)
+                message.conversation_id,
+                messagereadstatus.user_id,
+                message.id AS message_id,
+                message.created_at,
+                max(messagereadstatus.read_at) OVER (
+                    PARTITION BY message.conversation_id, messagereadstatus.user_id
+                ) AS read_at
+            FROM messagereadstatus
+            JOIN message ON message.id = messagereadstatus.message_id
+            ORDER BY message.conversation_id, messagereadstatus.user_id,
+                message.created_at DESC, message.id DESC
+        ) AS latest
+        WHERE latest.conversation_id = conversationparticipant.conversation_id
+        AND latest.user_id = conversationparticipant.user_id
+    """)
+    # Unread messages older than the watermark are read now, recount
+    op.execute("""
+        UPDATE conversationparticipant
+        SET unread_count = (
+            SELECT count(*)
+            FROM message
+            WHERE message.conversation_id = conversationparticipant.conversation_id
+            AND message.sender_id <> conversationparticipant.user_id
+            AND NOT message.deleted
+            AND (
+                conversationparticipant.last_read_message_at IS NULL
+                OR (message.created_at, message.id) > (
+                    conversationparticipant.last_read_message_at,
+                    conversationparticipant.last_read_message_id
+                )
+            )
+        )
+        WHERE last_read_message_id IS NOT NULL
+    """)
+    op.drop_table('messagereadstatus')
+
+
+def downgrade() -> None:
+    op.create_table('messagereadstatus',
+    sa.Column('message_id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('read_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['message_id'], ['message.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('message_id', 'user_id')
+    )
+    # Expand each watermark back into a row per message from others up to it
+    op.execute("""
+        INSERT INTO messagereadstatus (message_id, user_id, read_at)
+        SELECT message.id, participant.user_id, participant.last_read_at
+        FROM conversationparticipant AS participant
+        JOIN message
+            ON message.conversation_id = participant.conversation_id
+            AND message.sender_id <> participant.user_id
+            AND (message.created_at, message.id) <= (
+                participant.last_read_message_at, participant.last_read_message_id
+            )
+        WHERE participant.last_read_message_id IS NOT NULL
+    """)
+    op.drop_column('conversationparticipant', 'last_read_at')
+    op.drop_column('conversationparticipant', 'last_read_message_at')
+    op.drop_column('conversationparticipant', 'last_read_message_id')
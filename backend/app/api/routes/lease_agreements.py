@@ -1,30 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
-from sqlmodel import select
-from typing import List
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 import uuid
 
 from app.api.deps import CurrentUser, SessionDep
-from app.models.lease_agreements import LeaseAgreement, LeaseAgreementPublic, LeaseFileType
+from app.core.config import settings
+from app.crud import lease_agreements as lease_crud
+from app.models.lease_agreements import (
+    LeaseAgreement,
+    LeaseAgreementPublic,
+    LeaseFileType,
+    LeaseSearchResults,
+    LeaseUploadCreate,
+    LeaseUploadStatus,
+)
 from app.models.listings import Listing
-from app.services.file_service import FileStorageService, get_file_format
+from app.models.utils import FileUrl
+from app.services.file_service import FileStorageService, get_file_format, get_file_storage_service
+from app.services.lease_text import index_lease_agreement
+from app.services.resumable_upload import (
+    ChecksumMismatchError,
+    OffsetMismatchError,
+    ResumableUploadStore,
+    UploadBusyError,
+    UploadNotFoundError,
+    UploadState,
+)
 
 router = APIRouter(prefix="/listings", tags=["listings"])
 
-def get_file_storage_service():
-    from app.core.config import settings
-    return FileStorageService(base_dir=settings.UPLOADS_DIR)
 
-@router.post("/{listing_id}/lease-agreements/", response_model=LeaseAgreementPublic)
-async def upload_lease_agreement(*,
-                                 listing_id: uuid.UUID,
-                                 file: UploadFile = File(...),
-                                 description: str = Form(None),
-                                 session: SessionDep,
-                                 file_service: FileStorageService = Depends(get_file_storage_service),
-                                 current_user=CurrentUser):
-    # Check if listing exists and belongs to the user
+def get_resumable_upload_store() -> ResumableUploadStore:
+    return ResumableUploadStore(settings.UPLOADS_DIR)
+
+
+def _get_lease_file_type(filename: str) -> LeaseFileType:
+    file_type = get_file_format(filename)
+    allowed_types = ["application/pdf", "text/plain"]
+    if file_type not in allowed_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File format not allowed for lease agreements. Allowed formats: pdf, txt"
+        )
+    return LeaseFileType(file_type)
+
+
+def _get_owned_listing_without_lease(session: Session, listing_id: uuid.UUID, user_id: uuid.UUID) -> Listing:
     listing = session.exec(
-        select(Listing).where(Listing.id == listing_id, Listing.owner_id == current_user.id)
+        select(Listing).where(Listing.id == listing_id, Listing.owner_id == user_id)
     ).first()
 
     if not listing:
@@ -34,33 +70,26 @@ async def upload_lease_agreement(*,
     if listing.lease_agreement:
         raise HTTPException(status_code=400, detail="Lease agreement already exists for this listing")
 
-    # Validate file type
-    file_type = get_file_format(file.filename)
-    allowed_types = ["application/pdf", "text/plain"]
-    if file_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File format not allowed for lease agreements. Allowed formats: pdf, txt"
-        )
-
-    try:
-        file_type = LeaseFileType(file_type)
-    except ValueError:
-        print(f"Invalid file type: {file_type}")
-        raise HTTPException(status_code=400, detail=f"Invalid file type: {file_type}")
+    return listing
 
-    # Save file and get its path
-    file_path = await file_service.save_file(file, listing_id)
-    file_size = file.size
 
-    # Create new lease agreement record
+def _create_lease_agreement(*,
+                            session: Session,
+                            listing: Listing,
+                            filename: str,
+                            file_path: str,
+                            file_type: LeaseFileType,
+                            file_size: int,
+                            description: Optional[str],
+                            background_tasks: BackgroundTasks,
+                            file_service: FileStorageService) -> LeaseAgreement:
     new_agreement = LeaseAgreement(
-        filename=file.filename,
+        filename=filename,
         file_path=file_path,
         file_type=file_type,
         file_size=file_size,
         description=description,
-        listing_id=listing_id
+        listing_id=listing.id
     )
 
     listing.lease_agreement = new_agreement
@@ -71,8 +100,210 @@ async def upload_lease_agreement(*,
     session.refresh(new_agreement)
     session.refresh(listing)
 
+    # Extract and index the text once the response has been sent
+    background_tasks.add_task(
+        index_lease_agreement,
+        new_agreement.id,
+        new_agreement.file_path,
+        new_agreement.file_type.value,
+        file_service.backend
+    )
+
     return new_agreement
 
+
+def _upload_status(state: UploadState) -> LeaseUploadStatus:
+    return LeaseUploadStatus(upload_id=state.id, offset=state.offset, size=state.size)
+
+
+def _get_user_upload(store: ResumableUploadStore, listing_id: uuid.UUID, upload_id: str, user_id: uuid.UUID) -> UploadState:
+    try:
+        state = store.get(upload_id)
+    except UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if state.listing_id != str(listing_id) or state.user_id != str(user_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return state
+
+@router.post("/{listing_id}/lease-agreements/", response_model=LeaseAgreementPublic)
+async def upload_lease_agreement(*,
+                                 listing_id: uuid.UUID,
+                                 file: UploadFile = File(...),
+                                 description: str = Form(None),
+                                 session: SessionDep,
+                                 background_tasks: BackgroundTasks,
+                                 file_service: FileStorageService = Depends(get_file_storage_service),
+                                 current_user=CurrentUser):
+    # Check if listing exists, belongs to the user and has no lease agreement yet
+    listing = _get_owned_listing_without_lease(session, listing_id, current_user.id)
+
+    # Validate file type
+    file_type = _get_lease_file_type(file.filename)
+
+    # Save file and get its path
+    file_path = await file_service.save_file(file, listing_id)
+
+    return _create_lease_agreement(
+        session=session,
+        listing=listing,
+        filename=file.filename,
+        file_path=file_path,
+        file_type=file_type,
+        file_size=file.size,
+        description=description,
+        background_tasks=background_tasks,
+        file_service=file_service
+    )
+
+
+# Resumable uploads for large lease documents, following the tus protocol:
+# create an upload, PATCH chunks at the current offset, then complete it.
+
+@router.post("/{listing_id}/lease-agreements/uploads", response_model=LeaseUploadStatus, status_code=201)
+def create_lease_agreement_upload(*,
+                                  listing_id: uuid.UUID,
+                                  upload_in: LeaseUploadCreate,
+                                  session: SessionDep,
+                                  store: ResumableUploadStore = Depends(get_resumable_upload_store),
+                                  current_user: CurrentUser):
+    """Start a resumable lease agreement upload"""
+    _get_owned_listing_without_lease(session, listing_id, current_user.id)
+    _get_lease_file_type(upload_in.filename)
+
+    if upload_in.size > settings.LEASE_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Lease agreement file is too large")
+
+    state = store.create(
+        listing_id=listing_id,
+        user_id=current_user.id,
+        filename=upload_in.filename,
+        size=upload_in.size,
+        description=upload_in.description
+    )
+    return _upload_status(state)
+
+
+@router.get("/{listing_id}/lease-agreements/uploads/{upload_id}", response_model=LeaseUploadStatus)
+def get_lease_agreement_upload(*,
+                               listing_id: uuid.UUID,
+                               upload_id: str,
+                               store: ResumableUploadStore = Depends(get_resumable_upload_store),
+                               current_user: CurrentUser):
+    """Get the offset to resume a lease agreement upload from"""
+    state = _get_user_upload(store, listing_id, upload_id, current_user.id)
+    return _upload_status(state)
+
+
+@router.patch("/{listing_id}/lease-agreements/uploads/{upload_id}", response_model=LeaseUploadStatus)
+async def append_lease_agreement_upload(*,
+                                        listing_id: uuid.UUID,
+                                        upload_id: str,
+                                        request: Request,
+                                        upload_offset: int = Header(..., alias="Upload-Offset"),
+                                        upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+                                        store: ResumableUploadStore = Depends(get_resumable_upload_store),
+                                        current_user: CurrentUser):
+    """
+    Append the raw request body at Upload-Offset.
+
+    An optional Upload-Checksum header (``sha256 <base64 digest>``) is
+    verified before the chunk is stored.
+    """
+    _get_user_upload(store, listing_id, upload_id, current_user.id)
+
+    chunk = bytearray()
+    async for part in request.stream():
+        chunk.extend(part)
+        if len(chunk) > settings.UPLOAD_CHUNK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Chunk is too large")
+
+    try:
+        state = await run_in_threadpool(store.append, upload_id, upload_offset, bytes(chunk), upload_checksum)
+    except OffsetMismatchError as e:
+        raise HTTPException(status_code=409, detail=f"Upload offset should be {e.expected}")
+    except ChecksumMismatchError as e:
+        # 460 is the tus status code for a checksum mismatch
+        raise HTTPException(status_code=460, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return _upload_status(state)
+
+
+@router.post("/{listing_id}/lease-agreements/uploads/{upload_id}/complete", response_model=LeaseAgreementPublic)
+async def complete_lease_agreement_upload(*,
+                                          listing_id: uuid.UUID,
+                                          upload_id: str,
+                                          session: SessionDep,
+                                          background_tasks: BackgroundTasks,
+                                          store: ResumableUploadStore = Depends(get_resumable_upload_store),
+                                          file_service: FileStorageService = Depends(get_file_storage_service),
+                                          current_user: CurrentUser):
+    """Turn a fully received upload into the listing's lease agreement"""
+    state = _get_user_upload(store, listing_id, upload_id, current_user.id)
+    if not state.is_complete:
+        raise HTTPException(status_code=409, detail=f"Upload is incomplete, received {state.offset} of {state.size} bytes")
+
+    listing = _get_owned_listing_without_lease(session, listing_id, current_user.id)
+    file_type = _get_lease_file_type(state.filename)
+
+    try:
+        with store.completing(upload_id) as part_path:
+            # Moves the received file into storage, no second copy of the bytes locally
+            file_path = await file_service.adopt_file(part_path, state.filename, listing_id)
+            store.discard(upload_id)
+    except UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadBusyError:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    except OffsetMismatchError as e:
+        raise HTTPException(status_code=409, detail=f"Upload is incomplete, received {e.expected} of {state.size} bytes")
+
+    return _create_lease_agreement(
+        session=session,
+        listing=listing,
+        filename=state.filename,
+        file_path=file_path,
+        file_type=file_type,
+        file_size=state.size,
+        description=state.description,
+        background_tasks=background_tasks,
+        file_service=file_service
+    )
+
+
+@router.delete("/{listing_id}/lease-agreements/uploads/{upload_id}")
+def cancel_lease_agreement_upload(*,
+                                  listing_id: uuid.UUID,
+                                  upload_id: str,
+                                  store: ResumableUploadStore = Depends(get_resumable_upload_store),
+                                  current_user: CurrentUser):
+    """Abandon a resumable upload and discard the received bytes"""
+    _get_user_upload(store, listing_id, upload_id, current_user.id)
+    store.discard(upload_id)
+    return {"status": "success"}
+
+@router.get("/lease-agreements/search", response_model=LeaseSearchResults)
+def search_lease_agreements(*,
+                            q: str = Query(..., min_length=2, max_length=200),
+                            skip: int = Query(0, ge=0),
+                            limit: int = Query(20, ge=1, le=100),
+                            session: SessionDep,
+                            current_user: CurrentUser):
+    """
+    Find listings whose lease agreement mentions the given terms, best matches first.
+
+    Every listing is searched. Lease agreements are only shown to their
+    listing's owner, so the matching passages are left out of other
+    listings' results unless the caller is a superuser.
+    """
+    snippet_owner_id = None if current_user.is_superuser else current_user.id
+    results, count = lease_crud.search_lease_agreements(
+        session, q, skip=skip, limit=limit, snippet_owner_id=snippet_owner_id
+    )
+    return LeaseSearchResults(data=results, count=count)
+
+
 @router.delete("/{listing_id}/lease-agreements/{agreement_id}")
 async def delete_lease_agreement(*,
                                  listing_id: uuid.UUID,
@@ -122,6 +353,32 @@ async def get_lease_agreements(*,
         raise HTTPException(status_code=404, detail="Lease Agreement Not Found")
 
 
+@router.get("/{listing_id}/lease-agreements/{agreement_id}/url", response_model=FileUrl)
+def get_lease_agreement_url(*,
+                            listing_id: uuid.UUID,
+                            agreement_id: uuid.UUID,
+                            session: SessionDep,
+                            file_service: FileStorageService = Depends(get_file_storage_service),
+                            current_user: CurrentUser):
+    """Get a short-lived URL to download the lease agreement directly from storage"""
+    listing = session.get(Listing, listing_id)
+    if not listing:
+        raise HTTPException(status_code=404, detail="Listing not found")
+
+    # Check if user is owner or a superuser
+    if listing.owner_id != current_user.id and not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to view these lease agreements")
+
+    agreement = session.get(LeaseAgreement, agreement_id)
+    if not agreement or agreement.listing_id != listing_id:
+        raise HTTPException(status_code=404, detail="Lease agreement not found")
+
+    return FileUrl(
+        url=file_service.get_download_url(agreement.file_path),
+        expires_in=settings.PRESIGNED_URL_EXPIRE_SECONDS
+    )
+
+
 @router.put("/{listing_id}/lease-agreements/{agreement_id}", response_model=LeaseAgreementPublic)
 async def update_lease_agreement(*,
                                  listing_id: uuid.UUID,
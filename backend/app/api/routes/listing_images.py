@@ -1,20 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
-from sqlmodel import select
-from typing import List
+import asyncio
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Body, Query
+from sqlmodel import func, select
+from typing import List, Optional
 import uuid
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models.images import Image, ImagePublic, ImageFileType
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app.crud import images as image_crud
+from app.core.config import settings
+from app.models.images import (
+    DuplicateImage,
+    DuplicateImageCluster,
+    DuplicateImageClusters,
+    Image,
+    ImageFileType,
+    ImageOrderUpdate,
+    ImagePublic,
+    ImageUploadComplete,
+    ImageUploadUrl,
+    ImageUploadUrlCreate,
+)
 from app.models.listings import Listing
-from app.services.file_service import FileStorageService, get_file_format
+from app.models.utils import FileUrl
+from app.services.file_service import FileStorageService, get_file_format, get_file_storage_service
+from app.services.image_hashing import cross_owner_clusters, hash_upload
+from app.services.image_processing import process_stored_image
 
 router = APIRouter(prefix="/listings", tags=["listings"])
 
-
-# Dependency for FileStorageService
-def get_file_storage_service():
-    from app.core.config import settings
-    return FileStorageService(base_dir=settings.UPLOADS_DIR)
+# Upper bound on files accepted by a single batch upload request
+MAX_BATCH_UPLOAD_FILES = 30
+# Longest filename Image.filename holds
+MAX_IMAGE_FILENAME_LENGTH = 255
+# Largest distance the duplicate search accepts. It splits hashes into
+# max_distance + 1 chunks; beyond 4 they are too narrow (under 12 bits) to
+# keep candidate buckets small on a large image table.
+MAX_DUPLICATE_DISTANCE = 4
+
+
+@router.get(
+    "/images/duplicates",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=DuplicateImageClusters
+)
+def get_duplicate_images(*,
+                         session: SessionDep,
+                         max_distance: int = Query(MAX_DUPLICATE_DISTANCE, ge=0, le=MAX_DUPLICATE_DISTANCE),
+                         limit: int = Query(100, ge=1, le=1000)
+                         ):
+    """
+    Find photos reused across listings of different owners.
+
+    Images whose perceptual hashes differ by at most ``max_distance`` bits
+    are grouped together, and only groups spanning two or more owners are
+    returned, largest first.
+    """
+    rows = list(image_crud.iter_image_hashes(session))
+    hashes = [row[3] for row in rows]
+    owner_ids = [row[2] for row in rows]
+
+    clusters = cross_owner_clusters(hashes, owner_ids, max_distance)
+    clusters.sort(key=len, reverse=True)
+
+    data = [
+        DuplicateImageCluster(
+            images=[
+                DuplicateImage(id=rows[i][0], listing_id=rows[i][1], owner_id=rows[i][2], phash=rows[i][3])
+                for i in members
+            ],
+            owner_count=len({owner_ids[i] for i in members}),
+        )
+        for members in clusters[:limit]
+    ]
+    return DuplicateImageClusters(data=data, count=len(clusters))
 
 
 @router.post("/{listing_id}/images/", response_model=ImagePublic)
@@ -22,6 +82,7 @@ async def upload_listing_image(*,
                                listing_id: uuid.UUID,
                                file: UploadFile = File(...),
                                is_primary: bool = Form(False),
+                               background_tasks: BackgroundTasks,
                                session: SessionDep,
                                file_service: FileStorageService = Depends(get_file_storage_service),
                                current_user = CurrentUser
@@ -37,6 +98,9 @@ async def upload_listing_image(*,
     # Get file type first
     file_type = get_file_format(file.filename)
 
+    # Hash before saving, while the upload is still readable from the start
+    phash = await run_in_threadpool(hash_upload, file.file)
+
     # Save the file and get the path
     file_path = await file_service.save_file(file, listing_id)
 
@@ -45,16 +109,7 @@ async def upload_listing_image(*,
 
     # If this is marked as primary, update all other images
     if is_primary:
-        existing_primary_images = session.exec(
-            select(Image).where(
-                Image.listing_id == listing_id,
-                Image.is_primary == True
-            )
-        ).all()
-
-        for image in existing_primary_images:
-            image.is_primary = False
-            session.add(image)
+        image_crud.clear_primary_image(session, listing_id)
 
     # Create new image record
     new_image = Image(
@@ -63,6 +118,191 @@ async def upload_listing_image(*,
         file_type=file_type,
         file_size=file_size,
         is_primary=is_primary,
+        listing_id=listing_id,
+        phash=phash
+    )
+
+    session.add(new_image)
+    session.commit()
+    session.refresh(new_image)
+
+    background_tasks.add_task(process_stored_image, new_image.id, new_image.file_path, file_service.backend)
+
+    return new_image
+
+
+@router.post("/{listing_id}/images/batch", response_model=List[ImagePublic])
+async def upload_listing_images_batch(*,
+                                      listing_id: uuid.UUID,
+                                      files: List[UploadFile] = File(...),
+                                      primary_index: Optional[int] = Form(None),
+                                      background_tasks: BackgroundTasks,
+                                      session: SessionDep,
+                                      file_service: FileStorageService = Depends(get_file_storage_service),
+                                      current_user: CurrentUser
+                                      ):
+    """
+    Upload several images to a listing in one request.
+
+    Files are written concurrently and all image records are inserted in a
+    single transaction, appended after the listing's existing images.
+    ``primary_index`` optionally marks one of the uploaded files as primary.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. At most {MAX_BATCH_UPLOAD_FILES} images can be uploaded at once"
+        )
+    if primary_index is not None and not 0 <= primary_index < len(files):
+        raise HTTPException(status_code=400, detail="primary_index is out of range")
+    if any(len(file.filename) > MAX_IMAGE_FILENAME_LENGTH for file in files):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Filenames can be at most {MAX_IMAGE_FILENAME_LENGTH} characters long"
+        )
+
+    # Check if listing exists and belongs to the user
+    listing = session.exec(
+        select(Listing).where(Listing.id == listing_id, Listing.owner_id == current_user.id)
+    ).first()
+
+    if not listing:
+        raise HTTPException(status_code=404, detail="Listing not found")
+
+    # Validate every file before writing anything
+    file_types = [get_file_format(file.filename) for file in files]
+    allowed_types = [image_type.value for image_type in ImageFileType]
+    for file_type in file_types:
+        if file_type not in allowed_types:
+            raise HTTPException(
+                status_code=400,
+                detail="File format not allowed for images. Allowed formats: jpg, jpeg, png, webp, gif"
+            )
+
+    phashes = await asyncio.gather(*(run_in_threadpool(hash_upload, file.file) for file in files))
+    file_paths = await file_service.save_files(files, listing_id)
+
+    try:
+        # Append the new images after the existing ones
+        next_order = session.exec(
+            select(func.coalesce(func.max(Image.display_order) + 1, 0)).where(
+                Image.listing_id == listing_id
+            )
+        ).one()
+
+        if primary_index is not None:
+            image_crud.clear_primary_image(session, listing_id)
+
+        new_images = [
+            Image(
+                filename=file.filename,
+                file_path=file_path,
+                file_type=file_type,
+                file_size=file.size,
+                is_primary=index == primary_index,
+                display_order=next_order + index,
+                listing_id=listing_id,
+                phash=phash
+            )
+            for index, (file, file_path, file_type, phash) in enumerate(
+                zip(files, file_paths, file_types, phashes)
+            )
+        ]
+        # Build the response before commit expires the instances
+        response = [ImagePublic.model_validate(image) for image in new_images]
+
+        session.add_all(new_images)
+        session.commit()
+    except Exception:
+        session.rollback()
+        await file_service.delete_files(file_paths)
+        raise
+
+    for image in response:
+        background_tasks.add_task(process_stored_image, image.id, image.file_path, file_service.backend)
+
+    return response
+
+
+@router.post("/{listing_id}/images/upload-url", response_model=ImageUploadUrl)
+def create_listing_image_upload_url(*,
+                                    listing_id: uuid.UUID,
+                                    upload_in: ImageUploadUrlCreate,
+                                    session: SessionDep,
+                                    file_service: FileStorageService = Depends(get_file_storage_service),
+                                    current_user: CurrentUser
+                                    ):
+    """
+    Get a presigned URL to PUT an image directly to storage.
+
+    Once the upload succeeds, register it with POST /{listing_id}/images/uploaded.
+    """
+    listing = session.get(Listing, listing_id)
+    if not listing or listing.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Listing not found")
+
+    file_type = get_file_format(upload_in.filename)
+    if file_type not in [image_type.value for image_type in ImageFileType]:
+        raise HTTPException(
+            status_code=400,
+            detail="File format not allowed for images. Allowed formats: jpg, jpeg, png, webp, gif"
+        )
+
+    if not file_service.supports_direct_upload:
+        raise HTTPException(status_code=400, detail="Direct uploads are not supported by this storage backend")
+
+    file_path, upload_url = file_service.create_upload_url(upload_in.filename, listing_id)
+
+    return ImageUploadUrl(
+        file_path=file_path,
+        upload_url=upload_url,
+        expires_in=settings.PRESIGNED_URL_EXPIRE_SECONDS
+    )
+
+
+@router.post("/{listing_id}/images/uploaded", response_model=ImagePublic)
+async def register_uploaded_listing_image(*,
+                                          listing_id: uuid.UUID,
+                                          upload_in: ImageUploadComplete,
+                                          background_tasks: BackgroundTasks,
+                                          session: SessionDep,
+                                          file_service: FileStorageService = Depends(get_file_storage_service),
+                                          current_user: CurrentUser
+                                          ):
+    """Record an image the client uploaded directly to storage"""
+    listing = session.get(Listing, listing_id)
+    if not listing or listing.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Listing not found")
+
+    if not file_service.supports_direct_upload:
+        raise HTTPException(status_code=400, detail="Direct uploads are not supported by this storage backend")
+
+    # Only keys handed out by /images/upload-url, never a file already in use
+    if not file_service.is_issued_file_key(upload_in.file_path, listing_id):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    if session.exec(select(Image.id).where(Image.file_path == upload_in.file_path)).first():
+        raise HTTPException(status_code=409, detail="File is already registered")
+
+    file_type = get_file_format(upload_in.file_path)
+    if file_type not in [image_type.value for image_type in ImageFileType]:
+        raise HTTPException(status_code=400, detail="Invalid file path")
+
+    # Size comes from storage, which also proves the upload actually happened
+    file_size = await file_service.get_file_size(upload_in.file_path)
+    if file_size is None:
+        raise HTTPException(status_code=400, detail="File has not been uploaded")
+
+    if upload_in.is_primary:
+        image_crud.clear_primary_image(session, listing_id)
+
+    new_image = Image(
+        filename=upload_in.filename,
+        file_path=upload_in.file_path,
+        file_type=file_type,
+        file_size=file_size,
+        is_primary=upload_in.is_primary,
         listing_id=listing_id
     )
 
@@ -70,9 +310,32 @@ async def upload_listing_image(*,
     session.commit()
     session.refresh(new_image)
 
+    # The file never passed through us, so it also still needs its perceptual hash
+    background_tasks.add_task(
+        process_stored_image, new_image.id, new_image.file_path, file_service.backend, with_phash=True
+    )
+
     return new_image
 
 
+@router.get("/{listing_id}/images/{image_id}/url", response_model=FileUrl)
+def get_listing_image_url(*,
+                          listing_id: uuid.UUID,
+                          image_id: uuid.UUID,
+                          session: SessionDep,
+                          file_service: FileStorageService = Depends(get_file_storage_service)
+                          ):
+    """Get a URL to download an image directly from storage"""
+    image = session.get(Image, image_id)
+    if not image or image.listing_id != listing_id:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    return FileUrl(
+        url=file_service.get_download_url(image.file_path),
+        expires_in=settings.PRESIGNED_URL_EXPIRE_SECONDS
+    )
+
+
 @router.delete("/{listing_id}/images/{image_id}")
 async def delete_listing_image(*,
         listing_id: uuid.UUID,
@@ -119,6 +382,46 @@ async def get_listing_images(*,
     return images
 
 
+@router.put("/{listing_id}/images/order", response_model=List[ImagePublic])
+async def reorder_listing_images(*,
+                                 listing_id: uuid.UUID,
+                                 order_in: ImageOrderUpdate,
+                                 session: SessionDep,
+                                 current_user: CurrentUser
+                                 ):
+    """Set the display order of all images, and optionally the primary image, at once"""
+    # Check if listing exists and belongs to current user
+    listing = session.get(Listing, listing_id)
+    if not listing or listing.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Listing not found")
+
+    if len(set(order_in.image_ids)) != len(order_in.image_ids):
+        raise HTTPException(status_code=400, detail="Duplicate image ids")
+
+    existing_ids = set(image_crud.get_listing_image_ids(session, listing_id))
+    if set(order_in.image_ids) != existing_ids:
+        raise HTTPException(
+            status_code=400,
+            detail="image_ids must contain every image of the listing exactly once"
+        )
+    if order_in.primary_image_id is not None and order_in.primary_image_id not in existing_ids:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    image_crud.reorder_listing_images(
+        session,
+        listing_id=listing_id,
+        image_ids=order_in.image_ids,
+        primary_image_id=order_in.primary_image_id
+    )
+    session.commit()
+
+    images = session.exec(
+        select(Image).where(Image.listing_id == listing_id).order_by(Image.display_order)
+    ).all()
+
+    return images
+
+
 @router.put("/{listing_id}/images/{image_id}", response_model=ImagePublic)
 async def update_listing_image(*,
                               listing_id: uuid.UUID,
@@ -141,17 +444,7 @@ async def update_listing_image(*,
 
     # If setting this image as primary, update all other images
     if is_primary:
-        existing_primary_images = session.exec(
-            select(Image).where(
-                Image.listing_id == listing_id,
-                Image.is_primary == True,
-                Image.id != image_id
-            )
-        ).all()
-
-        for existing_image in existing_primary_images:
-            existing_image.is_primary = False
-            session.add(existing_image)
+        image_crud.set_primary_image(session, listing_id, image_id)
 
     # Update image
     image.is_primary = is_primary
@@ -2,12 +2,14 @@ import uuid
 from typing import Any
 
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import selectinload
 from sqlmodel import func, select
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models.listings import Listing, ListingCreate, ListingPublic, ListingsPublic, ListingUpdate
+from app.api.deps import AsyncSessionDep, CurrentUser, SessionDep
+from app.models.images import ImagePublic
+from app.models.listings import Listing, ListingCreate, ListingPublic, ListingsPublic, ListingUpdate, with_images
 from app.models.utils import Message
-from app.services.file_service import FileStorageService
+from app.services.file_service import FileStorageService, get_file_storage_service
 
 from app.crud import users as crud_users
 import logging
@@ -18,29 +20,31 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/listings", tags=["listings"])
 
 
-def get_file_storage_service():
-    from app.core.config import settings
-    return FileStorageService(base_dir=settings.UPLOADS_DIR)
+# Browsing runs on the async session, where relationships can't be loaded
+# lazily. Images and lease agreements are loaded up front, a query each
+# for the whole page.
+def _with_relations(statement):
+    return with_images(statement).options(selectinload(Listing.lease_agreement))
 
 
 @router.get("/", response_model=ListingsPublic)
-def read_listings(
-        session: SessionDep, skip: int = 0, limit: int = 100
+async def read_listings(
+        session: AsyncSessionDep, skip: int = 0, limit: int = 100
 ) -> Any:
     """
     Retrieve listings.
     """
 
     count_statement = select(func.count()).select_from(Listing)
-    count = session.exec(count_statement).one()
-    statement = select(Listing).offset(skip).limit(limit)
-    listings = session.exec(statement).all()
+    count = (await session.exec(count_statement)).one()
+    statement = _with_relations(select(Listing).offset(skip).limit(limit))
+    listings = (await session.exec(statement)).all()
 
     processed_listings = []
     for listing in listings:
         listing_dict = listing.dict()
         # Convert Image objects to dictionaries
-        listing_dict["images"] = [img.dict() for img in listing.images]
+        listing_dict["images"] = [ImagePublic.model_validate(img).model_dump() for img in listing.images]
         if listing.lease_agreement:
             listing_dict["lease_agreement"] = listing.lease_agreement.dict()
         processed_listings.append(ListingPublic.model_validate(listing_dict))
@@ -49,24 +53,24 @@ def read_listings(
 
 
 @router.get("/all", response_model=ListingsPublic)
-def read_all_listings(
-        session: SessionDep, skip: int = 0, limit: int = 100
+async def read_all_listings(
+        session: AsyncSessionDep, skip: int = 0, limit: int = 100
 ) -> Any:
     """
     Retrieve listings.
     """
 
     count_statement = select(func.count()).select_from(Listing)
-    count = session.exec(count_statement).one()
-    statement = select(Listing).offset(skip).limit(limit)
-    listings = session.exec(statement).all()
+    count = (await session.exec(count_statement)).one()
+    statement = _with_relations(select(Listing).offset(skip).limit(limit))
+    listings = (await session.exec(statement)).all()
 
     # Convert listings to ListingPublic objects with image data
     processed_listings = []
     for listing in listings:
         listing_dict = listing.dict()
         # Convert Image objects to dictionaries
-        listing_dict["images"] = [img.dict() for img in listing.images]
+        listing_dict["images"] = [ImagePublic.model_validate(img).model_dump() for img in listing.images]
         if listing.lease_agreement:
             listing_dict["lease_agreement"] = listing.lease_agreement.dict()
 
@@ -76,17 +80,17 @@ def read_all_listings(
 
 
 @router.get("/{id}", response_model=ListingPublic)
-def read_listing(*, session: SessionDep, id: uuid.UUID) -> Any:
+async def read_listing(*, session: AsyncSessionDep, id: uuid.UUID) -> Any:
     """
     Get listing by ID.
     """
-    listing = session.get(Listing, id)
+    listing = (await session.exec(_with_relations(select(Listing).where(Listing.id == id)))).first()
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
 
     # For images
     listing_dict = listing.dict()
-    listing_dict["images"] = [img.dict() for img in listing.images]
+    listing_dict["images"] = [ImagePublic.model_validate(img).model_dump() for img in listing.images]
     if listing.lease_agreement:
         listing_dict["lease_agreement"] = listing.lease_agreement.dict()
     return ListingPublic.model_validate(listing_dict)
@@ -123,14 +127,14 @@ def update_listing(
     if not current_user.is_superuser and (listing.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     update_dict = listing_in.model_dump(exclude_unset=True)
-    update_dict["images"] = [img.dict() for img in listing.images]
+    update_dict["images"] = [ImagePublic.model_validate(img).model_dump() for img in listing.images]
     listing.sqlmodel_update(update_dict)
     session.add(listing)
     session.commit()
     session.refresh(listing)
 
     listing_dict = listing.dict()
-    listing_dict["images"] = [img.dict() for img in listing.images]
+    listing_dict["images"] = [ImagePublic.model_validate(img).model_dump() for img in listing.images]
     if listing.lease_agreement:
         listing_dict["lease_agreement"] = listing.lease_agreement.dict()
 
@@ -198,4 +202,4 @@ def listing_save_email(*, session: SessionDep, email: str) -> Message:
         subject=email_data.subject,
         html_content=email_data.html_content,
     )
-    return Message(message="Email sent successfully.")
\ No newline at end of file
+    return Message(message="Email sent successfully.")
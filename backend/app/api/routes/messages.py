@@ -1,10 +1,11 @@
 import asyncio
 import uuid
-from typing import Any, List
+from typing import Any, List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, status, Body
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query, status, Body
 from starlette.websockets import WebSocketState
+from sqlmodel import Session
 from app.crud import users as crud_users
 from app.api.deps import SessionDep
 from app.crud import messages as message_crud
@@ -22,6 +23,8 @@ from app.models.messages import (
     UserBlockCreate, Conversation
 )
 from app.api.websockets import manager
+from app.services.db_executor import get_db_executor
+from app.services.participant_cache import get_participant_cache
 import json
 import logging
 from datetime import datetime
@@ -34,6 +37,45 @@ router = APIRouter(prefix="/messages", tags=["messages"])
 logger = logging.getLogger(__name__)
 
 
+# Units of work the websocket endpoint runs on the database executor, each
+# in a single session. Returned models are detached but fully loaded.
+
+def _send_message(session: Session, sender_id: UUID, message_in: MessageCreate):
+    db_message = message_crud.create_message(session, sender_id=sender_id, message_in=message_in)
+    participant_ids = message_crud.get_conversation_participants(session, db_message.conversation_id)
+    read_receipts = message_crud.get_read_receipts(session, [db_message])[db_message.id]
+    return db_message, participant_ids, read_receipts
+
+
+def _edit_message(session: Session, message_id: UUID, user_id: UUID, message_update: MessageUpdate):
+    message = message_crud.update_message(
+        session=session, message_id=message_id, user_id=user_id, message_update=message_update
+    )
+    if not message:
+        return None, []
+    return message, message_crud.get_conversation_participants(session, message.conversation_id)
+
+
+def _delete_message(session: Session, message_id: UUID, user_id: UUID):
+    message = message_crud.delete_message(session=session, message_id=message_id, user_id=user_id)
+    if not message:
+        return None, []
+    return message, message_crud.get_conversation_participants(session, message.conversation_id)
+
+
+def _open_conversation(session: Session, user_id: UUID, conversation_id: UUID):
+    count = message_crud.mark_conversation_as_read(
+        session=session, user_id=user_id, conversation_id=conversation_id
+    )
+    return count, message_crud.get_conversation(session, conversation_id)
+
+
+def _read_message(session: Session, message_id: UUID, user_id: UUID, conversation_id: UUID):
+    if not message_crud.mark_message_as_read(session, message_id, user_id):
+        return False, []
+    return True, message_crud.get_conversation_participants(session, conversation_id)
+
+
 @router.websocket("/ws/{token}")
 async def websocket_endpoint(websocket: WebSocket, token: str):
     """
@@ -188,13 +230,16 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
     # For cleanup
     ping_task = None
     user_id = None
+    connection_id = None
+    # Database work goes through the executor, a session per unit of work,
+    # so queries never block the event loop other connections share
+    db = get_db_executor()
 
     try:
         # Authenticate using the token
-        auth_session = next(deps.get_db())
         try:
             logger.info(f"WebSocket connection attempt with token: {token[:10]}...")
-            user = deps.get_current_user(session=auth_session, token=token)
+            user = await db.run(deps.get_current_user, token=token)
             logger.info(f"Authentication successful for user: {user.id}")
             user_id = user.id
         except Exception as auth_error:
@@ -202,16 +247,13 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             await websocket.close(code=1008, reason="Authentication failed")
             connection_closed = True
             return
-        finally:
-            # Close the auth session immediately after authentication
-            auth_session.close()
 
         logger.info(f"Accepting connection for user {user_id}")
 
         # Connect this websocket to the connection manager
         try:
-            await manager.connect(websocket, user_id)
-            logger.info(f"Connection established for user {user_id}")
+            connection_id = await manager.connect(websocket, user_id)
+            logger.info(f"Connection {connection_id} established for user {user_id}")
         except Exception as conn_error:
             logger.error(f"Connection manager error: {str(conn_error)}")
             if not connection_closed:
@@ -226,10 +268,10 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     await asyncio.sleep(20)  # Send ping every 20 seconds
                     if websocket.client_state == WebSocketState.CONNECTED:
                         try:
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "ping",
                                 "timestamp": datetime.utcnow().isoformat()
-                            }))
+                            })
                             logger.debug(f"Ping sent to user {user_id}")
                         except Exception as e:
                             logger.error(f"Error sending ping: {str(e)}")
@@ -244,7 +286,6 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
         try:
             while True:
                 # Wait for messages from the client
-                session = next(deps.get_db())
                 try:
                     # Use a timeout to detect dead connections
                     data = await asyncio.wait_for(
@@ -257,7 +298,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
                     # Validate message structure
                     if "type" not in message_data:
-                        await websocket.send_text(json.dumps({"error": "Missing message type"}))
+                        await manager.send_to_connection(connection_id, {"error": "Missing message type"})
                         continue
 
                     # Handle different message types
@@ -267,9 +308,9 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                             if "new_conversation" in message_data and message_data["new_conversation"]:
                                 # Validate required fields for new conversation
                                 if "participant_ids" not in message_data or "is_group" not in message_data:
-                                    await websocket.send_text(json.dumps({
+                                    await manager.send_to_connection(connection_id, {
                                         "error": "Missing required fields for new conversation"
-                                    }))
+                                    })
                                     continue
 
                                 # Convert participant IDs to UUID objects
@@ -283,41 +324,41 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                                 )
 
                                 try:
-                                    conversation = message_crud.create_conversation(
-                                        session=session,
+                                    conversation = await db.run(
+                                        message_crud.create_conversation,
                                         creator_id=user_id,
                                         conversation_in=conversation_create
                                     )
                                     conversation_id = conversation.id
                                 except HTTPException as http_ex:
-                                    await websocket.send_text(json.dumps({
+                                    await manager.send_to_connection(connection_id, {
                                         "type": "error",
                                         "status_code": http_ex.status_code,
                                         "detail": http_ex.detail
-                                    }))
+                                    })
                                     continue
                             else:
                                 # For existing conversation, validate conversation_id
                                 if "conversation_id" not in message_data:
-                                    await websocket.send_text(json.dumps({
+                                    await manager.send_to_connection(connection_id, {
                                         "error": "Missing conversation_id for existing conversation"
-                                    }))
+                                    })
                                     continue
 
                                 conversation_id = UUID(message_data["conversation_id"])
 
                                 # Verify the conversation exists and user is a participant
-                                participants = message_crud.get_conversation_participants(session, conversation_id)
+                                participants = await db.run(message_crud.get_conversation_participants, conversation_id)
                                 if not participants or user_id not in participants:
-                                    await websocket.send_text(json.dumps({
+                                    await manager.send_to_connection(connection_id, {
                                         "type": "error",
                                         "detail": "Conversation not found or you're not a participant"
-                                    }))
+                                    })
                                     continue
 
                             # Validate content
                             if "content" not in message_data:
-                                await websocket.send_text(json.dumps({"error": "Missing message content"}))
+                                await manager.send_to_connection(connection_id, {"error": "Missing message content"})
                                 continue
 
                             # Create a message in the database
@@ -326,21 +367,11 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                                 content=message_data["content"]
                             )
 
-                            # Create the message
-                            db_message = message_crud.create_message(
-                                session=session,
-                                sender_id=user_id,
-                                message_in=message_create
+                            # Create the message and load its participants and read receipts
+                            db_message, participant_ids, read_receipts = await db.run(
+                                _send_message, sender_id=user_id, message_in=message_create
                             )
 
-                            # Get the conversation participants
-                            participant_ids = message_crud.get_conversation_participants(
-                                session, db_message.conversation_id
-                            )
-
-                            # Get message read receipts
-                            _, read_receipts = message_crud.get_message_with_read_status(session, db_message.id)
-
                             # Convert to dict for sending via WebSocket
                             message_dict = {
                                 "id": str(db_message.id),
@@ -355,16 +386,17 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                                 ]
                             }
 
-                            # Broadcast to all participants except the sender
+                            # Broadcast to all participants and the sender's other devices
                             await manager.broadcast_conversation_message(
                                 message_data=message_dict,
                                 conversation_id=db_message.conversation_id,
                                 participant_ids=participant_ids,
-                                sender_id=user_id
+                                sender_id=user_id,
+                                origin_connection_id=connection_id
                             )
 
                             # Send confirmation back to the sender
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "message_sent",
                                 "message_id": str(db_message.id),
                                 "conversation_id": str(db_message.conversation_id),
@@ -372,49 +404,44 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                                 "created_at": db_message.created_at.isoformat(),
                                 "status": "sent",
                                 "participant_count": len(participant_ids) - 1  # Exclude sender
-                            }))
+                            })
                         except HTTPException as http_ex:
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "status_code": http_ex.status_code,
                                 "detail": http_ex.detail
-                            }))
+                            })
                         except Exception as e:
                             logger.exception(f"Error creating message: {str(e)}")
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "Failed to create message"
-                            }))
+                            })
 
                     elif message_data["type"] == "edit_message":
                         if "message_id" not in message_data or "content" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing required fields for edit message"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing required fields for edit message"})
                             continue
 
                         message_id = UUID(message_data["message_id"])
                         content = message_data["content"]
 
                         try:
-                            # Update the message
-                            updated_message = message_crud.update_message(
-                                session=session,
+                            # Update the message and load the participants to notify
+                            updated_message, participant_ids = await db.run(
+                                _edit_message,
                                 message_id=message_id,
                                 user_id=user_id,
                                 message_update=MessageUpdate(content=content)
                             )
 
                             if not updated_message:
-                                await websocket.send_text(json.dumps({
+                                await manager.send_to_connection(connection_id, {
                                     "type": "error",
                                     "detail": "Message not found or you don't have permission to edit it"
-                                }))
+                                })
                                 continue
 
-                            # Get participants to notify about the update
-                            participant_ids = message_crud.get_conversation_participants(
-                                session, updated_message.conversation_id
-                            )
-
                             # Create update notification
                             message_dict = {
                                 "id": str(updated_message.id),
@@ -434,53 +461,46 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                             )
 
                             # Confirm to the sender
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "message_updated",
                                 "message_id": str(updated_message.id),
                                 "conversation_id": str(updated_message.conversation_id),
                                 "content": updated_message.content,
                                 "updated_at": updated_message.updated_at.isoformat()
-                            }))
+                            })
                         except HTTPException as http_ex:
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "status_code": http_ex.status_code,
                                 "detail": http_ex.detail
-                            }))
+                            })
                         except Exception as e:
                             logger.exception(f"Error updating message: {str(e)}")
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "Failed to update message"
-                            }))
+                            })
 
                     elif message_data["type"] == "delete_message":
                         if "message_id" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing message_id"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing message_id"})
                             continue
 
                         message_id = UUID(message_data["message_id"])
 
                         try:
-                            # Delete the message
-                            deleted_message = message_crud.delete_message(
-                                session=session,
-                                message_id=message_id,
-                                user_id=user_id
+                            # Delete the message and load the participants to notify
+                            deleted_message, participant_ids = await db.run(
+                                _delete_message, message_id=message_id, user_id=user_id
                             )
 
                             if not deleted_message:
-                                await websocket.send_text(json.dumps({
+                                await manager.send_to_connection(connection_id, {
                                     "type": "error",
                                     "detail": "Message not found or you don't have permission to delete it"
-                                }))
+                                })
                                 continue
 
-                            # Get participants to notify about the deletion
-                            participant_ids = message_crud.get_conversation_participants(
-                                session, deleted_message.conversation_id
-                            )
-
                             # Broadcast deletion to all participants
                             await manager.broadcast_message_delete(
                                 message_id=message_id,
@@ -490,87 +510,82 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                             )
 
                             # Confirm to the sender
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "message_deleted",
                                 "message_id": str(message_id),
                                 "conversation_id": str(deleted_message.conversation_id),
                                 "deleted_at": deleted_message.deleted_at.isoformat()
-                            }))
+                            })
                         except HTTPException as http_ex:
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "status_code": http_ex.status_code,
                                 "detail": http_ex.detail
-                            }))
+                            })
                         except Exception as e:
                             logger.exception(f"Error deleting message: {str(e)}")
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "Failed to delete message"
-                            }))
+                            })
 
                     elif message_data["type"] == "open_conversation":
                         if "conversation_id" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing conversation_id"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing conversation_id"})
                             continue
 
                         conversation_id = UUID(message_data["conversation_id"])
 
                         # Verify the conversation exists and user is a participant
-                        participants = message_crud.get_conversation_participants(session, conversation_id)
+                        participants = await db.run(message_crud.get_conversation_participants, conversation_id)
                         if user_id not in participants:
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "You are not a participant in this conversation"
-                            }))
+                            })
                             continue
 
-                        manager.add_open_conversation(user_id, conversation_id)
+                        manager.add_open_conversation(connection_id, conversation_id)
 
-                        # Mark messages as read
-                        count = message_crud.mark_conversation_as_read(
-                            session=session,
-                            user_id=user_id,
-                            conversation_id=conversation_id
+                        # Mark messages as read and get conversation data
+                        count, conversation = await db.run(
+                            _open_conversation, user_id=user_id, conversation_id=conversation_id
                         )
 
-                        # Get conversation data
-                        conversation = message_crud.get_conversation(session, conversation_id)
-
-                        await websocket.send_text(json.dumps({
+                        await manager.send_to_connection(connection_id, {
                             "type": "conversation_opened",
                             "conversation_id": str(conversation_id),
                             "is_group": conversation.is_group,
                             "messages_read": count
-                        }))
+                        })
 
                     elif message_data["type"] == "close_conversation":
                         if "conversation_id" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing conversation_id"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing conversation_id"})
                             continue
 
                         conversation_id = UUID(message_data["conversation_id"])
-                        manager.remove_open_conversation(user_id, conversation_id)
+                        manager.remove_open_conversation(connection_id, conversation_id)
 
-                        await websocket.send_text(json.dumps({
+                        await manager.send_to_connection(connection_id, {
                             "type": "conversation_closed",
                             "conversation_id": str(conversation_id)
-                        }))
+                        })
 
                     elif message_data["type"] == "typing":
                         if "conversation_id" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing conversation_id"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing conversation_id"})
                             continue
 
                         conversation_id = UUID(message_data["conversation_id"])
 
                         # Verify the conversation exists and user is a participant
-                        participants = message_crud.get_conversation_participants(session, conversation_id)
+                        participants = await db.run(message_crud.get_conversation_participants, conversation_id)
                         if user_id not in participants:
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "You are not a participant in this conversation"
-                            }))
+                            })
                             continue
 
                         # Send typing notification to all participants
@@ -582,49 +597,50 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
                     elif message_data["type"] == "read_receipt":
                         if "message_id" not in message_data or "conversation_id" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing required fields for read receipt"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing required fields for read receipt"})
                             continue
 
                         message_id = UUID(message_data["message_id"])
                         conversation_id = UUID(message_data["conversation_id"])
 
-                        # Mark message as read
-                        success = message_crud.mark_message_as_read(session, message_id, user_id)
+                        # Mark message as read and load the participants to notify
+                        success, participants = await db.run(
+                            _read_message, message_id=message_id, user_id=user_id, conversation_id=conversation_id
+                        )
 
                         if success:
-                            # Get participants to notify about the read receipt
-                            participants = message_crud.get_conversation_participants(session, conversation_id)
 
-                            # Send read receipt to all participants
+                            # Send read receipt to all participants and the reader's other devices
                             await manager.broadcast_read_receipt(
                                 message_id=message_id,
                                 conversation_id=conversation_id,
                                 reader_id=user_id,
-                                participant_ids=participants
+                                participant_ids=participants,
+                                origin_connection_id=connection_id
                             )
 
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "read_receipt_sent",
                                 "message_id": str(message_id),
                                 "conversation_id": str(conversation_id)
-                            }))
+                            })
                         else:
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "Failed to mark message as read"
-                            }))
+                            })
 
                     elif message_data["type"] == "block_user":
                         if "user_id" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing user_id"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing user_id"})
                             continue
 
                         blocked_id = UUID(message_data["user_id"])
 
                         try:
                             # Block the user
-                            block = message_crud.block_user(
-                                session=session,
+                            block = await db.run(
+                                message_crud.block_user,
                                 blocker_id=user_id,
                                 blocked_id=blocked_id
                             )
@@ -636,29 +652,29 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                             )
 
                             # Confirm to the blocker
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "user_blocked",
                                 "blocked_id": str(blocked_id),
                                 "created_at": block.created_at.isoformat()
-                            }))
+                            })
                         except Exception as e:
                             logger.exception(f"Error blocking user: {str(e)}")
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "Failed to block user"
-                            }))
+                            })
 
                     elif message_data["type"] == "unblock_user":
                         if "user_id" not in message_data:
-                            await websocket.send_text(json.dumps({"error": "Missing user_id"}))
+                            await manager.send_to_connection(connection_id, {"error": "Missing user_id"})
                             continue
 
                         unblocked_id = UUID(message_data["user_id"])
 
                         try:
                             # Unblock the user
-                            success = message_crud.unblock_user(
-                                session=session,
+                            success = await db.run(
+                                message_crud.unblock_user,
                                 blocker_id=user_id,
                                 blocked_id=unblocked_id
                             )
@@ -671,35 +687,35 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                                 )
 
                                 # Confirm to the unblocker
-                                await websocket.send_text(json.dumps({
+                                await manager.send_to_connection(connection_id, {
                                     "type": "user_unblocked",
                                     "unblocked_id": str(unblocked_id),
                                     "timestamp": datetime.utcnow().isoformat()
-                                }))
+                                })
                             else:
-                                await websocket.send_text(json.dumps({
+                                await manager.send_to_connection(connection_id, {
                                     "type": "error",
                                     "detail": "User was not blocked"
-                                }))
+                                })
                         except Exception as e:
                             logger.exception(f"Error unblocking user: {str(e)}")
-                            await websocket.send_text(json.dumps({
+                            await manager.send_to_connection(connection_id, {
                                 "type": "error",
                                 "detail": "Failed to unblock user"
-                            }))
+                            })
 
                     else:
-                        await websocket.send_text(json.dumps({
+                        await manager.send_to_connection(connection_id, {
                             "error": f"Unknown message type: {message_data['type']}"
-                        }))
+                        })
 
                 except asyncio.TimeoutError:
                     # Connection might be dead, send a ping to check
                     try:
-                        await websocket.send_text(json.dumps({
+                        await manager.send_to_connection(connection_id, {
                             "type": "ping",
                             "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        })
                     except Exception:
                         # If we can't send a ping, the connection is dead
                         logger.warning(f"WebSocket connection timeout for user {user_id}")
@@ -713,7 +729,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                 except json.JSONDecodeError:
                     # Bad JSON received
                     try:
-                        await websocket.send_text(json.dumps({"error": "Invalid JSON"}))
+                        await manager.send_to_connection(connection_id, {"error": "Invalid JSON"})
                     except Exception:
                         # If we can't send an error, the connection is probably dead
                         break
@@ -722,12 +738,10 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     # Other errors
                     logger.exception(f"Error processing WebSocket message from user {user_id}")
                     try:
-                        await websocket.send_text(json.dumps({"error": str(e)}))
+                        await manager.send_to_connection(connection_id, {"error": str(e)})
                     except Exception:
                         # If we can't send an error, the connection is probably dead
                         break
-                finally:
-                    session.close()
 
         except Exception as e:
             logger.exception(f"WebSocket loop error for user {user_id}: {str(e)}")
@@ -736,8 +750,8 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
         logger.exception(f"WebSocket unhandled error: {str(e)}")
     finally:
         # Ensure we properly clean up
-        if user_id:
-            manager.disconnect(user_id)
+        if connection_id:
+            manager.disconnect(user_id, connection_id)
 
         if ping_task:
             ping_task.cancel()
@@ -788,21 +802,21 @@ def create_conversation(
 
 
 @router.post("/messages", response_model=MessagePublic)
-def create_message(
+async def create_message(
         *,
-        session: deps.SessionDep,
+        session: deps.AsyncSessionDep,
         message_in: MessageCreate,
-        current_user: deps.CurrentUser,
+        current_user: deps.AsyncCurrentUser,
 ) -> Any:
     """
     Create a new message.
     """
-    message = message_crud.create_message(
-        session=session, sender_id=current_user.id, message_in=message_in
+    message = await session.run_sync(
+        message_crud.create_message, sender_id=current_user.id, message_in=message_in
     )
 
     # Get read receipts for the response
-    _, read_receipts = message_crud.get_message_with_read_status(session, message.id)
+    read_receipts = (await session.run_sync(message_crud.get_read_receipts, [message]))[message.id]
 
     # Convert to public model
     message_public = MessagePublic(
@@ -844,7 +858,7 @@ def update_message(
         )
 
     # Get read receipts for the response
-    _, read_receipts = message_crud.get_message_with_read_status(session, message_id)
+    read_receipts = message_crud.get_read_receipts(session, [updated_message])[updated_message.id]
 
     # Convert to public model
     message_public = MessagePublic(
@@ -884,7 +898,7 @@ def delete_message(
         )
 
     # Get read receipts for the response
-    _, read_receipts = message_crud.get_message_with_read_status(session, message_id)
+    read_receipts = message_crud.get_read_receipts(session, [deleted_message])[deleted_message.id]
 
     # Convert to public model
     message_public = MessagePublic(
@@ -902,17 +916,17 @@ def delete_message(
 
 
 @router.get("/conversations", response_model=ConversationsPublic)
-def get_conversations(
-        session: deps.SessionDep,
-        current_user: deps.CurrentUser,
+async def get_conversations(
+        session: deps.AsyncSessionDep,
+        current_user: deps.AsyncCurrentUser,
         skip: int = 0,
         limit: int = 50,
 ) -> Any:
     """
     Get all conversations for the current user.
     """
-    conversations, total = message_crud.get_user_conversations(
-        session=session, user_id=current_user.id, skip=skip, limit=limit
+    conversations, total = await session.run_sync(
+        message_crud.get_user_conversations, user_id=current_user.id, skip=skip, limit=limit
     )
 
     # Create conversation public objects
@@ -935,45 +949,66 @@ def get_conversations(
 
 
 @router.get("/conversations/{conversation_id}/messages", response_model=MessagesPublic)
-def get_conversation_messages(
+async def get_conversation_messages(
         *,
-        session: deps.SessionDep,
+        session: deps.AsyncSessionDep,
         conversation_id: UUID,
-        current_user: deps.CurrentUser,
+        current_user: deps.AsyncCurrentUser,
         skip: int = 0,
         limit: int = 100,
-        include_deleted: bool = False
+        include_deleted: bool = False,
+        before: Optional[UUID] = None,
+        after: Optional[UUID] = None,
+        with_count: bool = True,
+        read_up_to: Optional[UUID] = None
 ) -> Any:
     """
-    Get messages for a specific conversation.
+    Get messages for a specific conversation, newest first.
+
+    Page through history by passing the id of the oldest message received
+    as ``before``, or of the newest as ``after`` to catch up. Set
+    ``with_count`` to false to skip counting the whole conversation.
+
+    Fetching marks the conversation as read. A client that already did so
+    up to some message can pass its id as ``read_up_to``: when no message
+    on the page is newer than that one, such as when paging back through
+    history, the conversation is left untouched.
     """
     # Verify user is a participant
-    participants = message_crud.get_conversation_participants(session, conversation_id)
+    participants = await session.run_sync(message_crud.get_conversation_participants, conversation_id)
     if current_user.id not in participants:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not a participant in this conversation"
         )
 
-    messages, count = message_crud.get_conversation_messages(
-        session=session,
+    messages, count = await session.run_sync(
+        message_crud.get_conversation_messages,
         conversation_id=conversation_id,
         skip=skip,
         limit=limit,
-        include_deleted=include_deleted
+        include_deleted=include_deleted,
+        before=before,
+        after=after,
+        with_count=with_count
     )
 
-    # Mark messages as read when fetched via API
-    message_crud.mark_conversation_as_read(
-        session=session,
-        user_id=current_user.id,
-        conversation_id=conversation_id
-    )
+    # Mark messages as read when fetched via API, unless the client
+    # already has read everything on the page
+    if read_up_to is None or not await session.run_sync(
+        message_crud.page_already_read, conversation_id, read_up_to, messages
+    ):
+        await session.run_sync(
+            message_crud.mark_conversation_as_read,
+            user_id=current_user.id,
+            conversation_id=conversation_id
+        )
 
-    # Convert to public model with read receipts
+    # Convert to public model with read receipts, loaded for the whole page at once
+    read_receipts_by_message = await session.run_sync(message_crud.get_read_receipts, messages)
     public_messages = []
     for message in messages:
-        _, read_receipts = message_crud.get_message_with_read_status(session, message.id)
+        read_receipts = read_receipts_by_message[message.id]
 
         public_messages.append(
             MessagePublic(
@@ -1000,35 +1035,52 @@ def get_conversation_by_id(*, conversation_id: uuid.UUID, session: SessionDep):
     return conversation
 
 
+@router.get("/participant-cache/stats", dependencies=[Depends(deps.get_current_active_superuser)])
+def get_participant_cache_stats() -> dict:
+    """
+    Size and hit rate of this worker's conversation participant cache.
+    """
+    return get_participant_cache().stats()
+
+
+@router.get("/websocket/stats", dependencies=[Depends(deps.get_current_active_superuser)])
+def get_websocket_stats() -> dict:
+    """
+    Connections, slow consumer handling and fan-out latency percentiles of
+    this worker's websockets.
+    """
+    return manager.stats()
+
+
 @router.get("/unread", response_model=int)
-def get_unread_count(
+async def get_unread_count(
         *,
-        session: deps.SessionDep,
-        current_user: deps.CurrentUser,
+        session: deps.AsyncSessionDep,
+        current_user: deps.AsyncCurrentUser,
         conversation_id: UUID = Query(None, description="Filter by conversation")
 ) -> Any:
     """
     Get count of unread messages for the current user.
     """
-    return message_crud.get_unread_count(
-        session=session,
+    return await session.run_sync(
+        message_crud.get_unread_count,
         user_id=current_user.id,
         conversation_id=conversation_id
     )
 
 
 @router.post("/messages/{message_id}/read", response_model=bool)
-def mark_message_read(
+async def mark_message_read(
         *,
-        session: deps.SessionDep,
+        session: deps.AsyncSessionDep,
         message_id: UUID,
-        current_user: deps.CurrentUser,
+        current_user: deps.AsyncCurrentUser,
 ) -> Any:
     """
     Mark a message as read.
     """
-    success = message_crud.mark_message_as_read(
-        session=session, message_id=message_id, user_id=current_user.id
+    success = await session.run_sync(
+        message_crud.mark_message_as_read, message_id=message_id, user_id=current_user.id
     )
 
     if not success:
@@ -1041,25 +1093,25 @@ def mark_message_read(
 
 
 @router.post("/conversations/{conversation_id}/read", response_model=int)
-def mark_conversation_read(
+async def mark_conversation_read(
         *,
-        session: deps.SessionDep,
+        session: deps.AsyncSessionDep,
         conversation_id: UUID,
-        current_user: deps.CurrentUser,
+        current_user: deps.AsyncCurrentUser,
 ) -> Any:
     """
     Mark all messages in a conversation as read.
     """
     # Verify user is a participant
-    participants = message_crud.get_conversation_participants(session, conversation_id)
+    participants = await session.run_sync(message_crud.get_conversation_participants, conversation_id)
     if current_user.id not in participants:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not a participant in this conversation"
         )
 
-    count = message_crud.mark_conversation_as_read(
-        session=session,
+    count = await session.run_sync(
+        message_crud.mark_conversation_as_read,
         user_id=current_user.id,
         conversation_id=conversation_id
     )
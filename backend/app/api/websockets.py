@@ -1,84 +1,308 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Set
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
 from uuid import UUID
+import uuid
 import json
 import logging
 import asyncio
+import time
 from datetime import datetime
 
+from app.core.config import settings
+from app.services.pubsub import PubSub
+
 logger = logging.getLogger(__name__)
 
+# Fan-out latencies kept for the percentiles in stats()
+LATENCY_SAMPLES = 10_000
+# Close code sent to clients disconnected for falling behind ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# A publish to the bus taking longer than this is given up on
+BUS_PUBLISH_TIMEOUT_SECONDS = 5.0
+# How long stop_bus waits for queued events to be published
+BUS_FLUSH_TIMEOUT_SECONDS = 5.0
+
+
+class Connection:
+    """
+    One websocket of a user. Broadcast events are queued here and written
+    by a dedicated task, so a slow client only holds up itself. Replies to
+    the client's own requests are written directly; both go through send()
+    so two writes never overlap on the socket.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: UUID, queue_size: int):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.user_id = user_id
+        # Serialised events with the time their broadcast started
+        self.queue: "asyncio.Queue[Tuple[str, float]]" = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.closing = False
+        self._write_lock = asyncio.Lock()
+
+    async def send(self, text: str):
+        async with self._write_lock:
+            await self.websocket.send_text(text)
+
 
 class ConnectionManager:
-    def __init__(self):
-        # Map of user_id to their websocket connection
-        self.active_connections: Dict[UUID, WebSocket] = {}
-        # Map of user_id to the set of conversations they've opened
-        self.open_conversations: Dict[UUID, Set[UUID]] = {}
-        # Lock for WebSocket operations
-        self._lock = asyncio.Lock()
-
-    async def connect(self, websocket: WebSocket, user_id: UUID):
-        """Connect a new WebSocket for a user"""
+    def __init__(self, queue_size: int = 256, slow_consumer_policy: str = "disconnect",
+                 bus_queue_size: int = 1000):
+        # Map of user_id to their websocket connections, one per device or
+        # tab, keyed by connection id
+        self.active_connections: Dict[UUID, Dict[str, Connection]] = {}
+        # Map of connection id to its connection, across users
+        self.connections: Dict[str, Connection] = {}
+        # Map of connection id to the set of conversations opened on it
+        self.open_conversations: Dict[str, Set[UUID]] = {}
+        # The maps above are only changed by code that doesn't await in
+        # between, so no coroutine ever sees them half updated and they
+        # need no lock. Writes to a socket are serialised by its Connection.
+
+        self.queue_size = queue_size
+        # "drop" skips events for a connection whose queue is full,
+        # "disconnect" closes it so the client reconnects and resyncs
+        self.slow_consumer_policy = slow_consumer_policy
+        self.dropped_events = 0
+        self.slow_disconnects = 0
+        # Closes of slow consumers in progress. The loop only keeps weak
+        # references to tasks, these must not be collected before they run.
+        self._closing_tasks: Set[asyncio.Task] = set()
+        # Seconds from the start of a broadcast until each connection's write finished
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+        # Carries broadcasts to users connected to other workers, see start_bus
+        self.worker_id = uuid.uuid4().hex
+        self.bus: Optional[PubSub] = None
+        # Envelopes waiting for the publisher task. When the bus falls this
+        # far behind, new envelopes are dropped rather than holding up
+        # broadcasts on this worker.
+        self.bus_queue_size = bus_queue_size
+        self._outbox: "asyncio.Queue[str]" = asyncio.Queue(maxsize=bus_queue_size)
+        self._publisher: Optional[asyncio.Task] = None
+        self.bus_dropped_events = 0
+        self.bus_publish_failures = 0
+
+    async def start_bus(self, bus: PubSub):
+        """
+        Share broadcasts with the other workers over ``bus``. Each worker
+        delivers to its own connections, events from this worker are
+        delivered locally right away and skipped when they come back.
+        """
+        await bus.start(self._on_bus_message)
+        self.bus = bus
+        self._publisher = asyncio.create_task(self._publish(bus))
+
+    async def stop_bus(self):
+        if self.bus is not None:
+            bus, self.bus = self.bus, None
+            # Give what's queued a chance to go out first
+            try:
+                await asyncio.wait_for(self._outbox.join(), BUS_FLUSH_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning(f"Stopping the bus with {self._outbox.qsize()} events unpublished")
+            self._publisher.cancel()
+            try:
+                await self._publisher
+            except asyncio.CancelledError:
+                pass
+            self._publisher = None
+            await bus.stop()
+
+    async def _publish(self, bus: PubSub):
+        """Publisher task, drains the outbox onto the bus until cancelled"""
+        while True:
+            envelope = await self._outbox.get()
+            try:
+                await asyncio.wait_for(bus.publish(envelope), BUS_PUBLISH_TIMEOUT_SECONDS)
+            except Exception as e:
+                self.bus_publish_failures += 1
+                logger.warning(f"Error publishing event to other workers: {str(e) or type(e).__name__}")
+            finally:
+                self._outbox.task_done()
+
+    async def _on_bus_message(self, message: str):
+        envelope = json.loads(message)
+        if envelope["origin"] == self.worker_id:
+            return
+        self._deliver(
+            envelope["event"],
+            [UUID(user_id) for user_id in envelope["recipients"]],
+            {UUID(user_id) for user_id in envelope["exclude"]},
+            envelope["exclude_connection"],
+            time.perf_counter(),
+        )
+
+    async def connect(self, websocket: WebSocket, user_id: UUID) -> str:
+        """Connect a new WebSocket for a user, returns its connection id"""
         await websocket.accept()
-        async with self._lock:
-            self.active_connections[user_id] = websocket
-            if user_id not in self.open_conversations:
-                self.open_conversations[user_id] = set()
-        logger.info(f"User {user_id} connected. Active connections: {len(self.active_connections)}")
-
-    def disconnect(self, user_id: UUID):
-        """Handle disconnection of a user"""
-        # This method is called in a context where async isn't available
-        # so we can't use the lock directly
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        # We keep the open_conversations entry in case the user reconnects
-        logger.info(f"User {user_id} disconnected. Active connections: {len(self.active_connections)}")
-
-    def add_open_conversation(self, user_id: UUID, conversation_id: UUID):
-        """Mark that user_id has an open conversation UI with conversation_id"""
-        if user_id not in self.open_conversations:
-            self.open_conversations[user_id] = set()
-        self.open_conversations[user_id].add(conversation_id)
-
-    def remove_open_conversation(self, user_id: UUID, conversation_id: UUID):
-        """Mark that user_id has closed the conversation UI with conversation_id"""
-        if user_id in self.open_conversations:
-            self.open_conversations[user_id].discard(conversation_id)
+        connection = Connection(websocket, user_id, self.queue_size)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections.setdefault(user_id, {})[connection.id] = connection
+        self.connections[connection.id] = connection
+        self.open_conversations[connection.id] = set()
+        logger.info(
+            f"User {user_id} connected on {connection.id}. "
+            f"Devices: {len(self.active_connections[user_id])}, users online: {len(self.active_connections)}"
+        )
+        return connection.id
+
+    def disconnect(self, user_id: UUID, connection_id: str):
+        """Handle disconnection of one of a user's connections"""
+        self.connections.pop(connection_id, None)
+        connections = self.active_connections.get(user_id)
+        if connections is not None:
+            connection = connections.pop(connection_id, None)
+            if connection is not None and connection.writer is not None:
+                connection.writer.cancel()
+            if not connections:
+                del self.active_connections[user_id]
+        self.open_conversations.pop(connection_id, None)
+        logger.info(f"User {user_id} disconnected {connection_id}. Users online: {len(self.active_connections)}")
+
+    async def _write(self, connection: Connection):
+        """Writer task of a connection, drains its queue until cancelled"""
+        while True:
+            text, started_at = await connection.queue.get()
+            try:
+                await connection.send(text)
+            except Exception as e:
+                # The receive loop notices the dead socket and disconnects
+                logger.warning(f"Error sending to {connection.user_id} on {connection.id}: {str(e)}")
+                return
+            self._latencies.append(time.perf_counter() - started_at)
+
+    def _enqueue(self, connection: Connection, text: str, started_at: float):
+        if connection.closing:
+            return
+        try:
+            connection.queue.put_nowait((text, started_at))
+        except asyncio.QueueFull:
+            if self.slow_consumer_policy == "drop":
+                self.dropped_events += 1
+                return
+            self.slow_disconnects += 1
+            connection.closing = True
+            logger.warning(f"Disconnecting slow consumer {connection.user_id} on {connection.id}")
+            task = asyncio.create_task(self._close(connection))
+            self._closing_tasks.add(task)
+            task.add_done_callback(self._closing_tasks.discard)
+
+    async def _close(self, connection: Connection):
+        if connection.writer is not None:
+            connection.writer.cancel()
+        try:
+            await connection.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Too far behind")
+        except Exception:
+            # Already gone
+            pass
+
+    def stats(self) -> dict:
+        """Connection counts, slow consumer handling and fan-out latency percentiles in milliseconds"""
+        connections = [c for user in self.active_connections.values() for c in user.values()]
+        latencies = sorted(self._latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+        return {
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "queued_events": sum(c.queue.qsize() for c in connections),
+            "dropped_events": self.dropped_events,
+            "slow_disconnects": self.slow_disconnects,
+            "bus_queued_events": self._outbox.qsize(),
+            "bus_dropped_events": self.bus_dropped_events,
+            "bus_publish_failures": self.bus_publish_failures,
+            "fanout_latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "samples": len(latencies),
+            },
+        }
+
+    def add_open_conversation(self, connection_id: str, conversation_id: UUID):
+        """Mark that the conversation UI with conversation_id is open on a connection"""
+        self.open_conversations.setdefault(connection_id, set()).add(conversation_id)
+
+    def remove_open_conversation(self, connection_id: str, conversation_id: UUID):
+        """Mark that the conversation UI with conversation_id was closed on a connection"""
+        if connection_id in self.open_conversations:
+            self.open_conversations[connection_id].discard(conversation_id)
 
     def is_online(self, user_id: UUID) -> bool:
-        """Check if a user is currently connected"""
+        """Check if a user is currently connected on any device"""
         return user_id in self.active_connections
 
     def has_open_conversation(self, user_id: UUID, conversation_id: UUID) -> bool:
-        """Check if a user has an open conversation with conversation_id"""
-        if user_id not in self.open_conversations:
-            return False
-        return conversation_id in self.open_conversations[user_id]
+        """Check if a user has the conversation open on any device"""
+        return any(
+            conversation_id in self.open_conversations.get(connection_id, ())
+            for connection_id in self.active_connections.get(user_id, {})
+        )
+
+    async def send_to_connection(self, connection_id: str, message: dict):
+        """
+        Reply on one connection right away, bypassing its queue. Waits only
+        for that connection's own writes, errors from the socket are raised.
+        """
+        connection = self.connections.get(connection_id)
+        if connection is None or connection.closing:
+            return
+        await connection.send(json.dumps(message))
 
     async def send_personal_message(self, message: dict, user_id: UUID):
-        """Send a message to a specific user if they are connected"""
-        async with self._lock:
-            if user_id in self.active_connections:
-                await self.active_connections[user_id].send_text(json.dumps(message))
+        """Send a message to every connection of a user"""
+        await self.broadcast_to_recipients(message, [user_id])
 
-    async def broadcast_to_recipients(self, message: dict, recipient_ids: List[UUID], exclude_ids: List[UUID] = None):
-        """Send a message to multiple recipients, excluding specified users"""
-        exclude_ids = exclude_ids or []
+    async def broadcast_to_recipients(self, message: dict, recipient_ids: List[UUID], exclude_ids: List[UUID] = None,
+                                      exclude_connection_id: Optional[str] = None):
+        """
+        Send a message to every connection of multiple recipients, excluding
+        specified users and optionally the connection it originated from.
 
+        The message is serialised once and queued for each connection's
+        writer task, so this returns without waiting on any client. With a
+        bus, it is also queued for publishing to recipients connected to
+        other workers, without waiting on the bus either.
+        """
+        exclude_ids = exclude_ids or []
+        started_at = time.perf_counter()
+        text = json.dumps(message)
+        self._deliver(text, recipient_ids, exclude_ids, exclude_connection_id, started_at)
+
+        if self.bus is not None:
+            envelope = json.dumps({
+                "origin": self.worker_id,
+                "recipients": [str(user_id) for user_id in recipient_ids],
+                "exclude": [str(user_id) for user_id in exclude_ids],
+                "exclude_connection": exclude_connection_id,
+                "event": text,
+            })
+            try:
+                self._outbox.put_nowait(envelope)
+            except asyncio.QueueFull:
+                self.bus_dropped_events += 1
+
+    def _deliver(self, text: str, recipient_ids: List[UUID], exclude_ids, exclude_connection_id: Optional[str],
+                 started_at: float):
+        """Queue a serialised event for the recipients' connections on this worker"""
         for recipient_id in recipient_ids:
             if recipient_id in exclude_ids:
                 continue
 
-            if recipient_id in self.active_connections:
-                try:
-                    await self.active_connections[recipient_id].send_text(json.dumps(message))
-                except Exception as e:
-                    logger.exception(f"Error sending message to {recipient_id}: {str(e)}")
+            for connection_id, connection in self.active_connections.get(recipient_id, {}).items():
+                if connection_id != exclude_connection_id:
+                    self._enqueue(connection, text, started_at)
 
     async def broadcast_conversation_message(self, message_data: dict, conversation_id: UUID,
-                                             participant_ids: List[UUID], sender_id: UUID):
+                                             participant_ids: List[UUID], sender_id: UUID,
+                                             origin_connection_id: Optional[str] = None):
         """
         Broadcast a message to all participants in a conversation
 
@@ -87,6 +311,8 @@ class ConnectionManager:
             conversation_id: The ID of the conversation
             participant_ids: List of all participant IDs in the conversation
             sender_id: The ID of the user who sent the message
+            origin_connection_id: The connection the message was sent from. When
+                given, the sender's other devices receive the message too.
         """
         notification = {
             "type": "message",
@@ -94,8 +320,13 @@ class ConnectionManager:
             "data": message_data
         }
 
-        # Send to all participants except the sender
-        await self.broadcast_to_recipients(notification, participant_ids, [sender_id])
+        # Send to all participants except the sending connection, or the
+        # sender altogether when it isn't known
+        if origin_connection_id is not None:
+            await self.broadcast_to_recipients(notification, participant_ids,
+                                               exclude_connection_id=origin_connection_id)
+        else:
+            await self.broadcast_to_recipients(notification, participant_ids, [sender_id])
 
     async def broadcast_message_update(self, message_data: dict, conversation_id: UUID,
                                        participant_ids: List[UUID], updater_id: UUID):
@@ -160,7 +391,8 @@ class ConnectionManager:
         await self.broadcast_to_recipients(notification, participant_ids, [typing_user_id])
 
     async def broadcast_read_receipt(self, message_id: UUID, conversation_id: UUID,
-                                     reader_id: UUID, participant_ids: List[UUID]):
+                                     reader_id: UUID, participant_ids: List[UUID],
+                                     origin_connection_id: Optional[str] = None):
         """
         Send read receipt notification to all participants in a conversation
 
@@ -169,6 +401,9 @@ class ConnectionManager:
             conversation_id: The ID of the conversation
             reader_id: The ID of the user who read the message
             participant_ids: List of all participant IDs in the conversation
+            origin_connection_id: The connection the message was read on. When
+                given, the reader's other devices are told too, so they can
+                clear their unread state.
         """
         notification = {
             "type": "read_receipt",
@@ -178,8 +413,13 @@ class ConnectionManager:
             "timestamp": datetime.utcnow().isoformat()
         }
 
-        # Send to all participants except the reader
-        await self.broadcast_to_recipients(notification, participant_ids, [reader_id])
+        # Send to all participants except the reading connection, or the
+        # reader altogether when it isn't known
+        if origin_connection_id is not None:
+            await self.broadcast_to_recipients(notification, participant_ids,
+                                               exclude_connection_id=origin_connection_id)
+        else:
+            await self.broadcast_to_recipients(notification, participant_ids, [reader_id])
 
     async def broadcast_user_blocked(self, blocker_id: UUID, blocked_id: UUID):
         """
@@ -217,4 +457,6 @@ class ConnectionManager:
 
 
 # Create a global instance
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(
+    settings.WS_SEND_QUEUE_SIZE, settings.WS_SLOW_CONSUMER_POLICY, settings.WS_PUBSUB_QUEUE_SIZE
+)
\ No newline at end of file
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import Engine, or_
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.models.images import Image
+from app.services.file_service import StorageBackend, get_storage_backend
+from app.services.image_processing import process_stored_image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackfillReport:
+    processed: int = 0
+    failed: int = 0
+    bytes_saved: int = 0
+
+
+async def backfill(
+        db_engine: Engine,
+        backend: StorageBackend,
+        batch_size: int = 100,
+        max_batches: Optional[int] = None
+) -> BackfillReport:
+    """
+    Process images missing a placeholder or perceptual hash, or never
+    re-encoded: strip their metadata and cap their size (see
+    process_stored_image) and compute both derivatives.
+
+    Progress is the data itself: processed images drop out of the query, so
+    an interrupted run simply continues where it stopped when started again.
+    Images that fail are skipped for the rest of the run and retried by the
+    next one.
+    """
+    report = BackfillReport()
+    last_id = None
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with Session(db_engine) as session:
+            query = (
+                select(Image.id, Image.file_path, Image.phash)
+                .where(or_(Image.placeholder == None, Image.phash == None, Image.processed_at == None))
+                .order_by(Image.id)
+                .limit(batch_size)
+            )
+            if last_id is not None:
+                query = query.where(Image.id > last_id)
+            batch = session.exec(query).all()
+
+        if not batch:
+            break
+
+        results = await asyncio.gather(*(
+            process_stored_image(image_id, file_path, backend, with_phash=phash is None)
+            for image_id, file_path, phash in batch
+        ))
+        for result in results:
+            if result.stored:
+                report.processed += 1
+                report.bytes_saved += result.bytes_saved
+            else:
+                report.failed += 1
+        last_id = batch[-1][0]
+        batches += 1
+        logger.info(f"{report.processed} images processed so far, {report.failed} failed")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-encode images and fill in placeholders and perceptual hashes")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-batches", type=int, default=None,
+                        help="Stop after this many batches, rerun to continue")
+    args = parser.parse_args()
+
+    logger.info("Backfilling image derivatives")
+    report = asyncio.run(backfill(engine, get_storage_backend(), args.batch_size, args.max_batches))
+    logger.info(
+        f"Processed {report.processed} images, {report.failed} failed, "
+        f"{report.bytes_saved} bytes saved by re-encoding"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,45 @@ class Settings(BaseSettings):
         extra="ignore",
     )
     UPLOADS_DIR: str = "./app/data/uploads"
+    # "local" keeps files under UPLOADS_DIR, "s3" uses an S3-compatible bucket
+    STORAGE_BACKEND: Literal["local", "s3"] = "local"
+    S3_BUCKET: str | None = None
+    # Set for MinIO or other S3-compatible services, leave empty for AWS
+    S3_ENDPOINT_URL: str | None = None
+    S3_REGION: str | None = None
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    PRESIGNED_URL_EXPIRE_SECONDS: int = 60 * 15
+    # Resumable lease agreement uploads
+    LEASE_UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    UPLOAD_CHUNK_MAX_BYTES: int = 8 * 1024 * 1024
+    RESUMABLE_UPLOAD_EXPIRE_HOURS: int = 24
+    # Worker processes used to extract text from uploaded lease agreements
+    LEASE_TEXT_WORKERS: int = 2
+    # Uploaded images are re-encoded without metadata and capped to this longest edge
+    IMAGE_MAX_EDGE: int = 2560
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PROCESSING_WORKERS: int = 2
+    # Cached block relationships expire after this long even if a change
+    # notification from another worker was missed
+    BLOCK_CACHE_TTL_SECONDS: int = 300
+    # Conversations whose participant sets each worker keeps in memory
+    PARTICIPANT_CACHE_SIZE: int = 10_000
+    # Events waiting to be written to one websocket. When a client falls
+    # this far behind, its new events are dropped or it is disconnected.
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: Literal["drop", "disconnect"] = "disconnect"
+    # How websocket events reach users connected to other workers. "none"
+    # only works with a single worker.
+    WS_PUBSUB_BACKEND: Literal["postgres", "memory", "none"] = "postgres"
+    # Events waiting to be published to the other workers. When the bus
+    # falls this far behind, new events only reach this worker's users.
+    WS_PUBSUB_QUEUE_SIZE: int = 1000
+    # How websocket handlers run database work: on the event loop over the
+    # async engine, or on a pool of WS_DB_WORKERS threads per worker. Keep
+    # the threads below the sync engine's 20 connections (see app.core.db).
+    WS_DB_EXECUTOR: Literal["async", "threads"] = "async"
+    WS_DB_WORKERS: int = 16
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = secrets.token_urlsafe(32)
     # 60 minutes * 24 hours * 8 days = 8 days
@@ -1,13 +1,32 @@
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app.crud import users as crud_users
 from app.core.config import settings
 from app.models.users import User, UserCreate
 
+# Each worker has two pools, sized together to 40 connections as the single
+# sync pool was before: 20 for sync routes, scripts and the websocket thread
+# executor, 20 for async routes and websocket handlers. The pub/sub listener
+# and publisher and the block change listener connect outside the pools,
+# so a worker opens at most 43 and the Dockerfile's 4 workers 172.
+# Postgres' max_connections must allow that.
 engine = create_engine(
     str(settings.SQLALCHEMY_DATABASE_URI),
-    pool_size=20,
-    max_overflow=20,
+    pool_size=10,
+    max_overflow=10,
+    pool_timeout=60,
+    pool_pre_ping=True,
+    pool_recycle=3600
+)
+
+# The same database through psycopg's async mode, for code running on the
+# event loop. Waiting on a query yields to other requests instead of
+# holding one of the threads sync routes run on.
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    pool_size=10,
+    max_overflow=10,
     pool_timeout=60,
     pool_pre_ping=True,
     pool_recycle=3600
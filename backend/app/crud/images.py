@@ -0,0 +1,83 @@
+from typing import Iterator, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Integer, Uuid, column, values
+from sqlmodel import Session, select, update
+
+from app.models.images import Image
+from app.models.listings import Listing
+
+
+def get_listing_image_ids(session: Session, listing_id: UUID) -> List[UUID]:
+    """Get the IDs of all images attached to a listing"""
+    query = select(Image.id).where(Image.listing_id == listing_id)
+    return [image_id for image_id in session.exec(query)]
+
+
+def clear_primary_image(session: Session, listing_id: UUID) -> None:
+    """Unset the primary flag on every image of a listing"""
+    session.execute(
+        update(Image)
+        .where(Image.listing_id == listing_id, Image.is_primary == True)
+        .values(is_primary=False)
+    )
+
+
+def set_primary_image(session: Session, listing_id: UUID, image_id: UUID) -> None:
+    """Make image_id the only primary image of a listing in a single statement"""
+    session.execute(
+        update(Image)
+        .where(Image.listing_id == listing_id)
+        .values(is_primary=Image.id == image_id)
+    )
+
+
+def reorder_listing_images(
+        session: Session,
+        *,
+        listing_id: UUID,
+        image_ids: List[UUID],
+        primary_image_id: Optional[UUID] = None
+) -> int:
+    """
+    Apply a full display order, and optionally a new primary image, with one
+    UPDATE ... FROM (VALUES ...) statement.
+
+    The caller is responsible for validating that image_ids covers exactly the
+    listing's images. Returns the number of updated rows.
+    """
+    new_order = values(
+        column("id", Uuid),
+        column("display_order", Integer),
+        name="new_order"
+    ).data([(image_id, position) for position, image_id in enumerate(image_ids)])
+
+    new_values = {"display_order": new_order.c.display_order}
+    if primary_image_id is not None:
+        new_values["is_primary"] = Image.id == primary_image_id
+
+    statement = (
+        update(Image)
+        .where(Image.id == new_order.c.id, Image.listing_id == listing_id)
+        .values(**new_values)
+        .execution_options(synchronize_session=False)
+    )
+    result = session.execute(statement)
+    return result.rowcount
+
+
+def iter_image_hashes(session: Session, batch_size: int = 10_000) -> Iterator[tuple[UUID, UUID, UUID, int]]:
+    """Stream (image id, listing id, owner id, phash) for every hashed image"""
+    query = (
+        select(Image.id, Image.listing_id, Listing.owner_id, Image.phash)
+        .join(Listing, Listing.id == Image.listing_id)
+        .where(Image.phash.is_not(None))
+        .execution_options(yield_per=batch_size)
+    )
+    yield from session.exec(query)
+
+
+def set_image_derivatives(session: Session, image_id: UUID, values: dict) -> bool:
+    """Store data derived from the image file, returning False if the image no longer exists"""
+    result = session.execute(update(Image).where(Image.id == image_id).values(**values))
+    return result.rowcount > 0
@@ -0,0 +1,82 @@
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import case
+from sqlmodel import Session, func, select
+
+from app.models.lease_agreements import LeaseAgreement, LeaseAgreementText, LeaseSearchResult
+from app.models.listings import Listing
+from app.services.lease_text import SEARCH_CONFIG
+
+
+def search_lease_agreements(
+        session: Session,
+        query: str,
+        skip: int = 0,
+        limit: int = 20,
+        snippet_owner_id: Optional[UUID] = None
+) -> Tuple[List[LeaseSearchResult], int]:
+    """
+    Full-text search over extracted lease text, best matches first.
+
+    ``query`` uses web search syntax, e.g. ``subletting allowed`` or
+    ``"pets allowed" -cats``. Every listing is searched, but the lease text
+    is private: with ``snippet_owner_id``, snippets are only returned for
+    that user's own listings. Without it, as for superusers, every result
+    has one.
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    matches = LeaseAgreementText.search_vector.op("@@")(tsquery)
+    rank = func.ts_rank_cd(LeaseAgreementText.search_vector, tsquery)
+
+    total = session.exec(
+        select(func.count()).select_from(LeaseAgreementText).where(matches)
+    ).one()
+
+    # Rank and paginate first so snippets are only generated for the returned page
+    page = (
+        select(
+            LeaseAgreement.listing_id,
+            LeaseAgreement.id.label("lease_agreement_id"),
+            Listing.owner_id,
+            Listing.address,
+            Listing.rent,
+            rank.label("rank"),
+            LeaseAgreementText.content,
+        )
+        .join(LeaseAgreement, LeaseAgreement.id == LeaseAgreementText.lease_agreement_id)
+        .join(Listing, Listing.id == LeaseAgreement.listing_id)
+        .where(matches)
+        .order_by(rank.desc(), LeaseAgreement.id)
+        .offset(skip)
+        .limit(limit)
+        .subquery()
+    )
+    snippet = func.ts_headline(
+        SEARCH_CONFIG, page.c.content, tsquery, "MaxFragments=2, MaxWords=20, MinWords=5"
+    )
+    if snippet_owner_id is not None:
+        snippet = case((page.c.owner_id == snippet_owner_id, snippet), else_=None)
+    rows = session.exec(
+        select(
+            page.c.listing_id,
+            page.c.lease_agreement_id,
+            page.c.address,
+            page.c.rent,
+            page.c.rank,
+            snippet.label("snippet"),
+        ).order_by(page.c.rank.desc(), page.c.lease_agreement_id)
+    ).all()
+
+    results = [
+        LeaseSearchResult(
+            listing_id=row.listing_id,
+            lease_agreement_id=row.lease_agreement_id,
+            address=row.address,
+            rent=row.rent,
+            rank=row.rank,
+            snippet=row.snippet,
+        )
+        for row in rows
+    ]
+    return results, total
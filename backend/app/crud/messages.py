@@ -1,7 +1,11 @@
-from typing import List, Optional, Tuple
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
-from sqlmodel import Session, select, or_, and_, func, col
+from sqlalchemy import case, true, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select, update, or_, and_, func, col
 import datetime
 from fastapi import HTTPException
 
@@ -9,13 +13,19 @@ from app.models.messages import (
     Message,
     MessageCreate,
     MessageUpdate,
-    MessageReadStatus,
     ReadReceipt,
     Conversation,
     ConversationCreate,
     ConversationParticipant,
-    UserBlock
+    UserBlock,
+    UserUnreadCount
 )
+from app.models.users import User
+from app.services.block_graph import NOTIFY_CHANNEL, get_block_graph
+from app.services.participant_cache import get_participant_cache
+
+# Length of the last message preview stored on Conversation
+MESSAGE_PREVIEW_LENGTH = 255
 
 
 # User Blocking CRUD Operations
@@ -42,7 +52,9 @@ def block_user(
         blocked_id=blocked_id
     )
     session.add(block)
+    _announce_block_change(session, blocker_id, blocked_id)
     session.commit()
+    get_block_graph().invalidate(blocker_id, blocked_id)
     session.refresh(block)
     return block
 
@@ -64,10 +76,17 @@ def unblock_user(
         return False
 
     session.delete(block)
+    _announce_block_change(session, blocker_id, blocked_id)
     session.commit()
+    get_block_graph().invalidate(blocker_id, blocked_id)
     return True
 
 
+def _announce_block_change(session: Session, blocker_id: UUID, blocked_id: UUID) -> None:
+    """Tell the block graphs of all workers to reload both users, delivered on commit"""
+    session.execute(select(func.pg_notify(NOTIFY_CHANNEL, f"{blocker_id}:{blocked_id}")))
+
+
 def get_blocked_users(
         session: Session,
         user_id: UUID
@@ -84,23 +103,8 @@ def is_user_blocked(
         user_id: UUID,
         target_id: UUID
 ) -> bool:
-    """Check if a user is blocked by another user"""
-    block = session.exec(
-        select(UserBlock).where(
-            or_(
-                and_(
-                    UserBlock.blocker_id == user_id,
-                    UserBlock.blocked_id == target_id
-                ),
-                and_(
-                    UserBlock.blocker_id == target_id,
-                    UserBlock.blocked_id == user_id
-                )
-            )
-        )
-    ).first()
-
-    return block is not None
+    """Check if either user blocked the other"""
+    return get_block_graph().any_blocked(session, user_id, [target_id])
 
 
 # Conversation CRUD Operations
@@ -116,14 +120,11 @@ def create_conversation(
     participant_ids.add(creator_id)  # Always include the creator
 
     # Check if any participants have blocked each other
-    for user_id in participant_ids:
-        blocked_users = get_blocked_users(session, user_id)
-        for blocked_id in blocked_users:
-            if blocked_id in participant_ids:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Cannot create conversation with blocked users"
-                )
+    if get_block_graph().blocked_pairs_within(session, participant_ids):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot create conversation with blocked users"
+        )
 
     # Create the base conversation
     db_conversation = Conversation(
@@ -142,6 +143,7 @@ def create_conversation(
         session.add(participant)
 
     session.commit()
+    get_participant_cache().invalidate(db_conversation.id)
     session.refresh(db_conversation)
     return db_conversation
 
@@ -152,11 +154,8 @@ def get_conversation(session: Session, conversation_id: UUID) -> Optional[Conver
 
 
 def get_conversation_participants(session: Session, conversation_id: UUID) -> List[UUID]:
-    """Get all participant IDs for a conversation"""
-    query = select(ConversationParticipant.user_id).where(
-        ConversationParticipant.conversation_id == conversation_id
-    )
-    return [user_id for user_id in session.exec(query)]
+    """Get all participant IDs for a conversation, through the participant cache"""
+    return list(get_participant_cache().get(session, conversation_id))
 
 
 def get_user_conversations(
@@ -165,97 +164,259 @@ def get_user_conversations(
         skip: int = 0,
         limit: int = 50
 ) -> Tuple[List[dict], int]:
-    """Get all conversations for a user excluding those with blocked users"""
-    # Get IDs of users that this user has blocked or is blocked by
-    blocked_query = select(UserBlock.blocked_id, UserBlock.blocker_id).where(
-        or_(
-            UserBlock.blocker_id == user_id,
-            UserBlock.blocked_id == user_id
+    """
+    Get a page of a user's conversations, most recently active first,
+    excluding one-on-one conversations with users they blocked or who
+    blocked them.
+
+    Everything comes from a single query over the conversation summary
+    columns and the user's participant row, so its cost doesn't grow with
+    message history.
+    """
+    membership = aliased(ConversationParticipant)
+    member = aliased(ConversationParticipant)
+    other = aliased(ConversationParticipant)
+
+    participant_ids = (
+        select(func.array_agg(member.user_id).label("ids"))
+        .where(member.conversation_id == Conversation.id)
+        .lateral("participant_ids")
+    )
+    blocked_other_participant = (
+        select(other.user_id)
+        .join(
+            UserBlock,
+            or_(
+                and_(UserBlock.blocker_id == user_id, UserBlock.blocked_id == other.user_id),
+                and_(UserBlock.blocker_id == other.user_id, UserBlock.blocked_id == user_id)
+            )
         )
+        .where(other.conversation_id == Conversation.id)
+        .exists()
     )
-    blocked_relationships = session.exec(blocked_query).all()
-
-    # Extract all blocked user IDs
-    blocked_ids = set()
-    for blocker_id, blocked_id in blocked_relationships:
-        if blocker_id == user_id:
-            blocked_ids.add(blocked_id)
-        else:
-            blocked_ids.add(blocker_id)
-
-    # Find conversations where user is a participant
-    query = select(Conversation).where(
-        Conversation.id.in_(
-            select(ConversationParticipant.conversation_id).where(
-                ConversationParticipant.user_id == user_id
+    last_activity = func.coalesce(Conversation.last_message_at, Conversation.created_at)
+
+    query = (
+        select(
+            Conversation.id,
+            Conversation.name,
+            Conversation.is_group,
+            Conversation.created_at,
+            Conversation.last_message_preview,
+            Conversation.last_message_at,
+            membership.unread_count,
+            participant_ids.c.ids.label("participant_ids"),
+            func.count().over().label("total"),
+        )
+        .join(
+            membership,
+            and_(membership.conversation_id == Conversation.id, membership.user_id == user_id)
+        )
+        .join(participant_ids, true())
+        .where(
+            ~and_(
+                Conversation.is_group == False,
+                func.cardinality(participant_ids.c.ids) == 2,
+                blocked_other_participant
             )
         )
+        .order_by(last_activity.desc(), Conversation.id)
     )
 
-    # Count total before filtering out blocked users
-    total_query = select(func.count()).where(
-        Conversation.id.in_(
-            select(ConversationParticipant.conversation_id).where(
-                ConversationParticipant.user_id == user_id
-            )
+    rows = session.exec(query.offset(skip).limit(limit)).all()
+
+    if rows:
+        total = rows[0].total
+    elif skip > 0:
+        # Past the last page the window count has no row to ride on
+        total = session.exec(select(func.count()).select_from(query.subquery())).one()
+    else:
+        total = 0
+
+    result = [
+        {
+            "id": row.id,
+            "sender_name": row.name,
+            "is_group": row.is_group,
+            "created_at": row.created_at,
+            "last_message": row.last_message_preview,
+            "last_message_time": row.last_message_at,
+            "unread_count": row.unread_count,
+            "participants": [{"user_id": participant_id} for participant_id in row.participant_ids]
+        }
+        for row in rows
+    ]
+
+    return result, total
+
+
+def _latest_message_values(conversation_id) -> dict:
+    """Summary column values taken from the newest non-deleted message of a conversation"""
+    def latest(column):
+        return (
+            select(column)
+            .where(Message.conversation_id == conversation_id, Message.deleted == False)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(1)
+            .scalar_subquery()
         )
+
+    return {
+        "last_message_id": latest(Message.id),
+        "last_message_at": latest(Message.created_at),
+        "last_message_preview": latest(func.left(Message.content, MESSAGE_PREVIEW_LENGTH)),
+    }
+
+
+def _past_watermark(participant, created_at, message_id) -> object:
+    """Whether the message at (created_at, message_id) is newer than the participant's read watermark"""
+    return or_(
+        participant.last_read_message_at == None,
+        tuple_(created_at, message_id)
+        > tuple_(participant.last_read_message_at, participant.last_read_message_id)
     )
-    total = session.exec(total_query).one()
-
-    # Get paginated conversations
-    conversations = session.exec(query.offset(skip).limit(limit)).all()
-
-    # For each conversation, get additional info and filter out direct conversations with blocked users
-    result = []
-    for conversation in conversations:
-        # Get participant IDs
-        participants = get_conversation_participants(session, conversation.id)
-
-        # Skip one-on-one conversations with blocked users
-        if not conversation.is_group and len(participants) == 2:
-            other_user = next((p for p in participants if p != user_id), None)
-            if other_user and other_user in blocked_ids:
-                continue
-
-        # Get the last message
-        last_message_query = select(Message).where(
-            Message.conversation_id == conversation.id,
-            Message.deleted == False
-        ).order_by(Message.created_at.desc()).limit(1)
-
-        last_message = session.exec(last_message_query).first()
-
-        # Count unread messages
-        unread_count_query = select(func.count(Message.id)).where(
-            Message.conversation_id == conversation.id,
-            Message.sender_id != user_id,  # Not from the current user
+
+
+def _unread_count_of(participant) -> object:
+    """Count of messages the participant has not read, computed from message history"""
+    return (
+        select(func.count(Message.id))
+        .where(
+            Message.conversation_id == participant.conversation_id,
+            Message.sender_id != participant.user_id,
             Message.deleted == False,
-            ~Message.id.in_(
-                select(MessageReadStatus.message_id).where(
-                    MessageReadStatus.user_id == user_id
-                )
-            )
+            _past_watermark(participant, Message.created_at, Message.id)
         )
-        unread_count = session.exec(unread_count_query).one()
-
-        # Use a dictionary that matches your ConversationPublic model
-        conversation_info = {
-            "id": conversation.id,
-            "sender_name": conversation.name,
-            "is_group": conversation.is_group,
-            "created_at": conversation.created_at,
-            "last_message": last_message.content if last_message else None,
-            "last_message_time": last_message.created_at if last_message else None,
-            "unread_count": unread_count or 0,
-            "participants": [{"user_id": p} for p in participants]
-        }
+        .scalar_subquery()
+    )
 
-        result.append(conversation_info)
 
-    # Sort by latest message time
-    result.sort(key=lambda x: x.get("last_message_time") or datetime.datetime.min, reverse=True)
+def repair_conversation_summaries(session: Session, conversation_ids: List[UUID]) -> Tuple[int, int]:
+    """
+    Recompute the last message summary and participant unread counts of
+    the given conversations from message history, only writing rows that
+    drifted.
 
-    return result, total
+    Returns how many conversation and participant rows were corrected.
+    """
+    fresh_conversations = (
+        select(
+            Conversation.id,
+            *(value.label(name) for name, value in _latest_message_values(Conversation.id).items())
+        )
+        .where(Conversation.id.in_(conversation_ids))
+        .subquery()
+    )
+    conversations_fixed = session.execute(
+        update(Conversation)
+        .where(
+            Conversation.id == fresh_conversations.c.id,
+            or_(
+                Conversation.last_message_id.is_distinct_from(fresh_conversations.c.last_message_id),
+                Conversation.last_message_at.is_distinct_from(fresh_conversations.c.last_message_at),
+                Conversation.last_message_preview.is_distinct_from(fresh_conversations.c.last_message_preview),
+            )
+        )
+        .values(
+            last_message_id=fresh_conversations.c.last_message_id,
+            last_message_at=fresh_conversations.c.last_message_at,
+            last_message_preview=fresh_conversations.c.last_message_preview,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    participant = aliased(ConversationParticipant)
+    fresh_counts = (
+        select(
+            participant.conversation_id,
+            participant.user_id,
+            _unread_count_of(participant).label("unread_count")
+        )
+        .where(participant.conversation_id.in_(conversation_ids))
+        .subquery()
+    )
+    participants_fixed = session.execute(
+        update(ConversationParticipant)
+        .where(
+            ConversationParticipant.conversation_id == fresh_counts.c.conversation_id,
+            ConversationParticipant.user_id == fresh_counts.c.user_id,
+            ConversationParticipant.unread_count != fresh_counts.c.unread_count
+        )
+        .values(unread_count=fresh_counts.c.unread_count)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    return conversations_fixed, participants_fixed
+
+
+def repair_user_unread_counts(session: Session, user_ids: List[UUID]) -> int:
+    """
+    Recompute the unread totals of the given users from their participant
+    rows, only writing totals that drifted. Run it after
+    repair_conversation_summaries, which corrects the participant rows.
+
+    Returns how many totals were corrected.
+    """
+    total = func.coalesce(func.sum(ConversationParticipant.unread_count), 0)
+    drifted = (
+        select(User.id, total)
+        .outerjoin(ConversationParticipant, ConversationParticipant.user_id == User.id)
+        .outerjoin(UserUnreadCount, UserUnreadCount.user_id == User.id)
+        .where(User.id.in_(user_ids))
+        .group_by(User.id, UserUnreadCount.unread_count)
+        .having(func.coalesce(UserUnreadCount.unread_count, 0) != total)
+    )
+    statement = insert(UserUnreadCount).from_select(["user_id", "unread_count"], drifted)
+    return session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[UserUnreadCount.user_id],
+            set_={"unread_count": statement.excluded.unread_count}
+        )
+    ).rowcount
+
+
+def _add_user_unread(session: Session, user_ids: List[UUID], delta: int) -> None:
+    """Apply a change of the participant unread counts to the users' totals"""
+    if not user_ids or not delta:
+        return
+    # Lock the rows in a fixed order so concurrent sends to overlapping
+    # groups of users don't deadlock
+    user_ids = sorted(user_ids)
+    if delta > 0:
+        statement = insert(UserUnreadCount).values(
+            [{"user_id": user_id, "unread_count": delta} for user_id in user_ids]
+        )
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[UserUnreadCount.user_id],
+            set_={"unread_count": UserUnreadCount.unread_count + statement.excluded.unread_count}
+        ))
+    else:
+        session.execute(
+            update(UserUnreadCount)
+            .where(UserUnreadCount.user_id.in_(user_ids))
+            .values(unread_count=func.greatest(UserUnreadCount.unread_count + delta, 0))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _locked_participant(conversation_id: UUID, user_id: UUID) -> object:
+    """
+    A participant row as it was before an UPDATE joining it, locked so the
+    counts RETURNING reports from it are the ones the UPDATE replaced
+    """
+    return (
+        select(
+            ConversationParticipant.conversation_id,
+            ConversationParticipant.user_id,
+            ConversationParticipant.unread_count
+        )
+        .where(
+            ConversationParticipant.conversation_id == conversation_id,
+            ConversationParticipant.user_id == user_id
+        )
+        .with_for_update()
+        .subquery()
+    )
 
 
 # Message CRUD Operations
@@ -279,9 +440,8 @@ def create_message(
         raise HTTPException(status_code=403, detail="User is not a participant in this conversation")
 
     # Check if sender is blocked by any participant or has blocked any participant
-    for participant_id in participants:
-        if participant_id != sender_id and is_user_blocked(session, sender_id, participant_id):
-            raise HTTPException(status_code=403, detail="Cannot send message to blocked user")
+    if get_block_graph().any_blocked(session, sender_id, participants):
+        raise HTTPException(status_code=403, detail="Cannot send message to blocked user")
 
     # Create the message
     db_message = Message(
@@ -290,6 +450,33 @@ def create_message(
         content=message_in.content
     )
     session.add(db_message)
+
+    # Keep the conversation summary current in the same transaction. The
+    # timestamp guard keeps a concurrent, older insert from winning.
+    session.execute(
+        update(Conversation)
+        .where(
+            Conversation.id == db_message.conversation_id,
+            or_(Conversation.last_message_at == None, Conversation.last_message_at <= db_message.created_at)
+        )
+        .values(
+            last_message_id=db_message.id,
+            last_message_at=db_message.created_at,
+            last_message_preview=db_message.content[:MESSAGE_PREVIEW_LENGTH]
+        )
+        .execution_options(synchronize_session=False)
+    )
+    recipient_ids = session.execute(
+        update(ConversationParticipant)
+        .where(
+            ConversationParticipant.conversation_id == db_message.conversation_id,
+            ConversationParticipant.user_id != sender_id
+        )
+        .values(unread_count=ConversationParticipant.unread_count + 1)
+        .returning(ConversationParticipant.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    _add_user_unread(session, recipient_ids, 1)
     session.commit()
     session.refresh(db_message)
     return db_message
@@ -325,6 +512,13 @@ def update_message(
         message.content = message_update.content
         message.updated_at = datetime.datetime.utcnow()
 
+        session.execute(
+            update(Conversation)
+            .where(Conversation.id == message.conversation_id, Conversation.last_message_id == message.id)
+            .values(last_message_preview=message.content[:MESSAGE_PREVIEW_LENGTH])
+            .execution_options(synchronize_session=False)
+        )
+
     session.add(message)
     session.commit()
     session.refresh(message)
@@ -346,11 +540,38 @@ def delete_message(
     if message.sender_id != user_id:
         raise HTTPException(status_code=403, detail="Only the sender can delete the message")
 
+    was_deleted = message.deleted
+
     # Soft delete the message
     message.deleted = True
     message.deleted_at = datetime.datetime.utcnow()
 
     session.add(message)
+
+    if not was_deleted:
+        session.flush()
+        # If it was the last message, fall back to the one before it
+        session.execute(
+            update(Conversation)
+            .where(Conversation.id == message.conversation_id, Conversation.last_message_id == message.id)
+            .values(**_latest_message_values(message.conversation_id))
+            .execution_options(synchronize_session=False)
+        )
+        # It no longer counts as unread for anyone who hadn't read it
+        reader_ids = session.execute(
+            update(ConversationParticipant)
+            .where(
+                ConversationParticipant.conversation_id == message.conversation_id,
+                ConversationParticipant.user_id != message.sender_id,
+                ConversationParticipant.unread_count > 0,
+                _past_watermark(ConversationParticipant, message.created_at, message.id)
+            )
+            .values(unread_count=ConversationParticipant.unread_count - 1)
+            .returning(ConversationParticipant.user_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        _add_user_unread(session, reader_ids, -1)
+
     session.commit()
     session.refresh(message)
     return message
@@ -361,9 +582,21 @@ def get_conversation_messages(
         conversation_id: UUID,
         skip: int = 0,
         limit: int = 100,
-        include_deleted: bool = False
-) -> Tuple[List[Message], int]:
-    """Get messages for a specific conversation"""
+        include_deleted: bool = False,
+        before: Optional[UUID] = None,
+        after: Optional[UUID] = None,
+        with_count: bool = True
+) -> Tuple[List[Message], Optional[int]]:
+    """
+    Get messages for a specific conversation, newest first.
+
+    ``before`` and ``after`` are message ids to page from: only messages
+    older than ``before`` and newer than ``after`` are returned. With
+    ``after`` alone the page holds the messages right after it. A cursor
+    seeks through the (conversation_id, created_at, id) index, so a page
+    costs the same however far back it is, unlike ``skip``. The total is
+    only counted when ``with_count`` is set, otherwise it is None.
+    """
     # Verify the conversation exists
     conversation = session.get(Conversation, conversation_id)
     if not conversation:
@@ -378,43 +611,68 @@ def get_conversation_messages(
     if not include_deleted:
         query = query.where(Message.deleted == False)
 
-    query = query.order_by(Message.created_at.desc())
+    position = tuple_(Message.created_at, Message.id)
+    if before is not None:
+        query = query.where(position < tuple_(_cursor_created_at(conversation_id, before), before))
+    if after is not None:
+        query = query.where(position > tuple_(_cursor_created_at(conversation_id, after), after))
 
-    # Total count
-    total_query = select(func.count()).where(
-        Message.conversation_id == conversation_id
-    )
+    oldest_first = after is not None and before is None
+    if oldest_first:
+        query = query.order_by(Message.created_at, Message.id)
+    else:
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
 
-    if not include_deleted:
-        total_query = total_query.where(Message.deleted == False)
-
-    total = session.exec(total_query).one()
     messages = session.exec(query.offset(skip).limit(limit)).all()
+    if oldest_first:
+        messages = messages[::-1]
+
+    total = None
+    if with_count:
+        total_query = select(func.count()).where(
+            Message.conversation_id == conversation_id
+        )
+
+        if not include_deleted:
+            total_query = total_query.where(Message.deleted == False)
+
+        total = session.exec(total_query).one()
 
     return messages, total
 
 
+def _cursor_created_at(conversation_id: UUID, message_id: UUID) -> object:
+    """Timestamp of a cursor message, NULL (so nothing matches) if it is not in the conversation"""
+    cursor = aliased(Message)
+    return (
+        select(cursor.created_at)
+        .where(cursor.id == message_id, cursor.conversation_id == conversation_id)
+        .scalar_subquery()
+    )
+
+
+def page_already_read(session: Session, conversation_id: UUID, read_up_to: UUID, messages: List[Message]) -> bool:
+    """
+    Whether no message in a page, newest first, comes after ``read_up_to``
+    in (created_at, id) order, so fetching it has nothing to mark as read.
+    False when ``read_up_to`` is not a message of the conversation.
+    """
+    if not messages:
+        return True
+    marker = session.get(Message, read_up_to)
+    if marker is None or marker.conversation_id != conversation_id:
+        return False
+    newest = messages[0]
+    return (newest.created_at, newest.id) <= (marker.created_at, marker.id)
+
+
 def get_message_with_read_status(session: Session, message_id: UUID) -> Tuple[Optional[Message], List[ReadReceipt]]:
     """Get a message with its read status information"""
     message = session.get(Message, message_id)
     if not message:
         return None, []
 
-    # Get read receipts
-    query = select(MessageReadStatus).where(
-        MessageReadStatus.message_id == message_id
-    )
-    read_statuses = session.exec(query).all()
-
-    read_receipts = [
-        ReadReceipt(
-            user_id=status.user_id,
-            read_at=status.read_at
-        )
-        for status in read_statuses
-    ]
-
-    return message, read_receipts
+    return message, get_read_receipts(session, [message])[message.id]
 
 
 def mark_message_as_read(
@@ -422,7 +680,10 @@ def mark_message_as_read(
         message_id: UUID,
         user_id: UUID
 ) -> bool:
-    """Mark a message as read by a specific user"""
+    """
+    Mark a message, and with it every earlier message of the conversation,
+    as read by a specific user
+    """
     # Get the message
     message = session.get(Message, message_id)
     if not message:
@@ -439,23 +700,32 @@ def mark_message_as_read(
     if not participant_check:
         return False
 
-    # Check if already marked as read
-    existing = session.exec(
-        select(MessageReadStatus).where(
-            MessageReadStatus.message_id == message_id,
-            MessageReadStatus.user_id == user_id
+    # Move the watermark forward, never back. Messages that arrived after
+    # this one stay unread.
+    previous = _locked_participant(message.conversation_id, user_id)
+    counts = session.execute(
+        update(ConversationParticipant)
+        .where(
+            ConversationParticipant.conversation_id == previous.c.conversation_id,
+            ConversationParticipant.user_id == previous.c.user_id,
+            _past_watermark(ConversationParticipant, message.created_at, message.id)
+        )
+        .values(
+            last_read_message_id=message.id,
+            last_read_message_at=message.created_at,
+            last_read_at=datetime.datetime.utcnow(),
+            unread_count=select(func.count(Message.id)).where(
+                Message.conversation_id == message.conversation_id,
+                Message.sender_id != user_id,
+                Message.deleted == False,
+                tuple_(Message.created_at, Message.id) > tuple_(message.created_at, message.id)
+            ).scalar_subquery()
         )
+        .returning(previous.c.unread_count, ConversationParticipant.unread_count)
+        .execution_options(synchronize_session=False)
     ).first()
-
-    if existing:
-        return True  # Already marked as read
-
-    # Mark as read
-    read_status = MessageReadStatus(
-        message_id=message_id,
-        user_id=user_id
-    )
-    session.add(read_status)
+    if counts is not None:
+        _add_user_unread(session, [user_id], counts[1] - counts[0])
     session.commit()
 
     return True
@@ -466,45 +736,49 @@ def mark_conversation_as_read(
         user_id: UUID,
         conversation_id: UUID
 ) -> int:
-    """Mark all messages in a conversation as read"""
-    # Verify the conversation exists and user is a participant
-    participant_check = session.exec(
-        select(ConversationParticipant).where(
-            ConversationParticipant.conversation_id == conversation_id,
-            ConversationParticipant.user_id == user_id
+    """
+    Mark all messages in a conversation as read, returns how many were unread.
+
+    A single UPDATE ... RETURNING that moves the read watermark to the
+    conversation's last message and zeroes the unread count. It writes
+    nothing when there is nothing new, and returns 0 when the user is not
+    a participant.
+    """
+    previous = _locked_participant(conversation_id, user_id)
+    # The newest non-deleted message becomes the watermark, deleted ones
+    # after it are never unread
+    behind = and_(
+        Conversation.last_message_id != None,
+        _past_watermark(ConversationParticipant, Conversation.last_message_at, Conversation.last_message_id)
+    )
+    count = session.execute(
+        update(ConversationParticipant)
+        .where(
+            ConversationParticipant.conversation_id == previous.c.conversation_id,
+            ConversationParticipant.user_id == previous.c.user_id,
+            Conversation.id == ConversationParticipant.conversation_id,
+            or_(ConversationParticipant.unread_count != 0, behind)
         )
-    ).first()
-
-    if not participant_check:
-        return 0
-
-    # Find all unread messages in this conversation
-    unread_messages_query = select(Message).where(
-        Message.conversation_id == conversation_id,
-        Message.sender_id != user_id,  # Only mark messages from others
-        Message.deleted == False,
-        ~Message.id.in_(
-            select(MessageReadStatus.message_id).where(
-                MessageReadStatus.user_id == user_id
+        .values(
+            unread_count=0,
+            last_read_message_id=case(
+                (behind, Conversation.last_message_id), else_=ConversationParticipant.last_read_message_id
+            ),
+            last_read_message_at=case(
+                (behind, Conversation.last_message_at), else_=ConversationParticipant.last_read_message_at
+            ),
+            last_read_at=case(
+                (behind, datetime.datetime.utcnow()), else_=ConversationParticipant.last_read_at
             )
         )
-    )
-
-    unread_messages = session.exec(unread_messages_query).all()
-    count = 0
-
-    for message in unread_messages:
-        read_status = MessageReadStatus(
-            message_id=message.id,
-            user_id=user_id
-        )
-        session.add(read_status)
-        count += 1
-
-    if count > 0:
-        session.commit()
+        .returning(previous.c.unread_count)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if count:
+        _add_user_unread(session, [user_id], -count)
+    session.commit()
 
-    return count
+    return count or 0
 
 
 def get_unread_count(
@@ -513,25 +787,15 @@ def get_unread_count(
         conversation_id: Optional[UUID] = None
 ) -> int:
     """Get count of unread messages for a user, optionally in a specific conversation"""
-    query = select(func.count(Message.id)).where(
-        ~Message.id.in_(
-            select(MessageReadStatus.message_id).where(
-                MessageReadStatus.user_id == user_id
-            )
-        ),
-        Message.sender_id != user_id,  # Don't count user's own messages
-        Message.deleted == False,
-        Message.conversation_id.in_(
-            select(ConversationParticipant.conversation_id).where(
-                ConversationParticipant.user_id == user_id
-            )
-        )
-    )
-
     if conversation_id:
-        query = query.where(Message.conversation_id == conversation_id)
+        query = select(ConversationParticipant.unread_count).where(
+            ConversationParticipant.conversation_id == conversation_id,
+            ConversationParticipant.user_id == user_id
+        )
+    else:
+        query = select(UserUnreadCount.unread_count).where(UserUnreadCount.user_id == user_id)
 
-    return session.exec(query).one() or 0
+    return session.exec(query).first() or 0
 
 
 def get_message_read_receipts(
@@ -539,16 +803,51 @@ def get_message_read_receipts(
         message_id: UUID
 ) -> List[ReadReceipt]:
     """Get all read receipts for a message"""
-    query = select(MessageReadStatus).where(
-        MessageReadStatus.message_id == message_id
-    )
+    message = session.get(Message, message_id)
+    if not message:
+        return []
+
+    return get_read_receipts(session, [message])[message.id]
+
+
+def get_read_receipts(session: Session, messages: List[Message]) -> Dict[UUID, List[ReadReceipt]]:
+    """
+    Get the read receipts of a page of messages, keyed by message id.
+
+    A message is read by every participant, other than its sender, whose
+    read watermark has reached it, so one query for the watermarks of the
+    conversations involved covers the whole page. read_at is when that
+    participant's watermark last moved, which can be later than when they
+    first saw this particular message.
+    """
+    receipts = {message.id: [] for message in messages}
+    conversation_ids = {message.conversation_id for message in messages}
+    if not conversation_ids:
+        return receipts
+
+    watermarks = session.exec(
+        select(
+            ConversationParticipant.conversation_id,
+            ConversationParticipant.user_id,
+            ConversationParticipant.last_read_message_at,
+            ConversationParticipant.last_read_message_id,
+            ConversationParticipant.last_read_at
+        ).where(
+            ConversationParticipant.conversation_id.in_(conversation_ids),
+            ConversationParticipant.last_read_message_id != None
+        )
+    ).all()
 
-    read_statuses = session.exec(query).all()
+    readers = defaultdict(list)
+    for conversation_id, user_id, read_message_at, read_message_id, read_at in watermarks:
+        readers[conversation_id].append((user_id, (read_message_at, read_message_id), read_at))
 
-    return [
-        ReadReceipt(
-            user_id=status.user_id,
-            read_at=status.read_at
-        )
-        for status in read_statuses
-    ]
\ No newline at end of file
+    for message in messages:
+        position = (message.created_at, message.id)
+        receipts[message.id] = [
+            ReadReceipt(user_id=user_id, read_at=read_at)
+            for user_id, watermark, read_at in readers[message.conversation_id]
+            if user_id != message.sender_id and position <= watermark
+        ]
+
+    return receipts
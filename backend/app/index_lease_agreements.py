@@ -0,0 +1,51 @@
+import asyncio
+import logging
+
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.models.lease_agreements import LeaseAgreement, LeaseAgreementText
+from app.services.lease_text import index_lease_agreement
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+async def index_missing() -> int:
+    """Index every lease agreement that has no extracted text yet"""
+    indexed = 0
+    last_id = None
+    while True:
+        with Session(engine) as session:
+            query = (
+                select(LeaseAgreement.id, LeaseAgreement.file_path, LeaseAgreement.file_type)
+                .outerjoin(LeaseAgreementText, LeaseAgreementText.lease_agreement_id == LeaseAgreement.id)
+                .where(LeaseAgreementText.lease_agreement_id == None)
+                .order_by(LeaseAgreement.id)
+                .limit(BATCH_SIZE)
+            )
+            if last_id is not None:
+                query = query.where(LeaseAgreement.id > last_id)
+            batch = session.exec(query).all()
+
+        if not batch:
+            return indexed
+
+        await asyncio.gather(*(
+            index_lease_agreement(agreement_id, file_path, file_type.value)
+            for agreement_id, file_path, file_type in batch
+        ))
+        indexed += len(batch)
+        last_id = batch[-1][0]
+
+
+def main() -> None:
+    logger.info("Indexing lease agreement text")
+    count = asyncio.run(index_missing())
+    logger.info(f"Processed {count} lease agreements")
+
+
+if __name__ == "__main__":
+    main()
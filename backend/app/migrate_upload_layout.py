@@ -0,0 +1,145 @@
+import argparse
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional, Type, Union
+
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.models.images import Image
+from app.models.lease_agreements import LeaseAgreement
+from app.services.file_service import (
+    StorageBackend,
+    get_storage_backend,
+    is_legacy_file_path,
+    sharded_file_path,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+StoredFile = Union[Image, LeaseAgreement]
+
+
+@dataclass
+class MigrationReport:
+    migrated: int = 0
+    missing: int = 0
+    failed_batches: int = 0
+
+
+def _migrate_batch(
+        session: Session,
+        backend: StorageBackend,
+        model: Type[StoredFile],
+        after_id,
+        batch_size: int,
+        report: MigrationReport
+) -> Optional[object]:
+    """
+    Move one batch of legacy files and update their rows in one transaction.
+
+    Files are copied (hard-linked locally) to the new location before the
+    rows change, and the old copies are only removed after the commit, so
+    readers resolve a valid path at every point. Returns the last id seen,
+    or None when there is nothing left.
+    """
+    # Legacy paths are "<listing_id>/<file>", new ones start with "ab/cd/"
+    query = (
+        select(model)
+        .where(~model.file_path.like("__/__/%"))
+        .order_by(model.id)
+        .limit(batch_size)
+        # Leave rows being edited by live requests for a later run
+        .with_for_update(skip_locked=True)
+    )
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    rows = session.exec(query).all()
+    if not rows:
+        return None
+
+    moves: list[tuple[str, str]] = []
+    try:
+        for row in rows:
+            if not is_legacy_file_path(row.file_path):
+                continue
+            old_path = row.file_path
+            new_path = sharded_file_path(old_path)
+            if not backend.exists(old_path):
+                logger.warning(f"{model.__name__} {row.id} points to missing file {old_path}")
+                report.missing += 1
+                continue
+            backend.copy(old_path, new_path)
+            moves.append((old_path, new_path))
+            row.file_path = new_path
+            session.add(row)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Failed to migrate {model.__name__} batch after {after_id}: {e}")
+        report.failed_batches += 1
+        for _, new_path in moves:
+            backend.delete(new_path)
+        return rows[-1].id
+
+    for old_path, _ in moves:
+        backend.delete(old_path)
+        _remove_empty_legacy_directory(backend, old_path)
+    report.migrated += len(moves)
+    return rows[-1].id
+
+
+def _remove_empty_legacy_directory(backend: StorageBackend, old_path: str) -> None:
+    local_path = backend.local_path(old_path)
+    if local_path is None:
+        return
+    try:
+        # Legacy directories never receive new files, so an empty one can go
+        os.rmdir(local_path.parent)
+    except OSError:
+        pass
+
+
+def migrate(
+        db_engine: Engine,
+        backend: StorageBackend,
+        batch_size: int = 200,
+        max_batches: Optional[int] = None
+) -> MigrationReport:
+    """Move every Image and LeaseAgreement file to the hash-prefixed layout"""
+    report = MigrationReport()
+    for model in (Image, LeaseAgreement):
+        after_id = None
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with Session(db_engine) as session:
+                after_id = _migrate_batch(session, backend, model, after_id, batch_size, report)
+            if after_id is None:
+                break
+            batches += 1
+            logger.info(f"{model.__name__}: {report.migrated} files migrated so far")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Move uploaded files from <listing_id>/ directories to the hash-prefixed layout"
+    )
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-batches", type=int, default=None,
+                        help="Stop after this many batches per table, rerun to continue")
+    args = parser.parse_args()
+
+    logger.info("Migrating upload layout")
+    report = migrate(engine, get_storage_backend(), args.batch_size, args.max_batches)
+    logger.info(
+        f"Migrated {report.migrated} files, {report.missing} missing, "
+        f"{report.failed_batches} failed batches"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import datetime
 import uuid
-from typing import Optional, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
+from sqlalchemy import BigInteger, text
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlmodel import Field, Relationship, SQLModel
 from enum import Enum
 
@@ -21,6 +24,8 @@ class ImageBase(SQLModel):
     file_size: int
     is_primary: bool = Field(default=False)
     display_order: int = Field(default=0)
+    # Blurhash of the picture, filled in after upload, for clients to paint before it loads
+    placeholder: Optional[str] = Field(default=None, max_length=128)
 
 class ImageCreate(ImageBase):
     listing_id: uuid.UUID
@@ -30,11 +35,63 @@ class ImageUpdate(SQLModel):
     is_primary: Optional[bool] = None
     display_order: Optional[int] = None
 
+class ImageOrderUpdate(SQLModel):
+    # Every image of the listing, in display order
+    image_ids: List[uuid.UUID]
+    primary_image_id: Optional[uuid.UUID] = None
+
+class ImageUploadUrlCreate(SQLModel):
+    filename: str = Field(max_length=255)
+
+class ImageUploadUrl(SQLModel):
+    file_path: str
+    upload_url: str
+    expires_in: int
+
+class ImageUploadComplete(SQLModel):
+    filename: str = Field(max_length=255)
+    file_path: str = Field(max_length=255)
+    is_primary: bool = False
+
 class Image(ImageBase, table=True):
+    # At most one primary image per listing. This is an exclusion constraint
+    # rather than a partial unique index so it can be checked at the end of
+    # each statement: a bulk UPDATE that moves the primary flag would otherwise
+    # fail on the transient duplicate, depending on row order.
+    __table_args__ = (
+        ExcludeConstraint(
+            ("listing_id", "="),
+            where=text("is_primary"),
+            using="btree",
+            name="image_one_primary_per_listing",
+            deferrable=True,
+            initially="IMMEDIATE",
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     listing_id: uuid.UUID = Field(foreign_key="listing.id", nullable=False, ondelete="CASCADE")
     listing: Optional["Listing"] = Relationship(back_populates="images")
+    # 64-bit difference hash of the picture, used to find photos reused across listings
+    phash: Optional[int] = Field(default=None, sa_type=BigInteger, index=True)
+    # When the stored file was last stripped of metadata and capped in size,
+    # NULL for images uploaded before re-encoding existed
+    processed_at: Optional[datetime.datetime] = Field(default=None)
 
 class ImagePublic(ImageBase):
     id: uuid.UUID
-    listing_id: uuid.UUID
\ No newline at end of file
+    listing_id: uuid.UUID
+
+class DuplicateImage(SQLModel):
+    id: uuid.UUID
+    listing_id: uuid.UUID
+    owner_id: uuid.UUID
+    phash: int
+
+class DuplicateImageCluster(SQLModel):
+    images: List[DuplicateImage]
+    owner_count: int
+
+class DuplicateImageClusters(SQLModel):
+    data: List[DuplicateImageCluster]
+    count: int
@@ -1,5 +1,8 @@
 import uuid
-from typing import Optional, TYPE_CHECKING
+import datetime
+from typing import List, Optional, TYPE_CHECKING
+from sqlalchemy import Column, Index, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field, Relationship, SQLModel
 from enum import Enum
 
@@ -38,3 +41,42 @@ class LeaseAgreement(LeaseAgreementBase, table=True):
 class LeaseAgreementPublic(LeaseAgreementBase):
     id: uuid.UUID
     listing_id: uuid.UUID
+
+class LeaseUploadCreate(SQLModel):
+    filename: str = Field(max_length=255)
+    size: int = Field(gt=0)
+    description: Optional[str] = Field(default=None, max_length=500)
+
+class LeaseUploadStatus(SQLModel):
+    upload_id: str
+    offset: int
+    size: int
+
+# Text extracted from the lease file, kept out of the main table so listing
+# queries never drag it along
+class LeaseAgreementText(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_leaseagreementtext_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    lease_agreement_id: uuid.UUID = Field(
+        foreign_key="leaseagreement.id", primary_key=True, ondelete="CASCADE"
+    )
+    content: str = Field(sa_column=Column(Text, nullable=False))
+    search_vector: str = Field(sa_column=Column(TSVECTOR, nullable=False))
+    extracted_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow, nullable=False
+    )
+
+class LeaseSearchResult(SQLModel):
+    listing_id: uuid.UUID
+    lease_agreement_id: uuid.UUID
+    address: Optional[str] = None
+    rent: Optional[float] = None
+    rank: float
+    # Matching passages of the lease, only for the listing's owner
+    snippet: Optional[str] = None
+
+class LeaseSearchResults(SQLModel):
+    data: List[LeaseSearchResult]
+    count: int
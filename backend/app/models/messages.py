@@ -1,6 +1,7 @@
 import uuid
 import datetime
 from typing import List, Optional
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 from app.models.users import User
 
@@ -23,6 +24,11 @@ class Conversation(ConversationBase, table=True):
     created_at: datetime.datetime = Field(
         default_factory=datetime.datetime.utcnow, nullable=False
     )
+    # Summary of the newest non-deleted message, kept up to date by the message
+    # CRUD functions so the inbox never has to scan message history
+    last_message_id: Optional[uuid.UUID] = Field(default=None)
+    last_message_at: Optional[datetime.datetime] = Field(default=None)
+    last_message_preview: Optional[str] = Field(default=None, max_length=255)
 
     # Relationships
     participants: List["ConversationParticipant"] = Relationship(back_populates="conversation")
@@ -32,12 +38,28 @@ class Conversation(ConversationBase, table=True):
 class ConversationParticipant(SQLModel, table=True):
     conversation_id: uuid.UUID = Field(foreign_key="conversation.id", primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True)
+    # Messages from other participants this user has not read yet
+    unread_count: int = Field(default=0)
+    # Read watermark: every message up to and including this one, ordered by
+    # (created_at, id), counts as read by this participant
+    last_read_message_id: Optional[uuid.UUID] = Field(default=None)
+    last_read_message_at: Optional[datetime.datetime] = Field(default=None)
+    # When the watermark last moved, reported as the read time of receipts
+    last_read_at: Optional[datetime.datetime] = Field(default=None)
 
     # Relationships
     conversation: Conversation = Relationship(back_populates="participants")
     user: "User" = Relationship()
 
 
+# Total of a user's ConversationParticipant.unread_count, kept in step by
+# the message CRUD functions so the unread badge is a primary key lookup.
+# A missing row means zero.
+class UserUnreadCount(SQLModel, table=True):
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    unread_count: int = Field(default=0)
+
+
 class MessageBase(SQLModel):
     content: str = Field(max_length=4000)
 
@@ -51,6 +73,11 @@ class MessageUpdate(SQLModel):
 
 
 class Message(MessageBase, table=True):
+    # Serves history pages, which seek by (created_at, id) within a conversation
+    __table_args__ = (
+        Index("ix_message_conversation_id_created_at_id", "conversation_id", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     sender_id: uuid.UUID = Field(foreign_key="user.id", nullable=False)
     conversation_id: uuid.UUID = Field(foreign_key="conversation.id", nullable=False)
@@ -66,20 +93,6 @@ class Message(MessageBase, table=True):
     sender: "User" = Relationship(
         sa_relationship_kwargs={"foreign_keys": "[Message.sender_id]"}
     )
-    read_status: List["MessageReadStatus"] = Relationship(back_populates="message")
-
-
-# Junction table for storing read status by each recipient
-class MessageReadStatus(SQLModel, table=True):
-    message_id: uuid.UUID = Field(foreign_key="message.id", primary_key=True)
-    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True)
-    read_at: datetime.datetime = Field(
-        default_factory=datetime.datetime.utcnow, nullable=False
-    )
-
-    # Relationships
-    message: Message = Relationship(back_populates="read_status")
-    user: "User" = Relationship()
 
 
 # User blocking table
@@ -122,7 +135,8 @@ class MessagePublic(MessageBase):
 
 class MessagesPublic(SQLModel):
     data: List[MessagePublic]
-    count: int
+    # None when the caller skipped counting
+    count: Optional[int] = None
 
 
 class ConversationParticipantPublic(SQLModel):
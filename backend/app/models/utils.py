@@ -8,6 +8,12 @@ class Message(SQLModel):
     message: str
 
 
+# Direct download link for a stored file
+class FileUrl(SQLModel):
+    url: str
+    expires_in: int
+
+
 # JSON payload containing access token
 class Token(SQLModel):
     access_token: str
@@ -0,0 +1,53 @@
+import argparse
+import logging
+
+from app.core.config import settings
+from app.core.db import engine
+from app.services.resumable_upload import ResumableUploadStore
+from app.services.upload_reconciler import UploadReconciler, database_lookup
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Quarantine and delete uploaded files that no database row references"
+    )
+    parser.add_argument("--max-files", type=int, default=None,
+                        help="Stop after this many files and resume from the checkpoint next run")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--grace-hours", type=float, default=1,
+                        help="Ignore files modified more recently than this")
+    parser.add_argument("--retention-days", type=float, default=7,
+                        help="How long quarantined files are kept before deletion")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if settings.STORAGE_BACKEND != "local":
+        logger.info("Upload reconciliation only applies to the local storage backend")
+        return
+
+    reconciler = UploadReconciler(
+        settings.UPLOADS_DIR,
+        database_lookup(engine),
+        batch_size=args.batch_size,
+        grace_period=args.grace_hours * 60 * 60,
+        quarantine_retention=args.retention_days * 60 * 60 * 24,
+        dry_run=args.dry_run,
+    )
+    # Resumable uploads that were never completed
+    ResumableUploadStore(settings.UPLOADS_DIR).purge_expired(
+        settings.RESUMABLE_UPLOAD_EXPIRE_HOURS * 60 * 60
+    )
+
+    logger.info("Reconciling uploads")
+    report = reconciler.run(max_files=args.max_files)
+    logger.info(
+        f"Quarantined {report.quarantined_files} files ({report.quarantined_bytes} bytes), "
+        f"reclaimed {report.reclaimed_bytes} bytes from {report.deleted_files} expired files"
+    )
+
+
+if __name__ == "__main__":
+    main()
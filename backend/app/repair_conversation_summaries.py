@@ -0,0 +1,92 @@
+import argparse
+import logging
+from typing import Optional
+
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.crud.messages import repair_conversation_summaries, repair_user_unread_counts
+from app.models.messages import Conversation
+from app.models.users import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def repair(db_engine: Engine, batch_size: int = 500, max_batches: Optional[int] = None) -> tuple[int, int]:
+    """
+    Recompute every conversation's last message summary and unread counts,
+    one batch of conversations per transaction.
+
+    Returns how many conversation and participant rows had drifted.
+    """
+    conversations_fixed = participants_fixed = 0
+    last_id = None
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with Session(db_engine) as session:
+            query = select(Conversation.id).order_by(Conversation.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(Conversation.id > last_id)
+            conversation_ids = session.exec(query).all()
+            if not conversation_ids:
+                break
+
+            fixed = repair_conversation_summaries(session, conversation_ids)
+            session.commit()
+
+        conversations_fixed += fixed[0]
+        participants_fixed += fixed[1]
+        last_id = conversation_ids[-1]
+        batches += 1
+    return conversations_fixed, participants_fixed
+
+
+def repair_users(db_engine: Engine, batch_size: int = 500, max_batches: Optional[int] = None) -> int:
+    """
+    Recompute every user's unread total from their participant rows, one
+    batch of users per transaction. Run after repair(), which fixes those.
+
+    Returns how many totals had drifted.
+    """
+    users_fixed = 0
+    last_id = None
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with Session(db_engine) as session:
+            query = select(User.id).order_by(User.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(User.id > last_id)
+            user_ids = session.exec(query).all()
+            if not user_ids:
+                break
+
+            users_fixed += repair_user_unread_counts(session, user_ids)
+            session.commit()
+
+        last_id = user_ids[-1]
+        batches += 1
+    return users_fixed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute conversation summaries and unread counts")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+
+    logger.info("Repairing conversation summaries")
+    conversations_fixed, participants_fixed = repair(engine, args.batch_size, args.max_batches)
+    logger.info(
+        f"Corrected {conversations_fixed} conversation summaries "
+        f"and {participants_fixed} unread counts"
+    )
+
+    logger.info("Checking user unread totals")
+    users_fixed = repair_users(engine, args.batch_size, args.max_batches)
+    logger.info(f"Corrected {users_fixed} user unread totals")
+
+
+if __name__ == "__main__":
+    main()
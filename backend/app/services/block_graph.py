@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import Engine
+from sqlmodel import Session, or_, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.messages import UserBlock
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel block changes are announced on, the payload is
+# "<blocker_id>:<blocked_id>"
+NOTIFY_CHANNEL = "user_block"
+
+BlockFetcher = Callable[[Session, Set[UUID]], List[Tuple[UUID, UUID]]]
+
+
+def fetch_blocks(session: Session, user_ids: Set[UUID]) -> List[Tuple[UUID, UUID]]:
+    """(blocker_id, blocked_id) of every block involving one of the users"""
+    return list(session.exec(
+        select(UserBlock.blocker_id, UserBlock.blocked_id).where(
+            or_(UserBlock.blocker_id.in_(user_ids), UserBlock.blocked_id.in_(user_ids))
+        )
+    ))
+
+
+class BlockGraph:
+    """
+    Process-local cache of who is in a block relationship with whom.
+
+    Messaging only ever asks whether two users blocked each other in
+    either direction, so each user maps to the set of users they blocked
+    or were blocked by. Entries are loaded on first use, all missing users
+    of a check in one query, and dropped when a block involving the user
+    changes. Changes made by other workers arrive through
+    BlockChangeListener; ``ttl`` bounds how long an entry can be stale if
+    a notification is lost.
+    """
+
+    def __init__(self, ttl: float, fetch: BlockFetcher = fetch_blocks):
+        self.ttl = ttl
+        self._fetch = fetch
+        self._entries: Dict[UUID, Tuple[float, FrozenSet[UUID]]] = {}
+        # Bumped by every invalidation, so a load that raced with one
+        # doesn't store what it read before the change
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def neighbours(self, session: Session, user_ids: Iterable[UUID]) -> Dict[UUID, FrozenSet[UUID]]:
+        """The users each of ``user_ids`` blocked or was blocked by"""
+        user_ids = set(user_ids)
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None and now - entry[0] < self.ttl:
+                    result[user_id] = entry[1]
+            generation = self._generation
+
+        missing = user_ids - result.keys()
+        if missing:
+            adjacency: Dict[UUID, Set[UUID]] = {user_id: set() for user_id in missing}
+            for blocker_id, blocked_id in self._fetch(session, missing):
+                if blocker_id in adjacency:
+                    adjacency[blocker_id].add(blocked_id)
+                if blocked_id in adjacency:
+                    adjacency[blocked_id].add(blocker_id)
+            loaded = {user_id: frozenset(users) for user_id, users in adjacency.items()}
+            result.update(loaded)
+
+            with self._lock:
+                if generation == self._generation:
+                    for user_id, users in loaded.items():
+                        self._entries[user_id] = (now, users)
+        return result
+
+    def any_blocked(self, session: Session, user_id: UUID, others: Iterable[UUID]) -> bool:
+        """Whether user_id and any of ``others`` blocked each other"""
+        others = set(others)
+        others.discard(user_id)
+        return not self.neighbours(session, [user_id])[user_id].isdisjoint(others)
+
+    def blocked_pairs_within(self, session: Session, user_ids: Iterable[UUID]) -> bool:
+        """Whether any two of ``user_ids`` blocked each other"""
+        user_ids = set(user_ids)
+        return any(
+            not users.isdisjoint(user_ids)
+            for users in self.neighbours(session, user_ids).values()
+        )
+
+    def invalidate(self, *user_ids: UUID) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+class BlockChangeListener:
+    """
+    Invalidates a BlockGraph when any worker announces a block change with
+    pg_notify. Runs LISTEN on its own connection in a daemon thread. After
+    reconnecting the whole cache is cleared, since notifications sent in
+    between are lost.
+    """
+
+    def __init__(self, db_engine: Engine, graph: BlockGraph, retry_seconds: float = 5.0):
+        self.conninfo = db_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self.graph = graph
+        self.retry_seconds = retry_seconds
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="block-change-listener", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        import psycopg
+
+        while True:
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    self.graph.clear()
+                    for notify in conn.notifies():
+                        self.graph.invalidate(*(UUID(part) for part in notify.payload.split(":")))
+            except Exception as e:
+                logger.warning(f"Block change listener disconnected: {e}")
+            time.sleep(self.retry_seconds)
+
+
+_graph: Optional[BlockGraph] = None
+_graph_lock = threading.Lock()
+
+
+def get_block_graph() -> BlockGraph:
+    """The process's block graph, listening for changes from other workers once created"""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = BlockGraph(settings.BLOCK_CACHE_TTL_SECONDS)
+            BlockChangeListener(engine, _graph).start()
+    return _graph
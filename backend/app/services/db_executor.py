@@ -0,0 +1,92 @@
+import asyncio
+import functools
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, TypeVar
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine, engine
+
+T = TypeVar("T")
+
+SessionFactory = Callable[[], Session]
+AsyncSessionFactory = Callable[[], AsyncSession]
+
+
+def open_session() -> Session:
+    return Session(engine)
+
+
+def open_async_session() -> AsyncSession:
+    return AsyncSession(async_engine, expire_on_commit=False)
+
+
+class DBExecutor:
+    """
+    Runs synchronous CRUD for async code on a bounded pool of threads.
+
+    Websocket handlers are coroutines sharing one event loop per worker, so
+    a query run inline stalls every connection on that worker until it
+    returns. Here it only occupies a pool thread. Each call is one unit of
+    work with a session of its own, opened and closed on the pool thread.
+    The pool should stay below the engine's connection pool so threads
+    never queue for a connection while holding a slot.
+    """
+
+    def __init__(self, max_workers: int, session_factory: SessionFactory = open_session):
+        self.max_workers = max_workers
+        self._session_factory = session_factory
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Await fn(session, *args, **kwargs) run on a pool thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(self._call, fn, *args, **kwargs))
+
+    def _call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        with self._session_factory() as session:
+            return fn(session, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+class AsyncDBExecutor:
+    """
+    DBExecutor's interface over the async engine, without threads.
+
+    AsyncSession.run_sync hands the same synchronous CRUD a Session whose
+    queries yield to the event loop while waiting on the database, so
+    concurrency is bounded by the engine's connection pool alone.
+    """
+
+    def __init__(self, session_factory: AsyncSessionFactory = open_async_session):
+        self._session_factory = session_factory
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Await fn(session, *args, **kwargs) in a session of its own"""
+        async with self._session_factory() as session:
+            return await session.run_sync(fn, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        pass
+
+
+_executor: Optional[DBExecutor | AsyncDBExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> DBExecutor | AsyncDBExecutor:
+    """The executor configured by WS_DB_EXECUTOR"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.WS_DB_EXECUTOR == "async":
+                _executor = AsyncDBExecutor()
+            else:
+                _executor = DBExecutor(settings.WS_DB_WORKERS)
+    return _executor
@@ -1,10 +1,17 @@
+import asyncio
+import hashlib
 import logging
 import os
 import shutil
+from abc import ABC, abstractmethod
+from functools import lru_cache
 from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
 import uuid
 
+from app.core.config import settings
 from app.models.images import ImageFileType
 from app.models.lease_agreements import LeaseFileType
 
@@ -40,45 +47,360 @@ def get_file_format(filename: str) -> ImageFileType | LeaseFileType:
     return extension_to_mime[extension]
 
 
-class FileStorageService:
-    def __init__(self, base_dir: str):
+def listing_directory(listing_id: uuid.UUID) -> str:
+    """
+    Relative directory holding a listing's files.
+
+    Listings are spread over a two-level hash prefix (``ab/cd/<listing_id>``)
+    so no single directory ends up with tens of thousands of entries.
+    """
+    digest = hashlib.sha256(str(listing_id).encode()).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{listing_id}"
+
+
+def is_legacy_file_path(relative_path: str) -> bool:
+    """Whether a stored path uses the old flat ``<listing_id>/<file>`` layout"""
+    return len(Path(relative_path).parts) == 2
+
+
+def sharded_file_path(relative_path: str) -> str:
+    """Map a legacy ``<listing_id>/<file>`` path to its hash-prefixed location"""
+    listing_id, filename = Path(relative_path).parts
+    return f"{listing_directory(uuid.UUID(listing_id))}/{filename}"
+
+
+class StorageBackend(ABC):
+    """
+    Where uploaded file bytes live.
+
+    Files are addressed by a relative key such as ``<listing_id>/<uuid>.jpg``,
+    which is what gets stored in the ``file_path`` columns.
+    """
+
+    @abstractmethod
+    def save(self, fileobj: BinaryIO, key: str) -> None:
+        """Write the contents of fileobj under key"""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Open a stored file for binary reading"""
+
+    def replace(self, fileobj: BinaryIO, key: str) -> None:
+        """Overwrite a stored file so readers see either the old or the new contents"""
+        self.save(fileobj, key)
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Delete a stored file, returning False if it did not exist"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        """Delete every stored file under prefix"""
+
+    @abstractmethod
+    def size(self, key: str) -> Optional[int]:
+        """Size of a stored file in bytes, or None if it does not exist"""
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    @abstractmethod
+    def copy(self, source_key: str, target_key: str) -> None:
+        """Make the file at source_key also available at target_key"""
+
+    def adopt(self, local_path: Path, key: str) -> None:
+        """Take over a complete local file as key, removing it from local_path"""
+        with open(local_path, "rb") as f:
+            self.save(f, key)
+        os.remove(local_path)
+
+    def presigned_put_url(self, key: str, content_type: str, expires_in: int) -> str:
+        """URL a client can PUT the file bytes to directly"""
+        raise NotImplementedError(f"{type(self).__name__} does not support direct uploads")
+
+    @abstractmethod
+    def presigned_get_url(self, key: str, expires_in: int) -> str:
+        """URL a client can download the file from directly"""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of a stored file, if the backend keeps files on local disk"""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """Stores files on the local filesystem under base_dir, served by the /uploads mount"""
+
+    def __init__(self, base_dir: str, public_url_prefix: str = "/uploads"):
         self.base_dir = Path(base_dir)
+        self.public_url_prefix = public_url_prefix.rstrip("/")
         os.makedirs(self.base_dir, exist_ok=True)
 
-    async def save_file(self, file: UploadFile, listing_id: uuid.UUID) -> str:
-        """Save an uploaded file to the storage system and return the file path"""
-        # Validate file type and convert to FileType enum
-        file_type = get_file_format(file.filename)
+    def save(self, fileobj: BinaryIO, key: str) -> None:
+        file_path = self.base_dir / key
+        os.makedirs(file_path.parent, exist_ok=True)
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(fileobj, buffer)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.base_dir / key, "rb")
+
+    def replace(self, fileobj: BinaryIO, key: str) -> None:
+        file_path = self.base_dir / key
+        tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as buffer:
+                shutil.copyfileobj(fileobj, buffer)
+                buffer.flush()
+                os.fsync(buffer.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def adopt(self, local_path: Path, key: str) -> None:
+        # A rename, the bytes are not copied again
+        file_path = self.base_dir / key
+        os.makedirs(file_path.parent, exist_ok=True)
+        os.replace(local_path, file_path)
+
+    def copy(self, source_key: str, target_key: str) -> None:
+        target_path = self.base_dir / target_key
+        os.makedirs(target_path.parent, exist_ok=True)
+        try:
+            # Hard link, so no bytes are duplicated on disk
+            os.link(self.base_dir / source_key, target_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(self.base_dir / source_key, target_path)
+
+    def delete(self, key: str) -> bool:
+        file_path = self.base_dir / key
+        if file_path.exists():
+            os.remove(file_path)
+            return True
+        return False
+
+    def delete_prefix(self, prefix: str) -> None:
+        directory = self.base_dir / prefix
+        if directory.exists():
+            shutil.rmtree(directory)
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return (self.base_dir / key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def presigned_get_url(self, key: str, expires_in: int) -> str:
+        # Local files are served publicly by the static mount, nothing to sign
+        return f"{self.public_url_prefix}/{key}"
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.base_dir / key
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Stores files in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    Requires the optional ``boto3`` dependency.
+    """
+
+    def __init__(
+            self,
+            bucket: str,
+            *,
+            endpoint_url: Optional[str] = None,
+            region_name: Optional[str] = None,
+            access_key_id: Optional[str] = None,
+            secret_access_key: Optional[str] = None,
+            client=None
+    ):
+        self.bucket = bucket
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("The S3 storage backend requires boto3 to be installed") from e
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=region_name,
+                aws_access_key_id=access_key_id,
+                aws_secret_access_key=secret_access_key,
+            )
+        self.client = client
+
+    def save(self, fileobj: BinaryIO, key: str) -> None:
+        self.client.upload_fileobj(fileobj, self.bucket, key)
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def copy(self, source_key: str, target_key: str) -> None:
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=target_key,
+            CopySource={"Bucket": self.bucket, "Key": source_key},
+        )
+
+    def delete(self, key: str) -> bool:
+        if not self.exists(key):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def delete_prefix(self, prefix: str) -> None:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix.rstrip("/") + "/"):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+    def size(self, key: str) -> Optional[int]:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["ContentLength"]
+
+    def presigned_put_url(self, key: str, content_type: str, expires_in: int) -> str:
+        return self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires_in,
+        )
+
+    def presigned_get_url(self, key: str, expires_in: int) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires_in,
+        )
+
+
+class FileStorageService:
+    def __init__(self, base_dir: Optional[str] = None, backend: Optional[StorageBackend] = None):
+        if backend is None:
+            if base_dir is None:
+                raise ValueError("Either base_dir or backend is required")
+            backend = LocalStorageBackend(base_dir)
+        self.backend = backend
 
-        # Create directory for listing if it doesn't exist
-        listing_dir = self.base_dir / str(listing_id)
-        os.makedirs(listing_dir, exist_ok=True)
+    @property
+    def supports_direct_upload(self) -> bool:
+        return not isinstance(self.backend, LocalStorageBackend)
+
+    @staticmethod
+    def new_file_key(filename: str, listing_id: uuid.UUID) -> str:
+        """Build a unique storage key for a new file of a listing"""
+        # Validate file type
+        get_file_format(filename)
 
         # Extract just the extension for the filename
-        extension = file.filename.split(".")[-1].lower()
+        extension = filename.split(".")[-1].lower()
 
         # Create unique filename
-        unique_filename = f"{uuid.uuid4()}.{extension}"
-        file_path = listing_dir / unique_filename
+        return f"{listing_directory(listing_id)}/{uuid.uuid4()}.{extension}"
 
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    @staticmethod
+    def is_issued_file_key(key: str, listing_id: uuid.UUID) -> bool:
+        """
+        Check that a client-supplied key has the form new_file_key gives the
+        listing's files, ``ab/cd/<listing_id>/<uuid>.<ext>``. Legacy flat keys
+        predate direct uploads and are never accepted.
+        """
+        path = Path(key)
+        if str(path.parent) != listing_directory(listing_id):
+            return False
+        try:
+            return str(uuid.UUID(path.stem)) == path.stem
+        except ValueError:
+            return False
+
+    async def save_file(self, file: UploadFile, listing_id: uuid.UUID) -> str:
+        """Save an uploaded file to the storage system and return the file path"""
+        key = self.new_file_key(file.filename, listing_id)
+
+        # Save file off the event loop so concurrent uploads don't block each other
+        await run_in_threadpool(self.backend.save, file.file, key)
 
         # Return relative path from base_dir
-        return str(Path(str(listing_id)) / unique_filename)
+        return key
+
+    async def save_files(self, files: List[UploadFile], listing_id: uuid.UUID) -> List[str]:
+        """
+        Save several uploaded files concurrently.
+
+        If any write fails, the files that were already written are removed
+        before the error is re-raised.
+
+        Returns:
+            The relative paths, in the same order as ``files``
+        """
+        results = await asyncio.gather(
+            *(self.save_file(file, listing_id) for file in files),
+            return_exceptions=True
+        )
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await self.delete_files([result for result in results if isinstance(result, str)])
+            raise errors[0]
+
+        return list(results)
+
+    async def adopt_file(self, local_path: Path, filename: str, listing_id: uuid.UUID) -> str:
+        """Move an already complete local file into storage and return its relative path"""
+        key = self.new_file_key(filename, listing_id)
+        await run_in_threadpool(self.backend.adopt, local_path, key)
+        return key
+
+    def create_upload_url(self, filename: str, listing_id: uuid.UUID) -> Tuple[str, str]:
+        """
+        Reserve a key for a new file and return it together with a presigned
+        PUT URL the client uploads the bytes to.
+        """
+        key = self.new_file_key(filename, listing_id)
+        url = self.backend.presigned_put_url(
+            key, get_file_format(filename), settings.PRESIGNED_URL_EXPIRE_SECONDS
+        )
+        return key, url
+
+    def get_download_url(self, relative_path: str) -> str:
+        """Get a URL the client can download a stored file from"""
+        return self.backend.presigned_get_url(relative_path, settings.PRESIGNED_URL_EXPIRE_SECONDS)
+
+    async def get_file_size(self, relative_path: str) -> Optional[int]:
+        """Size of a stored file, or None if nothing was uploaded under that path"""
+        return await run_in_threadpool(self.backend.size, relative_path)
 
     def get_file_path(self, relative_path: str) -> Path:
         """Get the full path for a stored file"""
-        return self.base_dir / relative_path
+        file_path = self.backend.local_path(relative_path)
+        if file_path is None:
+            raise RuntimeError("Files are not stored on the local filesystem")
+        return file_path
 
     async def delete_file(self, relative_path: str) -> bool:
         """Delete a file from storage"""
-        file_path = self.get_file_path(relative_path)
-        if file_path.exists():
-            os.remove(file_path)
-            return True
-        return False
+        return await run_in_threadpool(self.backend.delete, relative_path)
+
+    async def delete_files(self, relative_paths: List[str]) -> None:
+        """Best-effort removal of several stored files, e.g. after a failed commit"""
+        for relative_path in relative_paths:
+            try:
+                await self.delete_file(relative_path)
+            except Exception as e:
+                logger.error(f"Error deleting file {relative_path}: {e}")
 
     async def delete_listing_directory(self, listing_id: uuid.UUID) -> bool:
         """
@@ -91,17 +413,32 @@ class FileStorageService:
             True if successful, False otherwise
         """
         try:
-            listing_dir = self.base_dir / str(listing_id)
-
-            # Check if directory exists
-            if not listing_dir.exists():
-                logger.info(f"Directory for listing {listing_id} doesn't exist, nothing to delete")
-                return True  # Nothing to delete
-
-            # Use shutil.rmtree to delete directory and all contents
-            shutil.rmtree(listing_dir)
+            # Files may still be in the legacy flat layout until migrated
+            await run_in_threadpool(self.backend.delete_prefix, listing_directory(listing_id))
+            await run_in_threadpool(self.backend.delete_prefix, str(listing_id))
             logger.info(f"Successfully deleted directory for listing {listing_id}")
             return True
         except Exception as e:
             logger.error(f"Error deleting listing directory for {listing_id}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+@lru_cache
+def get_storage_backend() -> StorageBackend:
+    """Build (once per process) the storage backend selected by settings.STORAGE_BACKEND"""
+    if settings.STORAGE_BACKEND == "s3":
+        if not settings.S3_BUCKET:
+            raise RuntimeError("S3_BUCKET must be set when STORAGE_BACKEND is 's3'")
+        return S3StorageBackend(
+            settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        )
+    return LocalStorageBackend(settings.UPLOADS_DIR)
+
+
+# Dependency for FileStorageService
+def get_file_storage_service() -> FileStorageService:
+    return FileStorageService(backend=get_storage_backend())
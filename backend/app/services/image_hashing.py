@@ -0,0 +1,169 @@
+import io
+import logging
+from typing import BinaryIO, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+# Population count of every byte value, for numpy versions without bitwise_count
+_BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def dhash(data: bytes, hash_size: int = 8) -> int:
+    """
+    Difference hash of an image: shrink to (hash_size + 1) x hash_size
+    grayscale and record whether each pixel is brighter than its right
+    neighbour. Re-encoded, resized or lightly edited copies of a photo end
+    up within a few bits of each other.
+
+    Returns the hash as a signed 64-bit integer so it fits a BIGINT column.
+    """
+    from PIL import Image as PILImage
+
+    with PILImage.open(io.BytesIO(data)) as image:
+        return dhash_image(image, hash_size)
+
+
+def dhash_image(image, hash_size: int = 8) -> int:
+    """dhash of an already opened PIL image"""
+    from PIL import Image as PILImage
+
+    pixels = np.asarray(
+        image.convert("L").resize((hash_size + 1, hash_size), PILImage.Resampling.LANCZOS),
+        dtype=np.int16,
+    )
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return to_signed64(value)
+
+
+def hash_upload(fileobj: BinaryIO) -> Optional[int]:
+    """Hash an uploaded image, leaving the file positioned at the start"""
+    try:
+        fileobj.seek(0)
+        return dhash(fileobj.read())
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash: {e}")
+        return None
+    finally:
+        fileobj.seek(0)
+
+
+def to_signed64(value: int) -> int:
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def as_unsigned(hashes) -> np.ndarray:
+    """View stored (signed) hashes as uint64 for bit operations"""
+    return np.asarray(hashes, dtype=np.int64).view(np.uint64)
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """Number of set bits in each uint64"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    as_bytes = values.view(np.uint8).reshape(values.shape + (8,))
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distances(hashes: np.ndarray, query: int) -> np.ndarray:
+    """Hamming distance from query to every hash in a uint64 array"""
+    return popcount(hashes ^ np.uint64(query & ((1 << 64) - 1)))
+
+
+def _chunk_masks(max_distance: int) -> List[tuple[int, int]]:
+    """Split 64 bits into max_distance + 1 contiguous (shift, mask) chunks"""
+    chunks = max_distance + 1
+    widths = [HASH_BITS // chunks + (1 if i < HASH_BITS % chunks else 0) for i in range(chunks)]
+    masks = []
+    shift = 0
+    for width in widths:
+        masks.append((shift, (1 << width) - 1))
+        shift += width
+    return masks
+
+
+def find_near_duplicate_pairs(hashes: np.ndarray, max_distance: int, block_size: int = 2048) -> np.ndarray:
+    """
+    All index pairs (i, j), i < j, of uint64 hashes within max_distance bits.
+
+    Uses multi-index hashing: the 64 bits are cut into max_distance + 1
+    chunks, and by the pigeonhole principle two hashes within max_distance
+    bits agree exactly on at least one chunk. Only hashes sharing a chunk
+    value are compared, with vectorized popcounts.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    found: List[np.ndarray] = []
+
+    for shift, mask in _chunk_masks(max_distance):
+        keys = (hashes >> np.uint64(shift)) & np.uint64(mask)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(order)]))
+        shared = ends - starts > 1
+
+        for start, end in zip(starts[shared], ends[shared]):
+            members = np.sort(order[start:end])
+            member_hashes = hashes[members]
+            # Compare in row blocks so huge buckets don't build a huge matrix
+            for row_start in range(0, len(members), block_size):
+                rows = slice(row_start, row_start + block_size)
+                distances = popcount(member_hashes[rows, None] ^ member_hashes[None, :])
+                left, right = np.nonzero(distances <= max_distance)
+                left += row_start
+                keep = left < right
+                if keep.any():
+                    found.append(np.stack((members[left[keep]], members[right[keep]]), axis=1))
+
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    # The same pair can share several chunks
+    return np.unique(np.concatenate(found), axis=0)
+
+
+def cross_owner_clusters(hashes, owner_ids, max_distance: int) -> List[List[int]]:
+    """Near-duplicate clusters containing images of at least two different owners"""
+    return [
+        members for members in cluster_near_duplicates(hashes, max_distance)
+        if len({owner_ids[index] for index in members}) > 1
+    ]
+
+
+def cluster_near_duplicates(hashes, max_distance: int) -> List[List[int]]:
+    """
+    Group indices of hashes into clusters of near-duplicates (connected
+    components of the "within max_distance" graph). Singletons are omitted.
+    """
+    unsigned = as_unsigned(hashes)
+    # Identical hashes are trivially duplicates, only compare distinct values
+    unique_hashes, inverse = np.unique(unsigned, return_inverse=True)
+    pairs = find_near_duplicate_pairs(unique_hashes, max_distance)
+
+    parent = np.arange(len(unique_hashes))
+
+    def find(node: int) -> int:
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for left, right in pairs:
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[max(root_left, root_right)] = min(root_left, root_right)
+
+    roots = np.array([find(node) for node in range(len(unique_hashes))], dtype=np.int64)
+    labels = roots[inverse.ravel()]
+    # Group indices by root without a Python loop over every hash
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    boundaries = np.flatnonzero(np.diff(sorted_labels)) + 1
+    return [group.tolist() for group in np.split(order, boundaries) if len(group) > 1]
+
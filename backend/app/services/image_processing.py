@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+import io
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import engine
+from app.crud.images import set_image_derivatives
+from app.services.file_service import StorageBackend, get_storage_backend
+from app.services.image_hashing import dhash_image
+from app.services.process_pool import lazy_process_pool
+
+logger = logging.getLogger(__name__)
+
+# Blurhash components along x and y. 4x3 gives a 28 character string,
+# enough for a recognisable colour layout behind a landscape listing photo.
+PLACEHOLDER_COMPONENTS = (4, 3)
+# Images are shrunk to this before encoding, the placeholder has no detail anyway
+PLACEHOLDER_SAMPLE_SIZE = 32
+
+# Pillow format names of the types we re-encode, GIFs may be animated and are left alone
+_REENCODED_FORMATS = {"JPEG", "PNG", "WEBP"}
+# Metadata blocks dropped on re-encode. ICC profiles stay, they affect how colours render.
+_STRIPPED_INFO_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop")
+
+@dataclass
+class ProcessingResult:
+    # False if the image could not be read or was deleted meanwhile
+    stored: bool
+    bytes_saved: int = 0
+
+
+# Process pool for decoding and re-encoding images
+get_executor = lazy_process_pool("IMAGE_PROCESSING_WORKERS")
+
+
+_BASE83_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _encode_base83(value: int, length: int) -> str:
+    return "".join(
+        _BASE83_CHARS[(value // 83 ** (length - position)) % 83]
+        for position in range(1, length + 1)
+    )
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(pixels: np.ndarray, x_components: int = 4, y_components: int = 3) -> str:
+    """
+    Encode an RGB pixel array of shape (height, width, 3) as a blurhash
+    (https://blurha.sh), a short string clients decode into a blurred preview.
+    """
+    height, width, _ = pixels.shape
+    linear = _srgb_to_linear(pixels[..., :3].astype(np.float64))
+
+    # Cosine basis of every component along each axis, shape (components, size)
+    basis_x = np.cos(np.pi * np.arange(x_components)[:, None] * np.arange(width)[None, :] / width)
+    basis_y = np.cos(np.pi * np.arange(y_components)[:, None] * np.arange(height)[None, :] / height)
+    # factors[j, i] is the mean colour weighted by basis_y[j] x basis_x[i]
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+
+    dc = factors[0, 0]
+    ac = factors.reshape(-1, 3)[1:]
+
+    result = _encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max = 0
+        maximum = 1.0
+    result += _encode_base83(quantised_max, 1)
+    result += _encode_base83(
+        (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4
+    )
+
+    scaled = ac / maximum
+    quantised = np.clip(np.floor(np.sign(scaled) * np.sqrt(np.abs(scaled)) * 9 + 9.5), 0, 18).astype(int)
+    for red, green, blue in quantised:
+        result += _encode_base83(red * 19 * 19 + green * 19 + blue, 2)
+    return result
+
+
+def compute_derivatives(data: bytes, with_phash: bool = False) -> dict:
+    """
+    Decode an image once and compute the values stored alongside it: the
+    blurhash placeholder and, when asked, the perceptual hash.
+    """
+    from PIL import Image as PILImage, ImageOps
+
+    derivatives = {}
+    with PILImage.open(io.BytesIO(data)) as image:
+        if with_phash:
+            derivatives["phash"] = dhash_image(image)
+        # Let the JPEG decoder skip most of the full resolution work
+        image.draft("RGB", (PLACEHOLDER_SAMPLE_SIZE * 2, PLACEHOLDER_SAMPLE_SIZE * 2))
+        preview = ImageOps.exif_transpose(image).convert("RGB")
+        preview.thumbnail((PLACEHOLDER_SAMPLE_SIZE, PLACEHOLDER_SAMPLE_SIZE))
+        derivatives["placeholder"] = blurhash(np.asarray(preview), *PLACEHOLDER_COMPONENTS)
+    return derivatives
+
+
+def reencode_image(
+        data: bytes,
+        max_edge: int = 2560,
+        jpeg_quality: int = 85
+) -> Optional[bytes]:
+    """
+    Strip metadata (EXIF, GPS, XMP), apply the EXIF orientation to the
+    pixels and shrink the image so its longest edge is at most max_edge.
+
+    The format is kept, since the stored path and file_type name it.
+    Returns None when the image is already clean and small enough.
+    """
+    from PIL import Image as PILImage, ImageOps
+
+    with PILImage.open(io.BytesIO(data)) as image:
+        image_format = image.format
+        if image_format not in _REENCODED_FORMATS:
+            return None
+
+        has_metadata = any(key in image.info for key in _STRIPPED_INFO_KEYS) or bool(image.getexif())
+        too_large = max(image.size) > max_edge
+        if not has_metadata and not too_large:
+            return None
+
+        icc_profile = image.info.get("icc_profile")
+        if too_large:
+            # The JPEG decoder can scale by 1/2, 1/4 or 1/8 while decoding,
+            # which is far cheaper than decoding 12 MP and resizing after
+            scale = max_edge / max(image.size)
+            image.draft(image.mode, (int(image.width * scale) + 1, int(image.height * scale) + 1))
+
+        result = ImageOps.exif_transpose(image)
+        result.thumbnail((max_edge, max_edge), PILImage.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        options = {"icc_profile": icc_profile} if icc_profile else {}
+        if image_format == "JPEG":
+            if result.mode not in ("RGB", "L", "CMYK"):
+                result = result.convert("RGB")
+            result.save(output, "JPEG", quality=jpeg_quality, optimize=True, progressive=True, **options)
+        elif image_format == "WEBP":
+            result.save(output, "WEBP", quality=jpeg_quality, **options)
+        else:
+            result.save(output, "PNG", optimize=True, **options)
+
+    return output.getvalue()
+
+
+def process_image_data(
+        data: bytes,
+        with_phash: bool,
+        max_edge: int,
+        jpeg_quality: int
+) -> tuple[Optional[bytes], dict]:
+    """
+    Re-encode an image and compute its derivatives from the final bytes.
+
+    Runs inside the worker pool, so it only takes and returns picklable values.
+    """
+    reencoded = reencode_image(data, max_edge, jpeg_quality)
+    if reencoded is not None:
+        # The stored pixels changed (e.g. rotated), the hash has to follow them
+        data = reencoded
+        with_phash = True
+    return reencoded, compute_derivatives(data, with_phash)
+
+
+def _read_file(backend: StorageBackend, relative_path: str) -> bytes:
+    with backend.open(relative_path) as f:
+        return f.read()
+
+
+def _replace_file(backend: StorageBackend, relative_path: str, data: bytes) -> bool:
+    # Don't recreate the file of an image deleted while we were working on it
+    if not backend.exists(relative_path):
+        return False
+    backend.replace(io.BytesIO(data), relative_path)
+    return True
+
+
+def _store_derivatives(image_id: uuid.UUID, derivatives: dict) -> bool:
+    with Session(engine) as session:
+        stored = set_image_derivatives(session, image_id, derivatives)
+        session.commit()
+    return stored
+
+
+async def process_stored_image(
+        image_id: uuid.UUID,
+        file_path: str,
+        backend: Optional[StorageBackend] = None,
+        with_phash: bool = False
+) -> ProcessingResult:
+    """
+    Clean up an image already in storage and compute its derivatives.
+
+    The file is re-encoded in the worker pool without metadata, upright and
+    within IMAGE_MAX_EDGE, then atomically replaced, and Image.file_size is
+    updated to match. Meant to run as a background task after the upload
+    response was sent. ``with_phash`` is for images that never passed
+    through the API, such as direct uploads, whose perceptual hash could not
+    be computed on the way in.
+    """
+    backend = backend or get_storage_backend()
+    try:
+        data = await run_in_threadpool(_read_file, backend, file_path)
+        loop = asyncio.get_running_loop()
+        reencoded, derivatives = await loop.run_in_executor(
+            get_executor(),
+            process_image_data,
+            data,
+            with_phash,
+            settings.IMAGE_MAX_EDGE,
+            settings.IMAGE_JPEG_QUALITY,
+        )
+
+        derivatives["processed_at"] = datetime.datetime.utcnow()
+        bytes_saved = 0
+        if reencoded is not None:
+            if not await run_in_threadpool(_replace_file, backend, file_path, reencoded):
+                return ProcessingResult(stored=False)
+            derivatives["file_size"] = len(reencoded)
+            bytes_saved = len(data) - len(reencoded)
+            logger.info(f"Re-encoded image {image_id}: {len(data)} -> {len(reencoded)} bytes")
+
+        stored = await run_in_threadpool(_store_derivatives, image_id, derivatives)
+        return ProcessingResult(stored=stored, bytes_saved=bytes_saved)
+    except Exception as e:
+        logger.warning(f"Failed to process image {image_id}: {e}")
+        return ProcessingResult(stored=False)
@@ -0,0 +1,101 @@
+import asyncio
+import io
+import logging
+import uuid
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.db import engine
+from app.models.lease_agreements import LeaseAgreement, LeaseAgreementText, LeaseFileType
+from app.services.file_service import StorageBackend, get_storage_backend
+from app.services.process_pool import lazy_process_pool
+
+logger = logging.getLogger(__name__)
+
+# Language configuration used for both indexing and querying
+SEARCH_CONFIG = "english"
+# Postgres rejects tsvectors over 1MB, and a lease longer than this is not a lease
+MAX_INDEXED_CHARS = 500_000
+
+# Process pool for text extraction
+get_executor = lazy_process_pool("LEASE_TEXT_WORKERS")
+
+
+def extract_text(data: bytes, file_type: str) -> str:
+    """
+    Extract plain text from a lease file.
+
+    Runs inside the worker pool, so it only takes and returns picklable values.
+    """
+    if file_type == LeaseFileType.PDF.value:
+        from pypdf import PdfReader
+
+        reader = PdfReader(io.BytesIO(data))
+        pages = []
+        for page in reader.pages:
+            try:
+                pages.append(page.extract_text() or "")
+            except Exception as e:
+                # A single malformed page shouldn't lose the rest of the document
+                logger.warning(f"Failed to extract text from PDF page: {e}")
+        text = "\n".join(pages)
+    else:
+        text = data.decode("utf-8", errors="replace")
+
+    # Postgres text columns can't hold NUL characters
+    return text.replace("\x00", "")[:MAX_INDEXED_CHARS]
+
+
+def _read_file(backend: StorageBackend, relative_path: str) -> bytes:
+    with backend.open(relative_path) as f:
+        return f.read()
+
+
+def store_text(session: Session, lease_agreement_id: uuid.UUID, text: str) -> None:
+    """Insert or replace the extracted text and its search vector"""
+    search_vector = func.to_tsvector(SEARCH_CONFIG, text)
+    statement = insert(LeaseAgreementText).values(
+        lease_agreement_id=lease_agreement_id,
+        content=text,
+        search_vector=search_vector,
+    ).on_conflict_do_update(
+        index_elements=[LeaseAgreementText.lease_agreement_id],
+        set_={"content": text, "search_vector": search_vector, "extracted_at": func.now()},
+    )
+    session.execute(statement)
+    session.commit()
+
+
+def _store_text(lease_agreement_id: uuid.UUID, text: str) -> bool:
+    with Session(engine) as session:
+        # The agreement may have been deleted while we were extracting
+        if session.get(LeaseAgreement, lease_agreement_id) is None:
+            return False
+        store_text(session, lease_agreement_id, text)
+    return True
+
+
+async def index_lease_agreement(
+        lease_agreement_id: uuid.UUID,
+        file_path: str,
+        file_type: str,
+        backend: Optional[StorageBackend] = None
+) -> None:
+    """
+    Extract the text of a stored lease file in the worker pool and index it.
+
+    Meant to run as a background task after the upload response was sent.
+    """
+    backend = backend or get_storage_backend()
+    try:
+        data = await run_in_threadpool(_read_file, backend, file_path)
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(get_executor(), extract_text, data, file_type)
+        if await run_in_threadpool(_store_text, lease_agreement_id, text):
+            logger.info(f"Indexed {len(text)} characters for lease agreement {lease_agreement_id}")
+    except Exception as e:
+        logger.exception(f"Failed to index lease agreement {lease_agreement_id}: {e}")
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Optional, Tuple
+from uuid import UUID
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.messages import ConversationParticipant
+
+ParticipantFetcher = Callable[[Session, UUID], Tuple[UUID, ...]]
+
+
+def fetch_participants(session: Session, conversation_id: UUID) -> Tuple[UUID, ...]:
+    return tuple(session.exec(
+        select(ConversationParticipant.user_id).where(
+            ConversationParticipant.conversation_id == conversation_id
+        )
+    ))
+
+
+class ParticipantCache:
+    """
+    Bounded LRU of the participant ids of conversations.
+
+    A websocket message event used to load the same participant list for
+    authorisation, for create_message and for the broadcast. Participants
+    only change when a conversation is created, which calls invalidate().
+    Conversations without participants (unknown ids) are never cached, so
+    a lookup that races the creation can't pin an empty set.
+    """
+
+    def __init__(self, max_size: int, fetch: ParticipantFetcher = fetch_participants):
+        self.max_size = max_size
+        self._fetch = fetch
+        self._entries: "OrderedDict[UUID, Tuple[UUID, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session: Session, conversation_id: UUID) -> Tuple[UUID, ...]:
+        with self._lock:
+            participants = self._entries.get(conversation_id)
+            if participants is not None:
+                self._entries.move_to_end(conversation_id)
+                self.hits += 1
+                return participants
+            self.misses += 1
+
+        participants = self._fetch(session, conversation_id)
+        if participants:
+            with self._lock:
+                self._entries[conversation_id] = participants
+                self._entries.move_to_end(conversation_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return participants
+
+    def invalidate(self, conversation_id: UUID) -> None:
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache: Optional[ParticipantCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_participant_cache() -> ParticipantCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParticipantCache(settings.PARTICIPANT_CACHE_SIZE)
+    return _cache
@@ -0,0 +1,25 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+
+def lazy_process_pool(workers_setting: str) -> Callable[[], ProcessPoolExecutor]:
+    """
+    Return a getter for a process pool sized by the named setting.
+
+    The pool is created on first use, so importing a module that owns one
+    doesn't fork workers.
+    """
+    pool: Optional[ProcessPoolExecutor] = None
+    lock = threading.Lock()
+
+    def get_pool() -> ProcessPoolExecutor:
+        nonlocal pool
+        with lock:
+            if pool is None:
+                pool = ProcessPoolExecutor(max_workers=getattr(settings, workers_setting))
+        return pool
+
+    return get_pool
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.db import engine
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str], Awaitable[None]]
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more, larger messages
+# are sent in chunks below this size
+NOTIFY_PAYLOAD_LIMIT = 7900
+# Chunked messages still incomplete after this long are given up on
+CHUNK_TIMEOUT_SECONDS = 30.0
+
+
+class PubSub(ABC):
+    """
+    Broadcast bus between the workers serving websockets. Every message
+    published by any worker is handed to the handler of every worker,
+    including the publisher's own.
+    """
+
+    @abstractmethod
+    async def start(self, handler: Handler) -> None:
+        """Subscribe, calling handler with each message from now on"""
+
+    @abstractmethod
+    async def publish(self, message: str) -> None:
+        """Send a message to all subscribed workers"""
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """Unsubscribe and release connections"""
+
+
+class InMemoryHub:
+    """What a group of InMemoryPubSub instances publishes through, standing in for the database"""
+
+    def __init__(self):
+        self.subscribers: List["InMemoryPubSub"] = []
+
+
+class InMemoryPubSub(PubSub):
+    """Bus between managers in the same process, for tests and single worker setups"""
+
+    def __init__(self, hub: Optional[InMemoryHub] = None):
+        self.hub = hub or InMemoryHub()
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        self.hub.subscribers.append(self)
+
+    async def publish(self, message: str) -> None:
+        for subscriber in list(self.hub.subscribers):
+            await subscriber._handler(message)
+
+    async def stop(self) -> None:
+        if self in self.hub.subscribers:
+            self.hub.subscribers.remove(self)
+
+
+def split_payload(message: str, limit: int = NOTIFY_PAYLOAD_LIMIT) -> List[str]:
+    """
+    Split a message into NOTIFY payloads of at most ``limit`` bytes.
+
+    Each payload starts with "<message id>:<index>:<count>:" so the
+    receiver can put the parts back together, even when other publishers'
+    notifications arrive in between.
+    """
+    message_id = uuid.uuid4().hex
+    data = message.encode()
+    # Header is at most 32 hex digits plus two 5 digit numbers and separators
+    room = limit - 48
+    if room <= 0:
+        raise ValueError("Payload limit too small")
+
+    chunks = []
+    start = 0
+    while start < len(data) or not chunks:
+        end = min(start + room, len(data))
+        # Don't cut a multi-byte character in half
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        chunks.append(data[start:end].decode())
+        start = end
+    return [f"{message_id}:{index}:{len(chunks)}:{chunk}" for index, chunk in enumerate(chunks)]
+
+
+class Reassembler:
+    """Collects the payloads produced by split_payload back into messages"""
+
+    def __init__(self, timeout: float = CHUNK_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        # message id -> (first seen, parts by index)
+        self._pending: Dict[str, Tuple[float, Dict[int, str]]] = {}
+
+    def add(self, payload: str) -> Optional[str]:
+        """The whole message once its last part arrived, else None"""
+        message_id, index, count, chunk = payload.split(":", 3)
+        index, count = int(index), int(count)
+        if count == 1:
+            return chunk
+
+        now = time.monotonic()
+        self._expire(now)
+        _, parts = self._pending.setdefault(message_id, (now, {}))
+        parts[index] = chunk
+        if len(parts) < count:
+            return None
+        del self._pending[message_id]
+        return "".join(parts[i] for i in range(count))
+
+    def _expire(self, now: float) -> None:
+        for message_id in [m for m, (seen, _) in self._pending.items() if now - seen > self.timeout]:
+            logger.warning(f"Dropping incomplete chunked message {message_id}")
+            del self._pending[message_id]
+
+
+class PostgresPubSub(PubSub):
+    """
+    Bus over Postgres LISTEN/NOTIFY on ``channel``. Listens on a dedicated
+    connection and publishes on another, both in autocommit mode so every
+    NOTIFY is delivered immediately. The listener reconnects on failure;
+    messages published while it was down are lost, which clients recover
+    from by refetching when they reconnect.
+    """
+
+    def __init__(self, conninfo: str, channel: str = "ws_events", retry_seconds: float = 2.0,
+                 start_timeout: float = 10.0):
+        self.conninfo = conninfo
+        self.channel = channel
+        self.retry_seconds = retry_seconds
+        self.start_timeout = start_timeout
+        self._handler: Optional[Handler] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._listening = asyncio.Event()
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        self._listener = asyncio.create_task(self._listen())
+        # Don't report ready before LISTEN ran, or early messages are missed.
+        # If the database is down, start anyway and keep retrying.
+        try:
+            await asyncio.wait_for(self._listening.wait(), self.start_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Pub/sub listener not connected yet, events from other workers are delayed")
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        reassembler = Reassembler()
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN "{self.channel}"')
+                    self._listening.set()
+                    async for notify in conn.notifies():
+                        message = reassembler.add(notify.payload)
+                        if message is None:
+                            continue
+                        try:
+                            await self._handler(message)
+                        except Exception:
+                            logger.exception("Error handling pub/sub message")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Pub/sub listener disconnected: {e}")
+            await asyncio.sleep(self.retry_seconds)
+
+    async def publish(self, message: str) -> None:
+        import psycopg
+
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.closed:
+                        self._publish_conn = await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True)
+                    for payload in split_payload(message):
+                        await self._publish_conn.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                    return
+                except asyncio.CancelledError:
+                    # Timed out mid-statement, the connection's state is unknown
+                    conn, self._publish_conn = self._publish_conn, None
+                    if conn is not None:
+                        await conn.close()
+                    raise
+                except psycopg.OperationalError:
+                    # Stale connection, reconnect once
+                    self._publish_conn = None
+                    if attempt:
+                        raise
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._publish_conn is not None:
+            await self._publish_conn.close()
+            self._publish_conn = None
+
+
+def get_pubsub() -> Optional[PubSub]:
+    """The bus configured by WS_PUBSUB_BACKEND, None to keep broadcasts within this worker"""
+    if settings.WS_PUBSUB_BACKEND == "postgres":
+        return PostgresPubSub(engine.url.set(drivername="postgresql").render_as_string(hide_password=False))
+    if settings.WS_PUBSUB_BACKEND == "memory":
+        return InMemoryPubSub()
+    return None
@@ -0,0 +1,222 @@
+import base64
+import binascii
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_DIR = ".partial"
+SUPPORTED_CHECKSUM_ALGORITHMS = ("sha1", "sha256", "md5")
+
+
+class UploadNotFoundError(Exception):
+    pass
+
+
+class UploadBusyError(Exception):
+    pass
+
+
+class OffsetMismatchError(Exception):
+    def __init__(self, expected: int):
+        super().__init__(f"Upload offset should be {expected}")
+        self.expected = expected
+
+
+class ChecksumMismatchError(Exception):
+    pass
+
+
+@dataclass
+class UploadState:
+    id: str
+    listing_id: str
+    user_id: str
+    filename: str
+    size: int
+    offset: int
+    description: Optional[str]
+    created_at: float
+
+    @property
+    def is_complete(self) -> bool:
+        return self.offset == self.size
+
+
+def verify_checksum(data: bytes, header: str) -> None:
+    """
+    Check a chunk against a tus-style ``Upload-Checksum`` header,
+    e.g. ``sha256 <base64 digest>``.
+    """
+    try:
+        algorithm, encoded = header.strip().split(" ", 1)
+        expected = base64.b64decode(encoded, validate=True)
+    except (ValueError, binascii.Error):
+        raise ChecksumMismatchError("Malformed Upload-Checksum header")
+    if algorithm.lower() not in SUPPORTED_CHECKSUM_ALGORITHMS:
+        raise ChecksumMismatchError(f"Unsupported checksum algorithm: {algorithm}")
+    if hashlib.new(algorithm.lower(), data).digest() != expected:
+        raise ChecksumMismatchError("Chunk checksum does not match")
+
+
+class ResumableUploadStore:
+    """
+    Partial uploads kept on disk until they are complete.
+
+    Each upload is a ``<id>.part`` file holding the bytes received so far and
+    a ``<id>.json`` file with its metadata, both under ``<base_dir>/.partial``.
+    Keeping them inside the uploads directory means finalizing is a rename
+    into place rather than a copy.
+    """
+
+    def __init__(self, base_dir: str):
+        self.dir = Path(base_dir) / PARTIAL_DIR
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _part_path(self, upload_id: str) -> Path:
+        return self.dir / f"{upload_id}.part"
+
+    def _state_path(self, upload_id: str) -> Path:
+        return self.dir / f"{upload_id}.json"
+
+    def create(
+            self,
+            *,
+            listing_id: uuid.UUID,
+            user_id: uuid.UUID,
+            filename: str,
+            size: int,
+            description: Optional[str] = None
+    ) -> UploadState:
+        state = UploadState(
+            id=uuid.uuid4().hex,
+            listing_id=str(listing_id),
+            user_id=str(user_id),
+            filename=filename,
+            size=size,
+            offset=0,
+            description=description,
+            created_at=time.time(),
+        )
+        self._part_path(state.id).touch()
+        self._write_state(state)
+        return state
+
+    def get(self, upload_id: str) -> UploadState:
+        # Upload ids are generated hex strings, anything else can't be ours
+        if not upload_id.isalnum():
+            raise UploadNotFoundError(upload_id)
+        try:
+            with open(self._state_path(upload_id)) as f:
+                state = UploadState(**json.load(f))
+        except FileNotFoundError:
+            raise UploadNotFoundError(upload_id)
+        # The part file is the source of truth for how much was received
+        try:
+            state.offset = self._part_path(upload_id).stat().st_size
+        except FileNotFoundError:
+            # Moved into storage by a completion that hasn't discarded the state yet
+            raise UploadNotFoundError(upload_id)
+        return state
+
+    def append(self, upload_id: str, offset: int, data: bytes, checksum: Optional[str] = None) -> UploadState:
+        """
+        Append a chunk at offset, which must equal the bytes received so far.
+
+        The chunk is verified before anything is written, so a corrupted or
+        retried chunk never leaves the upload in a bad state.
+        """
+        if checksum is not None:
+            verify_checksum(data, checksum)
+
+        state = self.get(upload_id)
+        with open(self._part_path(upload_id), "ab") as f:
+            # Serialize concurrent PATCHes for the same upload
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                current = os.fstat(f.fileno()).st_size
+                if offset != current:
+                    raise OffsetMismatchError(current)
+                if current + len(data) > state.size:
+                    raise ValueError("Chunk exceeds the declared upload size")
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                state.offset = current + len(data)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return state
+
+    @contextmanager
+    def completing(self, upload_id: str) -> Iterator[Path]:
+        """
+        Lock a fully received upload and yield the path of its file, to be
+        moved into storage and discarded before the block ends.
+
+        A concurrent completion of the same upload gets UploadBusyError
+        rather than racing for the file, and one arriving after the file was
+        moved gets UploadNotFoundError.
+        """
+        state = self.get(upload_id)
+        part_path = self._part_path(upload_id)
+        try:
+            f = open(part_path, "rb")
+        except FileNotFoundError:
+            raise UploadNotFoundError(upload_id)
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusyError(upload_id)
+            try:
+                # The file may have been moved away between the open and the lock
+                try:
+                    current = os.stat(part_path)
+                except FileNotFoundError:
+                    raise UploadNotFoundError(upload_id)
+                if current.st_ino != os.fstat(f.fileno()).st_ino:
+                    raise UploadNotFoundError(upload_id)
+                if current.st_size != state.size:
+                    raise OffsetMismatchError(current.st_size)
+                yield part_path
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def discard(self, upload_id: str) -> None:
+        for path in (self._part_path(upload_id), self._state_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def purge_expired(self, max_age: float) -> int:
+        """Discard uploads created more than max_age seconds ago, returning how many"""
+        now = time.time()
+        purged = 0
+        for state_path in self.dir.glob("*.json"):
+            upload_id = state_path.stem
+            try:
+                state = self.get(upload_id)
+            except (UploadNotFoundError, FileNotFoundError, ValueError):
+                continue
+            if now - state.created_at > max_age:
+                self.discard(upload_id)
+                purged += 1
+        if purged:
+            logger.info(f"Discarded {purged} expired partial uploads")
+        return purged
+
+    def _write_state(self, state: UploadState) -> None:
+        tmp_path = self._state_path(state.id).with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(state), f)
+        os.replace(tmp_path, self._state_path(state.id))
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import shutil
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Set
+
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.models.images import Image
+from app.models.lease_agreements import LeaseAgreement
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_DIR = ".quarantine"
+CHECKPOINT_FILE = ".reconcile-checkpoint.json"
+QUARANTINE_STAMP_FORMAT = "%Y%m%dT%H%M%S"
+
+
+@dataclass
+class ReconcileReport:
+    scanned_files: int = 0
+    skipped_recent_files: int = 0
+    quarantined_files: int = 0
+    quarantined_bytes: int = 0
+    deleted_files: int = 0
+    reclaimed_bytes: int = 0
+    pass_completed: bool = False
+
+
+def database_lookup(engine: Engine) -> Callable[[List[str]], Set[str]]:
+    """
+    Build a lookup returning which of a batch of relative paths are still
+    referenced by an Image or LeaseAgreement row.
+    """
+    def lookup(paths: List[str]) -> Set[str]:
+        with Session(engine) as session:
+            referenced = set(session.exec(
+                select(Image.file_path).where(Image.file_path.in_(paths))
+            ))
+            referenced.update(session.exec(
+                select(LeaseAgreement.file_path).where(LeaseAgreement.file_path.in_(paths))
+            ))
+        return referenced
+
+    return lookup
+
+
+class UploadReconciler:
+    """
+    Finds files under the uploads directory that no database row points to.
+
+    The directory tree is walked in sorted order and the last processed path
+    is saved to a checkpoint file, so a large tree can be reconciled in
+    several bounded runs. Files are checked against the database one batch
+    at a time. Orphans are first moved to a quarantine directory and only
+    deleted once they have been there for ``quarantine_retention`` seconds,
+    which leaves room to restore anything removed by mistake.
+    """
+
+    def __init__(
+            self,
+            base_dir: str,
+            lookup_referenced: Callable[[List[str]], Set[str]],
+            *,
+            batch_size: int = 500,
+            grace_period: float = 60 * 60,
+            quarantine_retention: float = 60 * 60 * 24 * 7,
+            dry_run: bool = False
+    ):
+        self.base_dir = Path(base_dir)
+        self.lookup_referenced = lookup_referenced
+        self.batch_size = batch_size
+        # Files younger than this may belong to an upload whose DB commit is still in flight
+        self.grace_period = grace_period
+        self.quarantine_retention = quarantine_retention
+        self.dry_run = dry_run
+        self.quarantine_dir = self.base_dir / QUARANTINE_DIR
+        self.checkpoint_path = self.base_dir / CHECKPOINT_FILE
+
+    def run(self, max_files: Optional[int] = None) -> ReconcileReport:
+        """
+        Reconcile up to max_files files, continuing from the last checkpoint,
+        then purge expired quarantine entries.
+        """
+        report = ReconcileReport()
+        run_started = time.time()
+        stamp = datetime.now(timezone.utc).strftime(QUARANTINE_STAMP_FORMAT)
+        cursor = self._load_checkpoint()
+
+        batch: List[tuple[str, int]] = []
+        last_path = cursor
+        report.pass_completed = True
+
+        for relative_path, stat in self._walk(cursor):
+            if max_files is not None and report.scanned_files >= max_files:
+                report.pass_completed = False
+                break
+
+            report.scanned_files += 1
+            last_path = relative_path
+            if run_started - stat.st_mtime < self.grace_period:
+                report.skipped_recent_files += 1
+                continue
+
+            batch.append((relative_path, stat.st_size))
+            if len(batch) >= self.batch_size:
+                self._reconcile_batch(batch, stamp, report)
+                self._save_checkpoint(last_path)
+                batch = []
+
+        if batch:
+            self._reconcile_batch(batch, stamp, report)
+
+        # Start from the beginning again once the whole tree has been seen
+        self._save_checkpoint(None if report.pass_completed else last_path)
+        self._purge_quarantine(run_started, report)
+
+        logger.info(f"Upload reconciliation finished: {asdict(report)}")
+        return report
+
+    def _walk(self, after: Optional[str]) -> Iterator[tuple[str, os.stat_result]]:
+        """Yield (relative path, stat) of every stored file in walk order, skipping paths up to after"""
+        # Compare path components rather than strings so the cursor matches the walk order
+        after_parts = tuple(after.split("/")) if after else None
+
+        def walk_dir(directory: Path, parts: tuple[str, ...]) -> Iterator[tuple[str, os.stat_result]]:
+            try:
+                entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                # Dot entries hold reconciler and upload bookkeeping, never stored files
+                if entry.name.startswith("."):
+                    continue
+                entry_parts = parts + (entry.name,)
+                if entry.is_dir(follow_symlinks=False):
+                    # Skip whole subtrees that sort entirely before the cursor
+                    if after_parts is not None and entry_parts < after_parts[:len(entry_parts)]:
+                        continue
+                    yield from walk_dir(Path(entry.path), entry_parts)
+                elif entry.is_file(follow_symlinks=False):
+                    if after_parts is not None and entry_parts <= after_parts:
+                        continue
+                    yield "/".join(entry_parts), entry.stat(follow_symlinks=False)
+
+        yield from walk_dir(self.base_dir, ())
+
+    def _reconcile_batch(self, batch: List[tuple[str, int]], stamp: str, report: ReconcileReport) -> None:
+        referenced = self.lookup_referenced([path for path, _ in batch])
+        for relative_path, size in batch:
+            if relative_path in referenced:
+                continue
+            report.quarantined_files += 1
+            report.quarantined_bytes += size
+            if self.dry_run:
+                logger.info(f"Would quarantine orphaned upload {relative_path}")
+                continue
+            self._quarantine(relative_path, stamp)
+
+    def _quarantine(self, relative_path: str, stamp: str) -> None:
+        source = self.base_dir / relative_path
+        target = self.quarantine_dir / stamp / relative_path
+        try:
+            os.makedirs(target.parent, exist_ok=True)
+            os.replace(source, target)
+        except FileNotFoundError:
+            # Deleted concurrently, nothing left to do
+            return
+        logger.info(f"Quarantined orphaned upload {relative_path}")
+
+        # Drop directories left empty, e.g. the upload directory of a deleted listing
+        parent = source.parent
+        while parent != self.base_dir:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+    def _purge_quarantine(self, now: float, report: ReconcileReport) -> None:
+        if not self.quarantine_dir.exists():
+            return
+        for entry in sorted(os.scandir(self.quarantine_dir), key=lambda entry: entry.name):
+            try:
+                quarantined_at = datetime.strptime(entry.name, QUARANTINE_STAMP_FORMAT).replace(
+                    tzinfo=timezone.utc
+                ).timestamp()
+            except ValueError:
+                continue
+            if now - quarantined_at < self.quarantine_retention:
+                continue
+
+            for root, _, filenames in os.walk(entry.path):
+                for filename in filenames:
+                    report.deleted_files += 1
+                    report.reclaimed_bytes += os.path.getsize(os.path.join(root, filename))
+            if self.dry_run:
+                continue
+            shutil.rmtree(entry.path)
+            logger.info(f"Deleted quarantined uploads from {entry.name}")
+
+    def _load_checkpoint(self) -> Optional[str]:
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f).get("last_path")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_checkpoint(self, last_path: Optional[str]) -> None:
+        if self.dry_run:
+            return
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"last_path": last_path, "updated_at": time.time()}, f)
+        os.replace(tmp_path, self.checkpoint_path)
@@ -0,0 +1,233 @@
+import uuid
+from collections.abc import Generator
+
+import pytest
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.api.deps import get_db
+from app.core.config import settings
+from app.core.db import engine
+from app.crud.users import get_user_by_email
+from app.main import app
+from app.models.images import Image, ImageFileType
+from app.models.listings import Listing
+from app.services.file_service import FileStorageService, get_file_storage_service
+
+
+class RecordingFileService:
+    """Pretends to store files, remembering what was saved and deleted"""
+
+    backend = None
+
+    def __init__(self) -> None:
+        self.saved: list[str] = []
+        self.deleted: list[str] = []
+
+    async def save_files(self, files: list[UploadFile], listing_id: uuid.UUID) -> list[str]:
+        paths = [f"{listing_id}/{uuid.uuid4()}.jpg" for _ in files]
+        self.saved.extend(paths)
+        return paths
+
+    async def delete_files(self, relative_paths: list[str]) -> None:
+        self.deleted.extend(relative_paths)
+
+
+class DirectUploadFileService(FileStorageService):
+    """Pretends every key was uploaded directly to a bucket"""
+
+    supports_direct_upload = True
+
+    def __init__(self) -> None:
+        pass
+
+    async def get_file_size(self, relative_path: str) -> int:
+        return 1
+
+
+class CommitFailed(Exception):
+    pass
+
+
+class FailingCommitSession(Session):
+    def commit(self) -> None:
+        raise CommitFailed()
+
+
+def _get_failing_commit_db() -> Generator[Session, None, None]:
+    with FailingCommitSession(engine) as session:
+        yield session
+
+
+def _create_superuser_listing(db: Session, image_count: int) -> tuple[Listing, list[Image]]:
+    owner = get_user_by_email(session=db, email=settings.FIRST_SUPERUSER)
+    assert owner
+    listing = Listing(owner_id=owner.id)
+    db.add(listing)
+    db.flush()
+    images = [
+        Image(
+            filename=f"{index}.jpg",
+            file_path=f"{listing.id}/{uuid.uuid4()}.jpg",
+            file_type=ImageFileType.JPEG,
+            file_size=1,
+            is_primary=index == 0,
+            display_order=index,
+            listing_id=listing.id,
+        )
+        for index in range(image_count)
+    ]
+    db.add_all(images)
+    db.commit()
+    return listing, images
+
+
+def test_reorder_listing_images(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    listing, images = _create_superuser_listing(db, 3)
+    new_order = [str(images[2].id), str(images[0].id), str(images[1].id)]
+
+    response = client.put(
+        f"{settings.API_V1_STR}/listings/{listing.id}/images/order",
+        headers=superuser_token_headers,
+        json={"image_ids": new_order, "primary_image_id": str(images[1].id)},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert [image["id"] for image in content] == new_order
+    assert [image["display_order"] for image in content] == [0, 1, 2]
+    assert [image["id"] for image in content if image["is_primary"]] == [str(images[1].id)]
+
+
+def test_reorder_listing_images_requires_every_image(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    listing, images = _create_superuser_listing(db, 3)
+
+    response = client.put(
+        f"{settings.API_V1_STR}/listings/{listing.id}/images/order",
+        headers=superuser_token_headers,
+        json={"image_ids": [str(images[1].id), str(images[0].id)]},
+    )
+    assert response.status_code == 400
+
+    db.expire_all()
+    orders = db.exec(
+        select(Image.display_order).where(Image.listing_id == listing.id).order_by(Image.filename)
+    ).all()
+    assert orders == [0, 1, 2]
+
+
+def test_reorder_listing_images_of_another_user(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    listing, images = _create_superuser_listing(db, 1)
+
+    response = client.put(
+        f"{settings.API_V1_STR}/listings/{listing.id}/images/order",
+        headers=normal_user_token_headers,
+        json={"image_ids": [str(images[0].id)]},
+    )
+    assert response.status_code == 404
+
+
+def test_batch_upload_rejects_long_filenames(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    listing, _ = _create_superuser_listing(db, 0)
+    file_service = RecordingFileService()
+    app.dependency_overrides[get_file_storage_service] = lambda: file_service
+    files = [
+        ("files", ("a.jpg", b"not an image", "image/jpeg")),
+        ("files", ("b" * 300 + ".jpg", b"not an image", "image/jpeg")),
+    ]
+    try:
+        response = client.post(
+            f"{settings.API_V1_STR}/listings/{listing.id}/images/batch",
+            headers=superuser_token_headers,
+            files=files,
+        )
+    finally:
+        app.dependency_overrides.pop(get_file_storage_service)
+
+    assert response.status_code == 400
+    assert file_service.saved == []
+
+
+def test_batch_upload_removes_files_when_the_commit_fails(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    listing, images = _create_superuser_listing(db, 1)
+    file_service = RecordingFileService()
+    app.dependency_overrides[get_file_storage_service] = lambda: file_service
+    app.dependency_overrides[get_db] = _get_failing_commit_db
+    files = [
+        ("files", ("a.jpg", b"not an image", "image/jpeg")),
+        ("files", ("b.jpg", b"not an image", "image/jpeg")),
+    ]
+    try:
+        with pytest.raises(CommitFailed):
+            client.post(
+                f"{settings.API_V1_STR}/listings/{listing.id}/images/batch",
+                headers=superuser_token_headers,
+                files=files,
+                data={"primary_index": "0"},
+            )
+    finally:
+        app.dependency_overrides.pop(get_file_storage_service)
+        app.dependency_overrides.pop(get_db)
+
+    assert len(file_service.saved) == 2
+    assert file_service.deleted == file_service.saved
+
+    db.expire_all()
+    remaining = db.exec(select(Image).where(Image.listing_id == listing.id)).all()
+    assert [(image.id, image.is_primary) for image in remaining] == [(images[0].id, True)]
+
+
+def test_listing_responses_leave_out_image_hashes(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    listing, images = _create_superuser_listing(db, 1)
+    images[0].phash = 1234
+    db.add(images[0])
+    db.commit()
+
+    response = client.get(
+        f"{settings.API_V1_STR}/listings/{listing.id}",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    (image,) = response.json()["images"]
+    assert image["id"] == str(images[0].id)
+    assert "phash" not in image
+    assert "processed_at" not in image
+
+
+def test_register_uploaded_image_rejects_files_in_use(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    listing, images = _create_superuser_listing(db, 1)
+    images[0].file_path = FileStorageService.new_file_key("photo.jpg", listing.id)
+    db.add(images[0])
+    db.commit()
+    app.dependency_overrides[get_file_storage_service] = DirectUploadFileService
+    url = f"{settings.API_V1_STR}/listings/{listing.id}/images/uploaded"
+    try:
+        registered = client.post(
+            url,
+            headers=superuser_token_headers,
+            json={"filename": "photo.jpg", "file_path": images[0].file_path},
+        )
+        legacy = client.post(
+            url,
+            headers=superuser_token_headers,
+            json={"filename": "photo.jpg", "file_path": f"{listing.id}/{uuid.uuid4()}.jpg"},
+        )
+    finally:
+        app.dependency_overrides.pop(get_file_storage_service)
+
+    assert registered.status_code == 409
+    assert legacy.status_code == 400
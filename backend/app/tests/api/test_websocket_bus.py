@@ -0,0 +1,65 @@
+import asyncio
+import json
+import multiprocessing
+import uuid
+
+from app.api.websockets import ConnectionManager
+from app.core.db import engine
+from app.services.pubsub import PostgresPubSub
+from app.tests.utils.websockets import FakeWebSocket, drain
+
+CONNINFO = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def _receiving_worker(channel: str, user_id: str, ready, received) -> None:
+    """A worker with one connection of user_id, reporting what it receives"""
+    async def run():
+        manager = ConnectionManager()
+        await manager.start_bus(PostgresPubSub(CONNINFO, channel))
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, uuid.UUID(user_id))
+        ready.set()
+        while not websocket.sent:
+            await asyncio.sleep(0.05)
+        received.put(json.dumps(websocket.sent))
+        await manager.stop_bus()
+
+    asyncio.run(run())
+
+
+def _sending_worker(channel: str, user_id: str, content: str) -> None:
+    async def run():
+        manager = ConnectionManager()
+        await manager.start_bus(PostgresPubSub(CONNINFO, channel))
+        await manager.broadcast_conversation_message(
+            {"content": content}, uuid.uuid4(), [uuid.UUID(user_id)], sender_id=uuid.uuid4()
+        )
+        await drain()
+        await manager.stop_bus()
+
+    asyncio.run(run())
+
+
+def test_broadcast_reaches_other_process() -> None:
+    context = multiprocessing.get_context("spawn")
+    channel = f"ws_test_{uuid.uuid4().hex}"
+    user_id = str(uuid.uuid4())
+    # Large enough to need several NOTIFY payloads
+    content = "ü" * 20_000
+    ready, received = context.Event(), context.Queue()
+
+    receiver = context.Process(target=_receiving_worker, args=(channel, user_id, ready, received))
+    receiver.start()
+    try:
+        assert ready.wait(timeout=30)
+        sender = context.Process(target=_sending_worker, args=(channel, user_id, content))
+        sender.start()
+        sender.join(timeout=30)
+        assert sender.exitcode == 0
+
+        events = json.loads(received.get(timeout=30))
+        assert [event["data"]["content"] for event in events] == [content]
+    finally:
+        receiver.join(timeout=10)
+        if receiver.is_alive():
+            receiver.terminate()
@@ -0,0 +1,134 @@
+import asyncio
+import uuid
+
+from app.api.websockets import SLOW_CONSUMER_CLOSE_CODE, ConnectionManager
+from app.tests.utils.websockets import FakeWebSocket, drain
+
+
+def test_every_device_of_a_user_receives_messages() -> None:
+    async def scenario():
+        manager = ConnectionManager()
+        me, alice = uuid.uuid4(), uuid.uuid4()
+        conversation = uuid.uuid4()
+        phone, laptop, alice_phone = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        phone_id = await manager.connect(phone, me)
+        laptop_id = await manager.connect(laptop, me)
+        await manager.connect(alice_phone, alice)
+        assert phone_id != laptop_id
+
+        # The sending device doesn't get its own message back, the others do
+        await manager.broadcast_conversation_message(
+            {"content": "hi"}, conversation, [me, alice], sender_id=me, origin_connection_id=phone_id
+        )
+        await drain()
+        assert phone.sent == []
+        assert [event["type"] for event in laptop.sent] == ["message"]
+        assert [event["type"] for event in alice_phone.sent] == ["message"]
+
+        await manager.broadcast_typing_notification(me, conversation, [me, alice])
+        await drain()
+        assert len(laptop.sent) == 1
+        assert len(alice_phone.sent) == 2
+
+        # Conversations are open per device
+        manager.add_open_conversation(laptop_id, conversation)
+        assert manager.has_open_conversation(me, conversation)
+        manager.disconnect(me, laptop_id)
+        assert not manager.has_open_conversation(me, conversation)
+        assert manager.is_online(me)
+
+        await manager.send_personal_message({"type": "user_blocked"}, me)
+        await drain()
+        assert [event["type"] for event in phone.sent] == ["user_blocked"]
+        assert len(laptop.sent) == 1
+
+        manager.disconnect(me, phone_id)
+        assert not manager.is_online(me)
+        assert manager.open_conversations.keys() == {next(iter(manager.active_connections[alice]))}
+
+    asyncio.run(scenario())
+
+
+def _slow_consumer_scenario(policy: str):
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, slow_consumer_policy=policy)
+        fast_user, slow_user = uuid.uuid4(), uuid.uuid4()
+        fast, slow = FakeWebSocket(), FakeWebSocket(stalled=True)
+        await manager.connect(fast, fast_user)
+        await manager.connect(slow, slow_user)
+
+        for i in range(5):
+            await manager.send_personal_message({"type": "event", "n": i}, fast_user)
+            await manager.send_personal_message({"type": "event", "n": i}, slow_user)
+            await drain()
+
+        # The stalled client doesn't hold up anyone else
+        assert [event["n"] for event in fast.sent] == list(range(5))
+        return manager, slow
+
+    return asyncio.run(scenario())
+
+
+def test_slow_consumer_events_are_dropped() -> None:
+    manager, slow = _slow_consumer_scenario("drop")
+    stats = manager.stats()
+    # One event is stuck in send_text, two wait in the queue
+    assert stats["dropped_events"] == 2
+    assert stats["slow_disconnects"] == 0
+    assert slow.closed_with is None
+    assert stats["fanout_latency_ms"]["samples"] == 5
+    assert stats["fanout_latency_ms"]["p99"] >= stats["fanout_latency_ms"]["p50"] >= 0
+
+
+def test_slow_consumer_is_disconnected() -> None:
+    manager, slow = _slow_consumer_scenario("disconnect")
+    assert manager.stats()["slow_disconnects"] == 1
+    assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    # The close task is released once it ran
+    assert manager._closing_tasks == set()
+
+
+class OverlapCheckingWebSocket(FakeWebSocket):
+    """Fails when a write starts before the previous one finished"""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+        self.writing = False
+
+    async def send_text(self, text: str):
+        assert not self.writing, "overlapping writes"
+        self.writing = True
+        await asyncio.sleep(self.delay)
+        self.writing = False
+        await super().send_text(text)
+
+
+def test_writes_are_serialised_per_connection() -> None:
+    async def scenario():
+        manager = ConnectionManager()
+        slow_user, fast_user = uuid.uuid4(), uuid.uuid4()
+        slow, fast = OverlapCheckingWebSocket(delay=0.05), OverlapCheckingWebSocket(delay=0)
+        slow_id = await manager.connect(slow, slow_user)
+        fast_id = await manager.connect(fast, fast_user)
+
+        # Replies race the writer task draining broadcast events
+        await manager.send_personal_message({"type": "event"}, slow_user)
+        await asyncio.sleep(0)
+        replies = asyncio.gather(*(manager.send_to_connection(slow_id, {"type": "reply"}) for _ in range(3)))
+
+        # Meanwhile another connection's reply doesn't wait on the slow one
+        started = asyncio.get_running_loop().time()
+        await manager.send_to_connection(fast_id, {"type": "reply"})
+        assert asyncio.get_running_loop().time() - started < 0.05
+
+        await replies
+        assert [event["type"] for event in slow.sent] == ["event", "reply", "reply", "reply"]
+
+        manager.disconnect(slow_user, slow_id)
+        assert slow_id not in manager.connections
+        # Replies to a connection that is gone are skipped
+        await manager.send_to_connection(slow_id, {"type": "reply"})
+        assert len(slow.sent) == 4
+
+    asyncio.run(scenario())
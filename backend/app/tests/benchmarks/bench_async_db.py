@@ -0,0 +1,89 @@
+"""
+Throughput of the listings browse and unread badge queries through the
+sync engine on a thread pool, the way FastAPI runs sync routes, versus
+through the async engine on the event loop. Needs the database from the
+environment's settings, with the first superuser created.
+
+    python -m app.tests.benchmarks.bench_async_db --concurrency 200 --requests 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import anyio
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.crud import messages as message_crud
+from app.models.listings import Listing, with_images
+from app.models.users import User
+
+
+def browse_statement():
+    return with_images(select(Listing).limit(20)).options(selectinload(Listing.lease_agreement))
+
+
+def sync_request(user_id) -> None:
+    with Session(engine) as session:
+        session.exec(select(func.count()).select_from(Listing)).one()
+        session.exec(browse_statement()).all()
+        message_crud.get_unread_count(session=session, user_id=user_id)
+
+
+async def async_request(user_id) -> None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        (await session.exec(select(func.count()).select_from(Listing))).one()
+        (await session.exec(browse_statement())).all()
+        await session.run_sync(message_crud.get_unread_count, user_id=user_id)
+
+
+async def run(mode: str, user_id, concurrency: int, requests: int) -> List[float]:
+    latencies: List[float] = []
+    remaining = requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            if mode == "sync":
+                # FastAPI's default limit of 40 threads for sync routes
+                await anyio.to_thread.run_sync(sync_request, user_id)
+            else:
+                await async_request(user_id)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    if mode == "async":
+        # Its connections belong to this event loop
+        await async_engine.dispose()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        user_id = session.exec(select(User.id).where(User.email == settings.FIRST_SUPERUSER)).one()
+
+    for mode in ("sync", "async"):
+        started = time.perf_counter()
+        latencies = asyncio.run(run(mode, user_id, args.concurrency, args.requests))
+        elapsed = time.perf_counter() - started
+        cuts = statistics.quantiles(latencies, n=100)
+        print(
+            f"{mode:>5}: {len(latencies) / elapsed:,.0f} requests/s at concurrency {args.concurrency}, "
+            f"p50 {cuts[49] * 1000:.1f} ms, p99 {cuts[98] * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark near-duplicate search over perceptual hashes.
+
+    python -m app.tests.benchmarks.bench_image_hashing --count 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.image_hashing import cluster_near_duplicates, hamming_distances
+
+
+def make_hashes(count: int, duplicate_groups: int, max_distance: int, seed: int = 0) -> np.ndarray:
+    """Random 64-bit hashes plus groups of copies with a few flipped bits"""
+    rng = np.random.default_rng(seed)
+    hashes = rng.integers(0, 2**63, size=count, dtype=np.int64).view(np.uint64)
+    hashes ^= rng.integers(0, 2, size=count, dtype=np.uint64) << np.uint64(63)
+    for group in range(duplicate_groups):
+        original = hashes[group * 10]
+        for offset in range(1, 4):
+            flipped = original
+            for bit in rng.choice(64, size=rng.integers(0, max_distance + 1), replace=False):
+                flipped ^= np.uint64(1) << np.uint64(bit)
+            hashes[group * 10 + offset] = flipped
+    return hashes.view(np.int64)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--max-distance", type=int, default=4)
+    parser.add_argument("--duplicate-groups", type=int, default=1000)
+    args = parser.parse_args()
+
+    hashes = make_hashes(args.count, args.duplicate_groups, args.max_distance)
+
+    started = time.perf_counter()
+    hamming_distances(hashes.view(np.uint64), int(hashes[0]))
+    scan = time.perf_counter() - started
+    print(f"single query linear scan over {args.count:,} hashes: {scan * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    clusters = cluster_near_duplicates(hashes, args.max_distance)
+    elapsed = time.perf_counter() - started
+    print(
+        f"clustered {args.count:,} hashes (max distance {args.max_distance}) in {elapsed:.2f} s, "
+        f"{len(clusters)} clusters found, {args.duplicate_groups} planted"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Reply latency on fast websockets while a few slow ones are being written,
+with one lock shared by every socket (the old manager-wide lock) versus a
+write lock per connection.
+
+    python -m app.tests.benchmarks.bench_websocket_contention --connections 1000 --slow 20
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+import uuid
+from typing import List
+
+from app.api.websockets import ConnectionManager
+
+
+class TimedWebSocket:
+    def __init__(self, write_seconds: float):
+        self.write_seconds = write_seconds
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.write_seconds)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+async def run(mode: str, connections: int, slow: int, slow_ms: float, replies: int, think_ms: float) -> List[float]:
+    manager = ConnectionManager()
+    users = [uuid.uuid4() for _ in range(connections)]
+    connection_ids = [
+        await manager.connect(TimedWebSocket(slow_ms / 1000 if index < slow else 0), user)
+        for index, user in enumerate(users)
+    ]
+    if mode == "global":
+        shared = asyncio.Lock()
+        for connection in manager.connections.values():
+            connection._write_lock = shared
+
+    latencies: List[float] = []
+
+    async def client(index: int):
+        rng = random.Random(index)
+        for _ in range(replies):
+            await asyncio.sleep(rng.expovariate(1000 / think_ms))
+            started = time.perf_counter()
+            await manager.send_to_connection(connection_ids[index], {"type": "reply"})
+            if index >= slow:
+                latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client(index) for index in range(connections)))
+    for user, connection_id in zip(users, connection_ids):
+        manager.disconnect(user, connection_id)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=20)
+    parser.add_argument("--slow-ms", type=float, default=50.0)
+    parser.add_argument("--replies", type=int, default=5)
+    parser.add_argument("--think-ms", type=float, default=200.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    for mode in ("global", "per-connection"):
+        started = time.perf_counter()
+        latencies = asyncio.run(
+            run(mode, args.connections, args.slow, args.slow_ms, args.replies, args.think_ms)
+        )
+        elapsed = time.perf_counter() - started
+        cuts = statistics.quantiles(latencies, n=100)
+        print(
+            f"{mode:>14}: {len(latencies):,} replies to fast sockets in {elapsed:.1f} s, "
+            f"p50 {cuts[49] * 1000:.2f} ms, p99 {cuts[98] * 1000:.2f} ms, max {max(latencies) * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
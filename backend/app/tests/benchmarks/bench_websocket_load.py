@@ -0,0 +1,116 @@
+"""
+Load test of websocket message delivery with database work on the event
+loop versus on the database executor.
+
+500 chatters in pairs send messages at random intervals. Handling a
+message holds a database call for --query-ms (simulated with a sleep, so
+no database is needed), then broadcasts it to the other participant. The
+latency reported is from the frame arriving to the recipient's socket
+receiving the message.
+
+    python -m app.tests.benchmarks.bench_websocket_load --chatters 500 --query-ms 2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+import uuid
+from typing import List
+
+from app.api.websockets import ConnectionManager
+from app.services.db_executor import DBExecutor
+
+
+class NullSession:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class RecordingWebSocket:
+    def __init__(self, latencies: List[float]):
+        self.latencies = latencies
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        event = json.loads(text)
+        if event.get("type") == "message":
+            self.latencies.append(time.perf_counter() - event["data"]["sent_at"])
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+async def run(mode: str, chatters: int, messages: int, query_ms: float, think_ms: float, workers: int) -> List[float]:
+    manager = ConnectionManager()
+    executor = DBExecutor(workers, session_factory=NullSession)
+    latencies: List[float] = []
+    users = [uuid.uuid4() for _ in range(chatters)]
+    connections = [await manager.connect(RecordingWebSocket(latencies), user) for user in users]
+
+    def store_message(session):
+        time.sleep(query_ms / 1000)
+
+    async def chatter(index: int):
+        rng = random.Random(index)
+        partner = users[index ^ 1]
+        conversation_id = uuid.UUID(int=index // 2)
+        for _ in range(messages):
+            await asyncio.sleep(rng.expovariate(1000 / think_ms))
+            received_at = time.perf_counter()
+            if mode == "inline":
+                store_message(NullSession())
+            else:
+                await executor.run(store_message)
+            await manager.broadcast_conversation_message(
+                message_data={"sent_at": received_at},
+                conversation_id=conversation_id,
+                participant_ids=[users[index], partner],
+                sender_id=users[index],
+                origin_connection_id=connections[index],
+            )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chatter(index) for index in range(chatters)))
+    # Let the writers flush
+    while len(latencies) < chatters * messages and time.perf_counter() - started < 600:
+        await asyncio.sleep(0.01)
+    for user, connection_id in zip(users, connections):
+        manager.disconnect(user, connection_id)
+    executor.shutdown()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chatters", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--query-ms", type=float, default=2.0)
+    parser.add_argument("--think-ms", type=float, default=500.0)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    chatters = args.chatters - args.chatters % 2
+    for mode in ("inline", "executor"):
+        started = time.perf_counter()
+        latencies = asyncio.run(
+            run(mode, chatters, args.messages, args.query_ms, args.think_ms, args.workers)
+        )
+        elapsed = time.perf_counter() - started
+        cuts = statistics.quantiles(latencies, n=100)
+        print(
+            f"{mode:>8}: {len(latencies):,} messages from {chatters} chatters in {elapsed:.1f} s, "
+            f"p50 {cuts[49] * 1000:.1f} ms, p99 {cuts[98] * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
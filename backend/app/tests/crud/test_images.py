@@ -0,0 +1,99 @@
+import random
+import uuid
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.crud import images as image_crud
+from app.crud.users import create_user
+from app.models.images import Image, ImageFileType
+from app.models.listings import Listing
+from app.models.users import UserCreate
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+def _create_listing_with_images(db: Session, count: int) -> tuple[Listing, list[Image]]:
+    owner = create_user(session=db, user_create=UserCreate(
+        email=random_email(),
+        password=random_lower_string(),
+        phone_number=str(random.randint(10**9, 10**10 - 1)),
+    ))
+    listing = Listing(owner_id=owner.id)
+    db.add(listing)
+    db.flush()
+    images = [
+        Image(
+            filename=f"{index}.jpg",
+            file_path=f"{listing.id}/{uuid.uuid4()}.jpg",
+            file_type=ImageFileType.JPEG,
+            file_size=1,
+            is_primary=index == 0,
+            display_order=index,
+            listing_id=listing.id,
+        )
+        for index in range(count)
+    ]
+    db.add_all(images)
+    db.commit()
+    return listing, images
+
+
+def _order_and_primary(db: Session, listing: Listing) -> tuple[list[uuid.UUID], list[uuid.UUID]]:
+    db.expire_all()
+    images = db.exec(select(Image).where(Image.listing_id == listing.id).order_by(Image.display_order)).all()
+    return [image.id for image in images], [image.id for image in images if image.is_primary]
+
+
+def test_reorder_listing_images(db: Session) -> None:
+    listing, images = _create_listing_with_images(db, 4)
+    new_order = [images[2].id, images[0].id, images[3].id, images[1].id]
+
+    updated = image_crud.reorder_listing_images(db, listing_id=listing.id, image_ids=new_order)
+    db.commit()
+    assert updated == 4
+    assert _order_and_primary(db, listing) == (new_order, [images[0].id])
+
+    # Moving the primary flag in the same statement doesn't trip the
+    # one-primary constraint, whichever row the UPDATE reaches first
+    reversed_order = list(reversed(new_order))
+    image_crud.reorder_listing_images(
+        db, listing_id=listing.id, image_ids=reversed_order, primary_image_id=images[3].id
+    )
+    db.commit()
+    assert _order_and_primary(db, listing) == (reversed_order, [images[3].id])
+
+
+def test_reorder_ignores_images_of_other_listings(db: Session) -> None:
+    listing, images = _create_listing_with_images(db, 2)
+    other, other_images = _create_listing_with_images(db, 1)
+
+    updated = image_crud.reorder_listing_images(
+        db, listing_id=listing.id, image_ids=[other_images[0].id, images[1].id, images[0].id]
+    )
+    db.commit()
+    assert updated == 2
+    assert _order_and_primary(db, other) == ([other_images[0].id], [other_images[0].id])
+
+
+def test_set_primary_image(db: Session) -> None:
+    listing, images = _create_listing_with_images(db, 3)
+
+    image_crud.set_primary_image(db, listing.id, images[2].id)
+    db.commit()
+    assert _order_and_primary(db, listing)[1] == [images[2].id]
+
+    image_crud.clear_primary_image(db, listing.id)
+    db.commit()
+    assert _order_and_primary(db, listing)[1] == []
+
+
+def test_second_primary_image_is_rejected(db: Session) -> None:
+    listing, images = _create_listing_with_images(db, 2)
+
+    images[1].is_primary = True
+    db.add(images[1])
+    with pytest.raises(IntegrityError, match="image_one_primary_per_listing"):
+        db.commit()
+    db.rollback()
+    assert _order_and_primary(db, listing)[1] == [images[0].id]
@@ -0,0 +1,63 @@
+import random
+import uuid
+
+from sqlmodel import Session
+
+from app.crud import lease_agreements as lease_crud
+from app.crud.users import create_user
+from app.models.lease_agreements import LeaseAgreement, LeaseFileType
+from app.models.listings import Listing
+from app.models.users import User, UserCreate
+from app.services.lease_text import store_text
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+def _create_user(db: Session) -> User:
+    user_in = UserCreate(
+        email=random_email(),
+        password=random_lower_string(),
+        phone_number=str(random.randint(10**9, 10**10 - 1)),
+    )
+    return create_user(session=db, user_create=user_in)
+
+
+def _create_lease(db: Session, owner: User, text: str) -> LeaseAgreement:
+    listing = Listing(owner_id=owner.id, address=random_lower_string())
+    db.add(listing)
+    db.flush()
+    agreement = LeaseAgreement(
+        listing_id=listing.id,
+        filename="lease.txt",
+        file_path=f"{listing.id}/{uuid.uuid4()}.txt",
+        file_type=LeaseFileType.TXT,
+        file_size=len(text),
+    )
+    db.add(agreement)
+    db.commit()
+    store_text(db, agreement.id, text)
+    return agreement
+
+
+def test_search_covers_every_listing_but_only_shows_owned_snippets(db: Session) -> None:
+    word = random_lower_string()
+    owner, other = _create_user(db), _create_user(db)
+    mine = _create_lease(db, owner, f"Tenants may keep a {word} on the premises.")
+    theirs = _create_lease(db, other, f"No {word} allowed, the deposit is forfeit.")
+
+    results, count = lease_crud.search_lease_agreements(db, word, snippet_owner_id=owner.id)
+    assert count == 2
+    snippets = {result.lease_agreement_id: result.snippet for result in results}
+    assert snippets.keys() == {mine.id, theirs.id}
+    assert word in snippets[mine.id]
+    assert snippets[theirs.id] is None
+
+    # A renter owning no listings still finds both, without any lease text
+    renter = _create_user(db)
+    results, count = lease_crud.search_lease_agreements(db, word, snippet_owner_id=renter.id)
+    assert count == 2
+    assert [result.snippet for result in results] == [None, None]
+
+    # Without an owner, as for superusers, every result has a snippet
+    results, count = lease_crud.search_lease_agreements(db, word)
+    assert count == 2
+    assert all(word in result.snippet for result in results)
@@ -0,0 +1,334 @@
+import datetime
+import random
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlmodel import Session, update
+
+from app.core.db import engine
+from app.crud import messages as message_crud
+from app.crud.users import create_user
+from app.models.messages import (
+    Conversation,
+    ConversationCreate,
+    ConversationParticipant,
+    Message,
+    MessageCreate,
+    UserUnreadCount,
+)
+from app.models.users import User, UserCreate
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _create_user(db: Session) -> User:
+    user_in = UserCreate(
+        email=random_email(),
+        password=random_lower_string(),
+        phone_number=str(random.randint(10**9, 10**10 - 1)),
+    )
+    return create_user(session=db, user_create=user_in)
+
+
+def _create_conversation(
+        db: Session,
+        users: list[User],
+        created_at: datetime.datetime,
+        is_group: bool = False
+) -> Conversation:
+    conversation = Conversation(is_group=is_group, created_at=created_at)
+    db.add(conversation)
+    db.flush()
+    for user in users:
+        db.add(ConversationParticipant(conversation_id=conversation.id, user_id=user.id))
+    return conversation
+
+
+def _send(db: Session, conversation: Conversation, sender: User) -> Message:
+    return message_crud.create_message(
+        db,
+        sender_id=sender.id,
+        message_in=MessageCreate(conversation_id=conversation.id, content=random_lower_string())
+    )
+
+
+def test_get_user_conversations(db: Session) -> None:
+    me, alice, bob, carol = (_create_user(db) for _ in range(4))
+    long_ago = datetime.datetime(2024, 1, 1)
+
+    group = _create_conversation(db, [me, bob, carol], long_ago, is_group=True)
+    busy = _create_conversation(db, [me, alice], long_ago)
+    # No messages, sorted by its own creation time
+    quiet = _create_conversation(db, [me, carol], long_ago + datetime.timedelta(hours=1))
+    # Would sort first, but is a direct conversation with a user who blocked me
+    _create_conversation(db, [me, bob], datetime.datetime.utcnow() + datetime.timedelta(days=1))
+    db.commit()
+
+    # A group with a blocked user is still listed
+    bob_message = _send(db, group, bob)
+    _send(db, busy, me)
+    read = _send(db, busy, alice)
+    latest = _send(db, busy, alice)
+    message_crud.mark_message_as_read(db, read.id, me.id)
+    # Deleting the last message falls back to the one before it
+    deleted = _send(db, group, carol)
+    message_crud.delete_message(db, message_id=deleted.id, user_id=carol.id)
+    message_crud.block_user(db, bob.id, me.id)
+
+    with count_queries() as statements:
+        first_page, total = message_crud.get_user_conversations(db, me.id, skip=0, limit=2)
+    assert len(statements) == 1
+
+    assert total == 3
+    assert [conversation["id"] for conversation in first_page] == [busy.id, group.id]
+    assert first_page[0]["unread_count"] == 1
+    assert first_page[0]["last_message"] == latest.content
+    assert first_page[0]["last_message_time"] == latest.created_at
+    assert {p["user_id"] for p in first_page[0]["participants"]} == {me.id, alice.id}
+    # Deleted messages are neither the last message nor unread
+    assert first_page[1]["last_message_time"] == bob_message.created_at
+    assert first_page[1]["unread_count"] == 1
+    assert message_crud.get_unread_count(db, me.id) == 2
+
+    second_page, total = message_crud.get_user_conversations(db, me.id, skip=2, limit=2)
+    assert total == 3
+    assert [conversation["id"] for conversation in second_page] == [quiet.id]
+    assert second_page[0]["last_message"] is None
+    assert second_page[0]["unread_count"] == 0
+
+    past_end, total = message_crud.get_user_conversations(db, me.id, skip=10, limit=2)
+    assert past_end == []
+    assert total == 3
+
+    assert message_crud.mark_conversation_as_read(db, me.id, busy.id) == 1
+    assert message_crud.get_unread_count(db, me.id, busy.id) == 0
+
+
+def test_repair_conversation_summaries(db: Session) -> None:
+    me, alice = _create_user(db), _create_user(db)
+    conversation = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    db.commit()
+    _send(db, conversation, alice)
+    last = _send(db, conversation, alice)
+
+    # Nothing to fix while writes keep the summary current
+    assert message_crud.repair_conversation_summaries(db, [conversation.id]) == (0, 0)
+
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation.id)
+        .values(last_message_id=None, last_message_at=None, last_message_preview=None)
+    )
+    db.execute(
+        update(ConversationParticipant)
+        .where(ConversationParticipant.conversation_id == conversation.id)
+        .values(unread_count=7)
+    )
+    db.commit()
+
+    assert message_crud.repair_conversation_summaries(db, [conversation.id]) == (1, 2)
+    db.commit()
+
+    db.refresh(conversation)
+    assert conversation.last_message_id == last.id
+    assert conversation.last_message_at == last.created_at
+    assert message_crud.get_unread_count(db, me.id, conversation.id) == 2
+    assert message_crud.get_unread_count(db, alice.id, conversation.id) == 0
+
+
+def test_repair_user_unread_counts(db: Session) -> None:
+    me, alice, bob = (_create_user(db) for _ in range(3))
+    first = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    second = _create_conversation(db, [me, bob], datetime.datetime.utcnow())
+    db.commit()
+    _send(db, first, alice)
+    _send(db, second, bob)
+    _send(db, second, me)
+    users = [me.id, alice.id, bob.id]
+
+    assert message_crud.get_unread_count(db, me.id) == 2
+    assert message_crud.get_unread_count(db, bob.id) == 1
+    assert message_crud.repair_user_unread_counts(db, users) == 0
+
+    db.execute(update(UserUnreadCount).where(UserUnreadCount.user_id == me.id).values(unread_count=9))
+    db.execute(update(UserUnreadCount).where(UserUnreadCount.user_id == bob.id).values(unread_count=0))
+    db.commit()
+    assert message_crud.repair_user_unread_counts(db, users) == 2
+    db.commit()
+    assert message_crud.get_unread_count(db, me.id) == 2
+    assert message_crud.get_unread_count(db, bob.id) == 1
+    assert message_crud.get_unread_count(db, alice.id) == 0
+
+    # Reads and deletes keep the totals in step
+    message_crud.mark_conversation_as_read(db, me.id, first.id)
+    assert message_crud.get_unread_count(db, me.id) == 1
+    last = _send(db, second, bob)
+    message_crud.delete_message(db, message_id=last.id, user_id=bob.id)
+    assert message_crud.get_unread_count(db, me.id) == 1
+    assert message_crud.repair_user_unread_counts(db, users) == 0
+
+
+def test_read_watermarks(db: Session) -> None:
+    me, alice, bob = (_create_user(db) for _ in range(3))
+    group = _create_conversation(db, [me, alice, bob], datetime.datetime.utcnow(), is_group=True)
+    db.commit()
+    first = _send(db, group, alice)
+    second = _send(db, group, alice)
+    third = _send(db, group, alice)
+
+    # Reading a message reads everything before it
+    assert message_crud.mark_message_as_read(db, second.id, me.id)
+    assert message_crud.get_unread_count(db, me.id, group.id) == 1
+    assert [r.user_id for r in message_crud.get_message_read_receipts(db, first.id)] == [me.id]
+    assert [r.user_id for r in message_crud.get_message_read_receipts(db, second.id)] == [me.id]
+    assert message_crud.get_message_read_receipts(db, third.id) == []
+
+    # The watermark never moves back
+    assert message_crud.mark_message_as_read(db, first.id, me.id)
+    assert message_crud.get_unread_count(db, me.id, group.id) == 1
+    assert [r.user_id for r in message_crud.get_message_read_receipts(db, second.id)] == [me.id]
+
+    # Deleting an unread message only changes counts of those who hadn't read it
+    message_crud.mark_message_as_read(db, third.id, me.id)
+    message_crud.delete_message(db, message_id=third.id, user_id=alice.id)
+    assert message_crud.get_unread_count(db, me.id, group.id) == 0
+    assert message_crud.get_unread_count(db, bob.id, group.id) == 2
+
+    assert message_crud.mark_conversation_as_read(db, bob.id, group.id) == 2
+    assert message_crud.get_unread_count(db, bob.id, group.id) == 0
+    _, receipts = message_crud.get_message_with_read_status(db, first.id)
+    assert {r.user_id for r in receipts} == {me.id, bob.id}
+    assert all(r.read_at is not None for r in receipts)
+
+
+def test_get_conversation_messages_cursors(db: Session) -> None:
+    me, alice = _create_user(db), _create_user(db)
+    conversation = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    db.commit()
+    sent = [_send(db, conversation, alice if i % 2 else me) for i in range(7)]
+    newest_first = [message.id for message in reversed(sent)]
+
+    page, total = message_crud.get_conversation_messages(db, conversation.id, limit=3)
+    assert [message.id for message in page] == newest_first[:3]
+    assert total == 7
+
+    page, total = message_crud.get_conversation_messages(
+        db, conversation.id, limit=3, before=page[-1].id, with_count=False
+    )
+    assert [message.id for message in page] == newest_first[3:6]
+    assert total is None
+
+    # Catching up returns the messages right after the cursor, still newest first
+    page, _ = message_crud.get_conversation_messages(db, conversation.id, limit=2, after=sent[1].id)
+    assert [message.id for message in page] == [sent[3].id, sent[2].id]
+
+    page, _ = message_crud.get_conversation_messages(db, conversation.id, before=sent[5].id, after=sent[2].id)
+    assert [message.id for message in page] == [sent[4].id, sent[3].id]
+
+    # A cursor from another conversation matches nothing
+    other = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    db.commit()
+    page, total = message_crud.get_conversation_messages(db, other.id, before=sent[-1].id)
+    assert page == [] and total == 0
+
+
+def test_page_already_read(db: Session) -> None:
+    me, alice = _create_user(db), _create_user(db)
+    conversation = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    other = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    db.commit()
+    sent = [_send(db, conversation, alice) for _ in range(6)]
+    elsewhere = _send(db, other, alice)
+
+    newest, _ = message_crud.get_conversation_messages(db, conversation.id, limit=3)
+    older, _ = message_crud.get_conversation_messages(db, conversation.id, limit=3, before=newest[-1].id)
+
+    # Read up to the newest message, every page is read
+    assert message_crud.page_already_read(db, conversation.id, sent[-1].id, newest)
+    assert message_crud.page_already_read(db, conversation.id, sent[-1].id, older)
+    # Paging back through history doesn't mark anything either
+    assert message_crud.page_already_read(db, conversation.id, sent[3].id, older)
+    assert not message_crud.page_already_read(db, conversation.id, sent[3].id, newest)
+    assert message_crud.page_already_read(db, conversation.id, sent[3].id, [])
+    # Unknown markers, or ones from another conversation, don't count
+    assert not message_crud.page_already_read(db, conversation.id, elsewhere.id, older)
+    assert not message_crud.page_already_read(db, conversation.id, uuid.uuid4(), older)
+
+
+def test_get_read_receipts(db: Session) -> None:
+    me, alice, bob = (_create_user(db) for _ in range(3))
+    group = _create_conversation(db, [me, alice, bob], datetime.datetime.utcnow(), is_group=True)
+    direct = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    db.commit()
+    group_messages = [_send(db, group, alice) for _ in range(3)]
+    mine = _send(db, direct, me)
+    message_crud.mark_message_as_read(db, group_messages[1].id, me.id)
+    message_crud.mark_message_as_read(db, group_messages[0].id, bob.id)
+    message_crud.mark_conversation_as_read(db, alice.id, direct.id)
+
+    with count_queries() as statements:
+        receipts = message_crud.get_read_receipts(db, group_messages + [mine])
+    assert len(statements) == 1
+
+    assert {r.user_id for r in receipts[group_messages[0].id]} == {me.id, bob.id}
+    assert [r.user_id for r in receipts[group_messages[1].id]] == [me.id]
+    assert receipts[group_messages[2].id] == []
+    assert [r.user_id for r in receipts[mine.id]] == [alice.id]
+    assert message_crud.get_read_receipts(db, []) == {}
+
+
+def test_mark_conversation_as_read(db: Session) -> None:
+    me, alice, stranger = (_create_user(db) for _ in range(3))
+    conversation = _create_conversation(db, [me, alice], datetime.datetime.utcnow())
+    db.commit()
+    _send(db, conversation, alice)
+    last = _send(db, conversation, alice)
+
+    with count_queries() as statements:
+        assert message_crud.mark_conversation_as_read(db, me.id, conversation.id) == 2
+    assert len([s for s in statements if s.lstrip().upper().startswith("UPDATE")]) == 1
+    assert [r.user_id for r in message_crud.get_message_read_receipts(db, last.id)] == [me.id]
+
+    # Nothing new, nothing written
+    assert message_crud.mark_conversation_as_read(db, me.id, conversation.id) == 0
+    assert message_crud.mark_conversation_as_read(db, stranger.id, conversation.id) == 0
+
+    _send(db, conversation, alice)
+    assert message_crud.mark_conversation_as_read(db, me.id, conversation.id) == 1
+    assert message_crud.get_unread_count(db, me.id, conversation.id) == 0
+
+
+def test_blocks_checked_against_every_participant(db: Session) -> None:
+    me, alice, bob = (_create_user(db) for _ in range(3))
+    group = _create_conversation(db, [me, alice, bob], datetime.datetime.utcnow(), is_group=True)
+    db.commit()
+    _send(db, group, me)
+
+    message_crud.block_user(db, bob.id, me.id)
+    assert message_crud.is_user_blocked(db, me.id, bob.id)
+    with pytest.raises(HTTPException):
+        _send(db, group, me)
+    with pytest.raises(HTTPException):
+        message_crud.create_conversation(
+            db, creator_id=alice.id, conversation_in=ConversationCreate(participant_ids=[me.id, bob.id])
+        )
+
+    assert message_crud.unblock_user(db, bob.id, me.id)
+    assert not message_crud.is_user_blocked(db, bob.id, me.id)
+    _send(db, group, me)
@@ -0,0 +1,71 @@
+import random
+import uuid
+from pathlib import Path
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.crud.users import create_user
+from app.migrate_upload_layout import migrate
+from app.models.images import Image, ImageFileType
+from app.models.lease_agreements import LeaseAgreement, LeaseFileType
+from app.models.listings import Listing
+from app.models.users import UserCreate
+from app.services.file_service import LocalStorageBackend, listing_directory
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+def test_legacy_files_move_to_the_sharded_layout(db: Session, tmp_path: Path) -> None:
+    owner = create_user(session=db, user_create=UserCreate(
+        email=random_email(),
+        password=random_lower_string(),
+        phone_number=str(random.randint(10**9, 10**10 - 1)),
+    ))
+    listing = Listing(owner_id=owner.id)
+    db.add(listing)
+    db.flush()
+    image = Image(
+        filename="photo.jpg",
+        file_path=f"{listing.id}/{uuid.uuid4()}.jpg",
+        file_type=ImageFileType.JPEG,
+        file_size=5,
+        listing_id=listing.id,
+    )
+    agreement = LeaseAgreement(
+        filename="lease.pdf",
+        file_path=f"{listing.id}/{uuid.uuid4()}.pdf",
+        file_type=LeaseFileType.PDF,
+        file_size=8,
+        listing_id=listing.id,
+    )
+    db.add(image)
+    db.add(agreement)
+    db.commit()
+
+    backend = LocalStorageBackend(str(tmp_path))
+    old_paths = {image.id: image.file_path, agreement.id: agreement.file_path}
+    for path, data in ((image.file_path, b"image"), (agreement.file_path, b"%PDF-1.4")):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_bytes(data)
+
+    # Rows of other tests have no file under tmp_path and are only counted as missing
+    report = migrate(engine, backend, batch_size=10_000, max_batches=1)
+    assert report.migrated == 2
+    assert report.failed_batches == 0
+
+    db.refresh(image)
+    db.refresh(agreement)
+    for row, data in ((image, b"image"), (agreement, b"%PDF-1.4")):
+        old_path = old_paths[row.id]
+        assert row.file_path == f"{listing_directory(listing.id)}/{Path(old_path).name}"
+        assert (tmp_path / row.file_path).read_bytes() == data
+        assert not (tmp_path / old_path).exists()
+    assert not (tmp_path / str(listing.id)).exists()
+
+    new_paths = {image.id: image.file_path, agreement.id: agreement.file_path}
+    report = migrate(engine, backend, batch_size=10_000, max_batches=1)
+    assert report.migrated == 0
+    db.refresh(image)
+    db.refresh(agreement)
+    assert {image.id: image.file_path, agreement.id: agreement.file_path} == new_paths
+    assert all((tmp_path / path).exists() for path in new_paths.values())
@@ -0,0 +1,69 @@
+import uuid
+
+from app.services.block_graph import BlockGraph
+
+
+class FakeBlocks:
+    """Block rows the graph loads from, counting the queries it would run"""
+
+    def __init__(self, *pairs):
+        self.pairs = set(pairs)
+        self.queries = 0
+
+    def __call__(self, session, user_ids):
+        self.queries += 1
+        return [pair for pair in self.pairs if pair[0] in user_ids or pair[1] in user_ids]
+
+
+def test_group_check_loads_all_participants_at_once() -> None:
+    a, b, c, d = (uuid.uuid4() for _ in range(4))
+    blocks = FakeBlocks((a, b))
+    graph = BlockGraph(ttl=60, fetch=blocks)
+
+    assert graph.blocked_pairs_within(None, [a, b, c])
+    assert not graph.blocked_pairs_within(None, [a, c, d])
+    assert blocks.queries == 2
+    # Blocks count in both directions, answered from the cache
+    assert graph.any_blocked(None, b, [a, c])
+    assert graph.any_blocked(None, a, [b])
+    assert not graph.any_blocked(None, c, [a, b, c, d])
+    assert blocks.queries == 2
+
+
+def test_invalidate_reloads_changed_users() -> None:
+    a, b, c = (uuid.uuid4() for _ in range(3))
+    blocks = FakeBlocks()
+    graph = BlockGraph(ttl=60, fetch=blocks)
+    assert not graph.any_blocked(None, a, [b, c])
+
+    blocks.pairs.add((c, a))
+    assert not graph.any_blocked(None, a, [c])
+    graph.invalidate(c, a)
+    assert graph.any_blocked(None, a, [c])
+
+    blocks.pairs.clear()
+    graph.clear()
+    assert not graph.any_blocked(None, c, [a])
+
+
+def test_entries_expire() -> None:
+    a, b = uuid.uuid4(), uuid.uuid4()
+    blocks = FakeBlocks()
+    graph = BlockGraph(ttl=0, fetch=blocks)
+    graph.any_blocked(None, a, [b])
+    blocks.pairs.add((a, b))
+    assert graph.any_blocked(None, a, [b])
+
+
+def test_load_racing_an_invalidation_is_not_cached() -> None:
+    a, b = uuid.uuid4(), uuid.uuid4()
+    graph = None
+
+    def fetch(session, user_ids):
+        # The block lands while the stale rows are in flight
+        graph.invalidate(a, b)
+        return []
+
+    graph = BlockGraph(ttl=60, fetch=fetch)
+    assert not graph.any_blocked(None, a, [b])
+    assert graph._entries == {}
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+from app.services.db_executor import AsyncDBExecutor, DBExecutor
+
+
+class FakeSession:
+    def __init__(self, opened):
+        self.closed = False
+        opened.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+
+def test_work_runs_off_the_event_loop_in_its_own_session() -> None:
+    opened = []
+    executor = DBExecutor(max_workers=2, session_factory=lambda: FakeSession(opened))
+
+    def query(session, value, *, delay):
+        assert not session.closed
+        time.sleep(delay)
+        return value, threading.current_thread().name
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        (value, thread), _ = await asyncio.gather(
+            executor.run(query, "row", delay=0.1),
+            executor.run(query, "other", delay=0.1),
+        )
+        ticking.cancel()
+        return value, thread, ticks
+
+    value, thread, ticks = asyncio.run(scenario())
+    executor.shutdown()
+
+    assert value == "row"
+    assert thread.startswith("db")
+    # The loop kept running other coroutines while the queries slept
+    assert ticks >= 5
+    assert len(opened) == 2
+    assert all(session.closed for session in opened)
+
+
+def test_concurrency_is_bounded() -> None:
+    executor = DBExecutor(max_workers=3, session_factory=lambda: FakeSession([]))
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def query(session):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    async def scenario():
+        await asyncio.gather(*(executor.run(query) for _ in range(12)))
+
+    asyncio.run(scenario())
+    executor.shutdown()
+    assert peak == 3
+
+
+def test_errors_reach_the_caller_and_close_the_session() -> None:
+    opened = []
+    executor = DBExecutor(max_workers=1, session_factory=lambda: FakeSession(opened))
+
+    def failing(session):
+        raise LookupError("missing")
+
+    async def scenario():
+        try:
+            await executor.run(failing)
+        except LookupError as e:
+            return str(e)
+
+    assert asyncio.run(scenario()) == "missing"
+    executor.shutdown()
+    assert opened[0].closed
+
+
+class FakeAsyncSession:
+    """Runs the function run_sync is given with a stand-in for the sync session"""
+
+    def __init__(self, opened):
+        self.sync_session = object()
+        self.closed = False
+        opened.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.sync_session, *args, **kwargs)
+
+
+def test_async_executor_runs_each_call_in_its_own_session() -> None:
+    opened = []
+    executor = AsyncDBExecutor(session_factory=lambda: FakeAsyncSession(opened))
+
+    def query(session, value, *, other):
+        return session, value, other, threading.current_thread() is threading.main_thread()
+
+    async def scenario():
+        return await asyncio.gather(executor.run(query, 1, other=2), executor.run(query, 3, other=4))
+
+    first, second = asyncio.run(scenario())
+    assert first[1:] == (1, 2, True)
+    assert second[1:] == (3, 4, True)
+    assert first[0] is opened[0].sync_session
+    assert second[0] is opened[1].sync_session
+    assert all(session.closed for session in opened)
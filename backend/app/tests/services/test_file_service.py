@@ -0,0 +1,113 @@
+import io
+import uuid
+from pathlib import Path
+
+import pytest
+
+from app.services.file_service import (
+    FileStorageService,
+    LocalStorageBackend,
+    S3StorageBackend,
+    is_legacy_file_path,
+    listing_directory,
+    sharded_file_path,
+)
+
+
+def test_local_backend_roundtrip(tmp_path: Path) -> None:
+    backend = LocalStorageBackend(str(tmp_path))
+    key = f"{uuid.uuid4()}/photo.jpg"
+
+    backend.save(io.BytesIO(b"image-bytes"), key)
+
+    assert backend.exists(key)
+    assert backend.size(key) == len(b"image-bytes")
+    with backend.open(key) as f:
+        assert f.read() == b"image-bytes"
+    assert backend.presigned_get_url(key, 60) == f"/uploads/{key}"
+    assert backend.delete(key)
+    assert not backend.exists(key)
+    assert not backend.delete(key)
+
+
+def test_local_backend_does_not_support_direct_upload(tmp_path: Path) -> None:
+    service = FileStorageService(base_dir=str(tmp_path))
+    assert not service.supports_direct_upload
+    with pytest.raises(NotImplementedError):
+        service.create_upload_url("photo.jpg", uuid.uuid4())
+
+
+def test_listing_file_key_validation() -> None:
+    listing_id = uuid.uuid4()
+    key = FileStorageService.new_file_key("photo.JPG", listing_id)
+
+    assert key.endswith(".jpg")
+    assert FileStorageService.is_issued_file_key(key, listing_id)
+    assert not FileStorageService.is_issued_file_key(key, uuid.uuid4())
+    assert not FileStorageService.is_issued_file_key(f"{listing_directory(listing_id)}/../x.jpg", listing_id)
+    assert not FileStorageService.is_issued_file_key(f"{listing_directory(listing_id)}/x.jpg", listing_id)
+    # Keys from before the hash-prefixed layout were never issued for direct uploads
+    assert not FileStorageService.is_issued_file_key(f"{listing_id}/{uuid.uuid4()}.jpg", listing_id)
+
+
+def test_sharded_layout() -> None:
+    listing_id = uuid.uuid4()
+    key = FileStorageService.new_file_key("photo.jpg", listing_id)
+    shard_a, shard_b, directory, _ = key.split("/")
+
+    assert len(shard_a) == len(shard_b) == 2
+    assert directory == str(listing_id)
+    assert not is_legacy_file_path(key)
+    assert is_legacy_file_path(f"{listing_id}/photo.jpg")
+    assert sharded_file_path(f"{listing_id}/photo.jpg") == f"{listing_directory(listing_id)}/photo.jpg"
+
+
+def test_local_copy_uses_hard_link(tmp_path: Path) -> None:
+    backend = LocalStorageBackend(str(tmp_path))
+    backend.save(io.BytesIO(b"bytes"), "old/photo.jpg")
+
+    backend.copy("old/photo.jpg", "ab/cd/new/photo.jpg")
+
+    assert (tmp_path / "ab/cd/new/photo.jpg").stat().st_ino == (tmp_path / "old/photo.jpg").stat().st_ino
+
+
+def test_local_replace_keeps_hard_linked_copy(tmp_path: Path) -> None:
+    backend = LocalStorageBackend(str(tmp_path))
+    backend.save(io.BytesIO(b"original"), "old/photo.jpg")
+    backend.copy("old/photo.jpg", "new/photo.jpg")
+
+    backend.replace(io.BytesIO(b"smaller"), "new/photo.jpg")
+
+    assert (tmp_path / "new/photo.jpg").read_bytes() == b"smaller"
+    # A rename, not an in-place write, so the other link is untouched
+    assert (tmp_path / "old/photo.jpg").read_bytes() == b"original"
+    assert sorted(path.name for path in (tmp_path / "new").iterdir()) == ["photo.jpg"]
+
+
+def test_s3_backend_roundtrip_and_presigned_urls() -> None:
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="uploads")
+        backend = S3StorageBackend("uploads", client=client)
+        service = FileStorageService(backend=backend)
+        listing_id = uuid.uuid4()
+
+        key, upload_url = service.create_upload_url("lease.pdf", listing_id)
+        assert service.is_issued_file_key(key, listing_id)
+        assert "X-Amz-Signature" in upload_url or "Signature" in upload_url
+        assert backend.size(key) is None
+
+        backend.save(io.BytesIO(b"%PDF-1.4"), key)
+        assert backend.size(key) == 8
+        assert backend.open(key).read() == b"%PDF-1.4"
+        assert key in service.get_download_url(key)
+
+        backend.copy(key, f"{key}.copy")
+        assert backend.size(f"{key}.copy") == 8
+
+        backend.delete_prefix(listing_directory(listing_id))
+        assert not backend.exists(key)
+        assert not backend.exists(f"{key}.copy")
@@ -0,0 +1,93 @@
+import io
+import itertools
+
+import numpy as np
+from PIL import Image as PILImage
+
+from app.services.image_hashing import (
+    as_unsigned,
+    cluster_near_duplicates,
+    cross_owner_clusters,
+    dhash,
+    find_near_duplicate_pairs,
+    hash_upload,
+    popcount,
+)
+
+
+def _make_image(seed: int, size: tuple[int, int] = (320, 240), image_format: str = "PNG") -> bytes:
+    """A smooth random picture, so resizing keeps its structure"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    image = PILImage.fromarray(small).resize(size, PILImage.Resampling.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def _distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+
+def test_dhash_matches_resized_and_reencoded_copy() -> None:
+    original = dhash(_make_image(1))
+    copy = dhash(_make_image(1, size=(800, 600), image_format="JPEG"))
+    other = dhash(_make_image(2))
+
+    assert -(1 << 63) <= original < (1 << 63)
+    assert _distance(original, copy) <= 4
+    assert _distance(original, other) > 10
+
+
+def test_hash_upload_rewinds_file() -> None:
+    fileobj = io.BytesIO(_make_image(3))
+    assert hash_upload(fileobj) is not None
+    assert fileobj.tell() == 0
+
+    assert hash_upload(io.BytesIO(b"not an image")) is None
+
+
+def test_popcount() -> None:
+    values = np.array([0, 1, 0xFF, (1 << 64) - 1], dtype=np.uint64)
+    assert popcount(values).tolist() == [0, 1, 8, 64]
+
+
+def test_find_near_duplicate_pairs_matches_brute_force() -> None:
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**63, size=300, dtype=np.int64).view(np.uint64)
+    # Plant near copies so there is something to find
+    for index in range(0, 60, 3):
+        hashes[index + 1] = hashes[index] ^ np.uint64(0b101)
+        hashes[index + 2] = hashes[index] ^ (np.uint64(1) << np.uint64(63))
+    max_distance = 3
+
+    expected = {
+        (i, j) for i, j in itertools.combinations(range(len(hashes)), 2)
+        if _distance(int(hashes[i]), int(hashes[j])) <= max_distance
+    }
+    found = {tuple(pair) for pair in find_near_duplicate_pairs(hashes, max_distance).tolist()}
+    assert found == expected
+    assert len(expected) >= 60
+
+
+def test_cluster_near_duplicates() -> None:
+    base = 0x1234_5678_9ABC_DEF0
+    hashes = [
+        base,
+        base ^ 0b1,           # 1 bit from base
+        base ^ 0b11,          # chained through the previous one
+        base,                 # exact copy
+        -0x0F0F_0F0F_0F0F_0F0F,
+        0x7777_0000_7777_0000,
+    ]
+    clusters = cluster_near_duplicates(hashes, max_distance=1)
+    assert sorted(sorted(cluster) for cluster in clusters) == [[0, 1, 2, 3]]
+
+    # Signed values survive the round trip to unsigned
+    assert as_unsigned([-1]).tolist() == [(1 << 64) - 1]
+
+
+def test_cross_owner_clusters_skip_single_owner() -> None:
+    hashes = [10, 11, 500_000, 500_001]
+    owners = ["a", "a", "a", "b"]
+    assert cross_owner_clusters(hashes, owners, max_distance=1) == [[2, 3]]
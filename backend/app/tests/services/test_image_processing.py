@@ -0,0 +1,123 @@
+import io
+
+import numpy as np
+from PIL import Image as PILImage
+
+from app.services.image_hashing import dhash
+from app.services.image_processing import (
+    _BASE83_CHARS,
+    blurhash,
+    compute_derivatives,
+    process_image_data,
+    reencode_image,
+)
+
+
+def _decode_base83(value: str) -> int:
+    result = 0
+    for char in value:
+        result = result * 83 + _BASE83_CHARS.index(char)
+    return result
+
+
+def _encode_image(image: PILImage.Image, image_format: str = "PNG", **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **kwargs)
+    return buffer.getvalue()
+
+
+def test_blurhash_of_solid_colour() -> None:
+    pixels = np.zeros((24, 32, 3), dtype=np.uint8)
+    pixels[..., 0] = 255
+
+    placeholder = blurhash(pixels, 4, 3)
+
+    # size flag + max AC + 4 chars DC + 2 chars per AC component
+    assert len(placeholder) == 2 + 4 + 2 * 11
+    assert _decode_base83(placeholder[0]) == 3 + 2 * 9
+    assert _decode_base83(placeholder[2:6]) == 0xFF0000
+
+
+def test_blurhash_of_gradient_differs_by_direction() -> None:
+    ramp = np.linspace(0, 255, 32, dtype=np.uint8)
+    horizontal = np.repeat(np.repeat(ramp[None, :, None], 32, axis=0), 3, axis=2)
+    vertical = horizontal.transpose(1, 0, 2)
+
+    assert blurhash(horizontal) != blurhash(vertical)
+
+
+def test_compute_derivatives() -> None:
+    image = PILImage.new("RGB", (640, 480), (30, 120, 200))
+    data = _encode_image(image, "JPEG")
+
+    derivatives = compute_derivatives(data)
+    assert set(derivatives) == {"placeholder"}
+    assert len(derivatives["placeholder"]) == 28
+
+    derivatives = compute_derivatives(data, with_phash=True)
+    assert derivatives["phash"] == dhash(data)
+
+
+def test_compute_derivatives_applies_exif_orientation() -> None:
+    # Left half dark, right half bright
+    pixels = np.zeros((40, 80, 3), dtype=np.uint8)
+    pixels[:, 40:] = 255
+    image = PILImage.fromarray(pixels)
+    upright = compute_derivatives(_encode_image(image))["placeholder"]
+
+    # Stored rotated, with EXIF orientation 6 telling viewers to rotate it back
+    exif = PILImage.Exif()
+    exif[0x0112] = 6
+    rotated = _encode_image(image.transpose(PILImage.Transpose.ROTATE_90), "PNG", exif=exif)
+
+    assert compute_derivatives(rotated)["placeholder"] == upright
+
+
+def _photo(size: tuple[int, int]) -> PILImage.Image:
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    return PILImage.fromarray(small).resize(size, PILImage.Resampling.BICUBIC)
+
+
+def test_reencode_strips_metadata_rotates_and_caps_size() -> None:
+    exif = PILImage.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise for display
+    exif[0x010F] = "PhoneMaker"
+    data = _encode_image(_photo((4000, 3000)), "JPEG", quality=95, exif=exif)
+
+    reencoded = reencode_image(data, max_edge=1024)
+
+    assert reencoded is not None
+    assert len(reencoded) < len(data)
+    with PILImage.open(io.BytesIO(reencoded)) as image:
+        assert image.format == "JPEG"
+        assert image.size == (768, 1024)
+        assert not image.getexif()
+
+
+def test_reencode_keeps_png_format() -> None:
+    exif = PILImage.Exif()
+    exif[0x010F] = "PhoneMaker"
+    data = _encode_image(_photo((64, 48)), "PNG", exif=exif)
+
+    with PILImage.open(io.BytesIO(reencode_image(data))) as image:
+        assert image.format == "PNG"
+        assert image.size == (64, 48)
+        assert not image.getexif()
+
+
+def test_reencode_leaves_clean_images_alone() -> None:
+    assert reencode_image(_encode_image(_photo((64, 48)), "JPEG")) is None
+    assert reencode_image(_encode_image(_photo((64, 48)), "GIF"), max_edge=10) is None
+
+
+def test_process_image_data_rehashes_reencoded_images() -> None:
+    data = _encode_image(_photo((200, 100)), "JPEG")
+
+    reencoded, derivatives = process_image_data(data, False, 2560, 85)
+    assert reencoded is None
+    assert set(derivatives) == {"placeholder"}
+
+    reencoded, derivatives = process_image_data(data, False, 100, 85)
+    assert reencoded is not None
+    assert derivatives["phash"] == dhash(reencoded)
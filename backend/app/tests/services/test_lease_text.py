@@ -0,0 +1,37 @@
+from app.models.lease_agreements import LeaseFileType
+from app.services.lease_text import MAX_INDEXED_CHARS, extract_text
+
+
+def _make_pdf(text: str) -> bytes:
+    """Build a minimal single-page PDF showing text in Helvetica"""
+    stream = f"BT /F1 12 Tf 72 712 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref_offset
+    )
+    return pdf
+
+
+def test_extract_text_from_pdf() -> None:
+    text = extract_text(_make_pdf("Subletting allowed with consent"), LeaseFileType.PDF.value)
+    assert "Subletting allowed" in text
+
+
+def test_extract_text_from_txt_strips_nul_and_truncates() -> None:
+    assert extract_text(b"No\x00 pets", LeaseFileType.TXT.value) == "No pets"
+    assert len(extract_text(b"a" * (MAX_INDEXED_CHARS + 10), LeaseFileType.TXT.value)) == MAX_INDEXED_CHARS
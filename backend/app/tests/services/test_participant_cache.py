@@ -0,0 +1,51 @@
+import uuid
+
+from app.services.participant_cache import ParticipantCache
+
+
+class FakeParticipants:
+    def __init__(self, conversations):
+        self.conversations = conversations
+        self.queries = 0
+
+    def __call__(self, session, conversation_id):
+        self.queries += 1
+        return tuple(self.conversations.get(conversation_id, ()))
+
+
+def test_hits_and_lru_eviction() -> None:
+    first, second, third = (uuid.uuid4() for _ in range(3))
+    users = [uuid.uuid4() for _ in range(3)]
+    fetch = FakeParticipants({first: users[:2], second: users[1:], third: users})
+    cache = ParticipantCache(max_size=2, fetch=fetch)
+
+    assert cache.get(None, first) == tuple(users[:2])
+    assert cache.get(None, first) == tuple(users[:2])
+    cache.get(None, second)
+    # Touching first makes second the least recently used
+    cache.get(None, first)
+    cache.get(None, third)
+    assert fetch.queries == 3
+    cache.get(None, first)
+    assert fetch.queries == 3
+    cache.get(None, second)
+    assert fetch.queries == 4
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert (stats["hits"], stats["misses"]) == (3, 4)
+    assert stats["hit_rate"] == 3 / 7
+
+
+def test_unknown_conversations_are_not_cached() -> None:
+    conversation = uuid.uuid4()
+    fetch = FakeParticipants({})
+    cache = ParticipantCache(max_size=10, fetch=fetch)
+    assert cache.get(None, conversation) == ()
+
+    user = uuid.uuid4()
+    fetch.conversations[conversation] = [user]
+    assert cache.get(None, conversation) == (user,)
+    fetch.conversations[conversation] = []
+    cache.invalidate(conversation)
+    assert cache.get(None, conversation) == ()
@@ -0,0 +1,15 @@
+from app.core.config import settings
+from app.services.process_pool import lazy_process_pool
+
+
+def test_pool_is_created_once_with_the_configured_size(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "IMAGE_PROCESSING_WORKERS", 3)
+    get_pool = lazy_process_pool("IMAGE_PROCESSING_WORKERS")
+
+    pool = get_pool()
+    try:
+        assert get_pool() is pool
+        assert pool._max_workers == 3
+        assert pool.submit(abs, -2).result() == 2
+    finally:
+        pool.shutdown()
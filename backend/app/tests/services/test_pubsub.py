@@ -0,0 +1,100 @@
+import asyncio
+import json
+import random
+import uuid
+
+from app.api import websockets
+from app.api.websockets import ConnectionManager
+from app.services.pubsub import InMemoryHub, InMemoryPubSub, Reassembler, split_payload
+from app.tests.utils.websockets import FakeWebSocket, drain
+
+
+def test_split_payload_round_trip() -> None:
+    message = json.dumps({"content": "héllo wörld ✓ " * 2000})
+    payloads = split_payload(message, limit=1000)
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= 1000 for payload in payloads)
+
+    # Parts of two messages arriving interleaved and out of order
+    other = "x" * 3000
+    other_payloads = split_payload(other, limit=1000)
+    mixed = payloads + other_payloads
+    random.Random(1).shuffle(mixed)
+
+    reassembler = Reassembler()
+    completed = [m for m in (reassembler.add(payload) for payload in mixed) if m is not None]
+    assert sorted(completed) == sorted([message, other])
+
+
+def test_small_message_is_one_payload() -> None:
+    payloads = split_payload("{}")
+    assert len(payloads) == 1
+    assert Reassembler().add(payloads[0]) == "{}"
+
+
+def test_broadcast_reaches_users_on_other_workers() -> None:
+    async def scenario():
+        hub = InMemoryHub()
+        worker_a, worker_b = ConnectionManager(), ConnectionManager()
+        await worker_a.start_bus(InMemoryPubSub(hub))
+        await worker_b.start_bus(InMemoryPubSub(hub))
+
+        me, alice = uuid.uuid4(), uuid.uuid4()
+        phone, laptop, alice_phone = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        phone_id = await worker_a.connect(phone, me)
+        await worker_b.connect(laptop, me)
+        await worker_b.connect(alice_phone, alice)
+
+        await worker_a.broadcast_conversation_message(
+            {"content": "hi"}, uuid.uuid4(), [me, alice], sender_id=me, origin_connection_id=phone_id
+        )
+        await drain()
+        assert phone.sent == []
+        assert [event["data"]["content"] for event in laptop.sent] == ["hi"]
+        assert [event["data"]["content"] for event in alice_phone.sent] == ["hi"]
+
+        # Each worker delivers once, however many workers hear it
+        await worker_b.send_personal_message({"type": "user_blocked"}, me)
+        await drain()
+        assert [event["type"] for event in phone.sent] == ["user_blocked"]
+        assert [event["type"] for event in laptop.sent] == ["message", "user_blocked"]
+
+        await worker_b.stop_bus()
+        await worker_a.send_personal_message({"type": "user_unblocked"}, me)
+        await drain()
+        assert len(laptop.sent) == 2
+
+    asyncio.run(scenario())
+
+
+class StalledPubSub(InMemoryPubSub):
+    """A bus whose database stopped answering"""
+
+    async def publish(self, message: str) -> None:
+        await asyncio.Event().wait()
+
+
+def test_stalled_bus_does_not_hold_up_broadcasts(monkeypatch) -> None:
+    monkeypatch.setattr(websockets, "BUS_PUBLISH_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(websockets, "BUS_FLUSH_TIMEOUT_SECONDS", 0.05)
+
+    async def scenario():
+        manager = ConnectionManager(bus_queue_size=2)
+        await manager.start_bus(StalledPubSub())
+        me = uuid.uuid4()
+        phone = FakeWebSocket()
+        await manager.connect(phone, me)
+
+        # One envelope is stuck with the publisher, two wait, the rest are dropped
+        for i in range(5):
+            await asyncio.wait_for(manager.send_personal_message({"type": "event", "n": i}, me), 0.01)
+            await drain()
+        assert [event["n"] for event in phone.sent] == list(range(5))
+        assert manager.stats()["bus_dropped_events"] == 2
+
+        await asyncio.sleep(0.2)
+        assert manager.stats()["bus_publish_failures"] == 3
+        assert manager.stats()["bus_queued_events"] == 0
+        await manager.stop_bus()
+
+    asyncio.run(scenario())
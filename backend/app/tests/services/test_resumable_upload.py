@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import uuid
+from pathlib import Path
+
+import pytest
+
+from app.services.file_service import LocalStorageBackend
+from app.services.resumable_upload import (
+    ChecksumMismatchError,
+    OffsetMismatchError,
+    ResumableUploadStore,
+    UploadBusyError,
+    UploadNotFoundError,
+)
+
+
+def _checksum(data: bytes) -> str:
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def _create(store: ResumableUploadStore, size: int):
+    return store.create(
+        listing_id=uuid.uuid4(), user_id=uuid.uuid4(), filename="lease.pdf", size=size
+    )
+
+
+def test_chunks_are_appended_and_adopted_without_copy(tmp_path: Path) -> None:
+    store = ResumableUploadStore(str(tmp_path))
+    state = _create(store, 10)
+
+    store.append(state.id, 0, b"hello", _checksum(b"hello"))
+    # A dropped connection resumes from the stored offset
+    assert store.get(state.id).offset == 5
+    state = store.append(state.id, 5, b"world", _checksum(b"world"))
+    assert state.is_complete
+
+    backend = LocalStorageBackend(str(tmp_path))
+    with store.completing(state.id) as part_path:
+        inode = part_path.stat().st_ino
+        backend.adopt(part_path, "listing/lease.pdf")
+        store.discard(state.id)
+
+    stored = tmp_path / "listing/lease.pdf"
+    assert stored.read_bytes() == b"helloworld"
+    assert stored.stat().st_ino == inode
+
+    with pytest.raises(UploadNotFoundError):
+        store.get(state.id)
+
+
+def test_wrong_offset_is_rejected(tmp_path: Path) -> None:
+    store = ResumableUploadStore(str(tmp_path))
+    state = _create(store, 10)
+    store.append(state.id, 0, b"abc")
+
+    with pytest.raises(OffsetMismatchError) as exc_info:
+        store.append(state.id, 0, b"abc")
+    assert exc_info.value.expected == 3
+    with pytest.raises(OffsetMismatchError):
+        with store.completing(state.id):
+            pass
+
+
+def test_concurrent_completions_get_one_file(tmp_path: Path) -> None:
+    store = ResumableUploadStore(str(tmp_path))
+    state = _create(store, 3)
+    store.append(state.id, 0, b"abc")
+    backend = LocalStorageBackend(str(tmp_path))
+
+    with store.completing(state.id) as part_path:
+        with pytest.raises(UploadBusyError):
+            with store.completing(state.id):
+                pass
+        backend.adopt(part_path, "listing/lease.pdf")
+        # Between the move and the discard the upload is already gone
+        with pytest.raises(UploadNotFoundError):
+            with store.completing(state.id):
+                pass
+        store.discard(state.id)
+
+    with pytest.raises(UploadNotFoundError):
+        with store.completing(state.id):
+            pass
+    assert (tmp_path / "listing/lease.pdf").read_bytes() == b"abc"
+
+
+def test_bad_checksum_leaves_upload_untouched(tmp_path: Path) -> None:
+    store = ResumableUploadStore(str(tmp_path))
+    state = _create(store, 10)
+
+    with pytest.raises(ChecksumMismatchError):
+        store.append(state.id, 0, b"corrupted", _checksum(b"original!"))
+    with pytest.raises(ChecksumMismatchError):
+        store.append(state.id, 0, b"data", "crc32 AAAA")
+    assert store.get(state.id).offset == 0
+
+
+def test_chunk_larger_than_declared_size_is_rejected(tmp_path: Path) -> None:
+    store = ResumableUploadStore(str(tmp_path))
+    state = _create(store, 3)
+
+    with pytest.raises(ValueError):
+        store.append(state.id, 0, b"toolong")
+
+
+def test_expired_uploads_are_purged(tmp_path: Path) -> None:
+    store = ResumableUploadStore(str(tmp_path))
+    state = _create(store, 3)
+
+    assert store.purge_expired(max_age=60) == 0
+    assert store.purge_expired(max_age=-1) == 1
+    with pytest.raises(UploadNotFoundError):
+        store.get(state.id)
@@ -0,0 +1,71 @@
+import os
+import time
+from pathlib import Path
+
+from app.services.upload_reconciler import QUARANTINE_DIR, UploadReconciler
+
+
+def _write(base: Path, relative_path: str, content: bytes = b"data", age: float = 2 * 60 * 60) -> None:
+    path = base / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_orphans_are_quarantined_then_deleted(tmp_path: Path) -> None:
+    _write(tmp_path, "listing-a/kept.jpg")
+    _write(tmp_path, "listing-a/orphan.jpg", b"12345")
+    _write(tmp_path, "listing-b/orphan.pdf", b"123")
+    referenced = {"listing-a/kept.jpg"}
+    lookups: list[list[str]] = []
+
+    def lookup(paths: list[str]) -> set[str]:
+        lookups.append(paths)
+        return referenced & set(paths)
+
+    reconciler = UploadReconciler(str(tmp_path), lookup, batch_size=2)
+    report = reconciler.run()
+
+    assert report.scanned_files == 3
+    assert report.quarantined_files == 2
+    assert report.quarantined_bytes == 8
+    assert [len(batch) for batch in lookups] == [2, 1]
+    assert (tmp_path / "listing-a/kept.jpg").exists()
+    assert not (tmp_path / "listing-a/orphan.jpg").exists()
+    # Empty listing directories are removed
+    assert not (tmp_path / "listing-b").exists()
+    assert any((tmp_path / QUARANTINE_DIR).rglob("orphan.pdf"))
+
+    expired = UploadReconciler(str(tmp_path), lookup, quarantine_retention=-1).run()
+    assert expired.deleted_files == 2
+    assert expired.reclaimed_bytes == 8
+    assert not any((tmp_path / QUARANTINE_DIR).iterdir())
+
+
+def test_recent_files_are_left_alone(tmp_path: Path) -> None:
+    _write(tmp_path, "listing-a/in-flight.jpg", age=0)
+
+    report = UploadReconciler(str(tmp_path), lambda paths: set()).run()
+
+    assert report.skipped_recent_files == 1
+    assert report.quarantined_files == 0
+    assert (tmp_path / "listing-a/in-flight.jpg").exists()
+
+
+def test_runs_resume_from_checkpoint(tmp_path: Path) -> None:
+    for name in ["a/1.jpg", "a/2.jpg", "b/1.jpg", "c/1.jpg"]:
+        _write(tmp_path, name)
+    seen: list[str] = []
+
+    def lookup(paths: list[str]) -> set[str]:
+        seen.extend(paths)
+        return set(paths)
+
+    reconciler = UploadReconciler(str(tmp_path), lookup)
+    first = reconciler.run(max_files=3)
+    second = reconciler.run(max_files=3)
+
+    assert not first.pass_completed
+    assert second.pass_completed
+    assert seen == ["a/1.jpg", "a/2.jpg", "b/1.jpg", "c/1.jpg"]
@@ -0,0 +1,27 @@
+import asyncio
+import json
+
+
+class FakeWebSocket:
+    def __init__(self, stalled: bool = False):
+        self.sent = []
+        self.closed_with = None
+        # A stalled client never finishes receiving
+        self.stalled = stalled
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed_with = code
+
+
+async def drain():
+    """Let the writer tasks catch up"""
+    for _ in range(5):
+        await asyncio.sleep(0)